@@ -1,12 +1,21 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, session, redirect, url_for, Response, stream_with_context, g
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from database import Database
-from auth import User
+from database import Database, INSECT_TYPES, CATALOG_SEARCH_PARAMS
+from config import PAGINATION_CONFIG, SLOW_QUERY_CONFIG, IMAGE_CONFIG, METRICS_CONFIG
+from auth import User, PasswordHashBusy
+from image_index import ImageIndex
+from image_variants import ImageVariants, SOURCE_SUFFIXES, mimetype, parse_variant
+import metrics
+import slow_queries
+from request_events import RequestEvents, TooManySubscribers
 import os
 import re
+import hmac
+import ipaddress
+import itertools
 from pathlib import Path
 from datetime import datetime
-from typing import Optional
+from typing import Iterator, Optional, List, Dict
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production-12345')
@@ -23,9 +32,35 @@ def load_user(user_id):
 
 db = Database()
 
+# Уведомления об изменении запросов к эксперту (LISTEN на отдельном подключении)
+request_events = RequestEvents(db.get_connection)
+
 # Путь к папке с изображениями
 IMAGE_BASE_DIR = Path(__file__).parent / 'data'
 
+# Индекс изображений строится один раз при старте и обновляется по mtime папок
+image_index = ImageIndex(IMAGE_BASE_DIR)
+image_index.build()
+
+# Уменьшенные копии и WebP/AVIF-варианты изображений (/data/<файл>?w=320&fmt=webp)
+image_variants = ImageVariants()
+
+@app.before_request
+def start_request_profile():
+    """Начать профиль запроса: этапы и SQL-запросы для Server-Timing и /metrics"""
+    g.request_profile = metrics.begin_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def finish_request_profile(response):
+    """Добавить заголовок Server-Timing и учесть запрос в метриках"""
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        server_timing = metrics.server_timing(profile)
+        if server_timing:
+            response.headers['Server-Timing'] = server_timing
+        metrics.end_request(profile, request.method, response.status_code)
+    return response
+
 def find_insect_image(insect_name: str, insect_type: str, description: str = '') -> str:
     """
     Находит изображение насекомого по его названию и типу
@@ -38,78 +73,333 @@ def find_insect_image(insect_name: str, insect_type: str, description: str = '')
     Returns:
         URL изображения или пустая строка
     """
-    if not insect_name:
-        return ''
+    return image_index.find(insect_name, insect_type, description)
+
+def find_insect_images(insects: List[Dict], insect_type: str) -> List[str]:
+    """
+    Находит изображения для списка насекомых одного типа за один вызов
     
-    # Определяем папку с изображениями
-    folder_map = {
-        'dragonfly': 'Стрекозы',
-        'beetle': 'жужелицы',  # Если есть папка для жуков
-        'butterfly': 'бабочки'
-    }
+    Returns:
+        Список URL изображений (или пустых строк) в порядке insects
+    """
+    with metrics.stage('images'):
+        return image_index.find_many(
+            ((insect.get('name_ru', ''), insect.get('description', '')) for insect in insects),
+            insect_type
+        )
+
+def find_catalog_images(insects: List[Dict]) -> List[str]:
+    """
+    Находит изображения для списка насекомых разных типов (поле insect_type)
+    
+    Returns:
+        Список URL изображений (или пустых строк) в порядке insects
+    """
+    image_urls = [''] * len(insects)
+    positions: Dict[str, List[int]] = {}
+    for position, insect in enumerate(insects):
+        positions.setdefault(insect.get('insect_type'), []).append(position)
+    for insect_type, type_positions in positions.items():
+        type_insects = [insects[position] for position in type_positions]
+        for position, image_url in zip(type_positions, find_insect_images(type_insects, insect_type)):
+            image_urls[position] = image_url
+    return image_urls
+
+def parse_since(value: Optional[str]):
+    """
+    Параметр since ленты изменений: версия (целое число) или время ISO 8601
+    
+    Returns:
+        ('version', int), ('time', datetime) или None, если параметр не задан
+    """
+    if value in (None, ''):
+        return None
+    if value.isdigit():
+        return 'version', int(value)
+    try:
+        return 'time', datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Неверный параметр since: {value}")
+
+# Статусы запроса к эксперту (CHECK в sql/add_auth_and_requests.sql)
+EXPERT_REQUEST_STATUSES = ('ожидает', 'в_работе', 'отвечено', 'отклонено')
+
+# Длина описания насекомого в списочной проекции
+DESCRIPTION_PREVIEW_LENGTH = 200
+
+# Колонки проекций: список (очередь) без длинных текстов и полная карточка запроса
+EXPERT_REQUEST_LIST_COLUMNS = f"""
+            z.id_запроса,
+            LEFT(z.описание_насекомого, {DESCRIPTION_PREVIEW_LENGTH}) as описание_кратко,
+            z.место_наблюдения,
+            z.дата_наблюдения,
+            z.статус,
+            z.дата_создания,
+            z.дата_ответа,
+            z.id_вида_насекомого,
+            z.id_эксперта,
+            z.версия,
+            u.имя as имя_пользователя,
+            u.email as email_пользователя
+"""
+EXPERT_REQUEST_DETAIL_COLUMNS = """
+            z.id_запроса,
+            z.описание_насекомого,
+            z.место_наблюдения,
+            z.дата_наблюдения,
+            z.дополнительные_данные,
+            z.статус,
+            z.дата_создания,
+            z.дата_ответа,
+            z.ответ_эксперта,
+            z.изображение_ответа,
+            z.id_вида_насекомого,
+            z.id_эксперта,
+            z.версия,
+            u.имя as имя_пользователя,
+            u.email as email_пользователя
+"""
+
+# Текущая версия ленты изменений (индекс idx_запрос_версия)
+EXPERT_REQUESTS_VERSION_QUERY = 'SELECT COALESCE(MAX(версия), 0) AS версия FROM "ЗапросЭксперту"'
+
+def parse_request_filters(source) -> Dict:
+    """
+    Фильтры и проекция очереди запросов к эксперту из query string
+    
+    status - один или несколько статусов через запятую, expert - id ответившего
+    эксперта, view - 'list' (без длинных текстов) или 'detail' (по умолчанию)
+    """
+    statuses = [status.strip() for status in (source.get('status') or '').split(',') if status.strip()]
+    unknown = [status for status in statuses if status not in EXPERT_REQUEST_STATUSES]
+    if unknown:
+        raise ValueError(f"Неизвестный статус: {', '.join(unknown)}")
+    
+    expert = source.get('expert')
+    if expert in (None, ''):
+        expert = None
+    else:
+        try:
+            expert = int(expert)
+        except ValueError:
+            raise ValueError(f"Неверный параметр expert: {expert}")
     
-    folder_name = folder_map.get(insect_type)
-    if not folder_name:
-        return ''
+    view = source.get('view') or 'detail'
+    if view not in ('list', 'detail'):
+        raise ValueError(f"Неверная проекция: {view}")
+    return {'statuses': statuses, 'expert': expert, 'view': view}
+
+def parse_request_cursor(cursor: Optional[str]) -> Optional[tuple]:
+    """Разобрать курсор очереди запросов: 'дата_создания:id_запроса'"""
+    if not cursor:
+        return None
+    try:
+        created, request_id = str(cursor).rsplit(':', 1)
+        return datetime.fromisoformat(created), int(request_id)
+    except ValueError:
+        raise ValueError(f"Неверный курсор: {cursor}")
+
+def expert_requests_query(user: User, since=None, filters: Optional[Dict] = None,
+                          after: Optional[tuple] = None, limit: Optional[int] = None,
+                          request_id: Optional[int] = None) -> tuple:
+    """
+    SQL и параметры списка запросов к эксперту: админ видит все, пользователь - свои
     
-    image_dir = IMAGE_BASE_DIR / folder_name
-    if not image_dir.exists():
-        return ''
+    Args:
+        since: результат parse_since() - только запросы, созданные или изменённые
+               после этой версии (или этого времени)
+        filters: результат parse_request_filters() - статусы, эксперт и проекция
+        after: результат parse_request_cursor() - страница после этого запроса
+        limit: размер страницы; выбирается на одну строку больше, чтобы узнать,
+               есть ли следующая (см. expert_requests_page)
+        request_id: один запрос (карточка)
     
-    # Нормализуем название для поиска
-    name_lower = insect_name.lower().strip()
+    Страницы листаются по ключу (дата_создания DESC, id_запроса DESC), под
+    который построены составные индексы из sql/add_auth_and_requests.sql.
+    """
+    filters = filters or {}
+    columns = EXPERT_REQUEST_LIST_COLUMNS if filters.get('view') == 'list' else EXPERT_REQUEST_DETAIL_COLUMNS
+    query = f"""
+        SELECT {columns}
+        FROM "ЗапросЭксперту" z
+        LEFT JOIN "Пользователь" u ON z.id_пользователя = u.id_пользователя
+    """
+    conditions = []
+    values = []
+    if not user.is_admin():
+        # Обычный пользователь видит только свои запросы
+        conditions.append("z.id_пользователя = %s")
+        values.append(user.id)
+    if request_id is not None:
+        conditions.append("z.id_запроса = %s")
+        values.append(request_id)
+    statuses = filters.get('statuses')
+    if statuses and len(statuses) == 1:
+        # Условие-равенство, чтобы для 'ожидает' подошёл частичный индекс idx_запрос_ожидает
+        conditions.append("z.статус = %s")
+        values.append(statuses[0])
+    elif statuses:
+        conditions.append("z.статус = ANY(%s)")
+        values.append(list(statuses))
+    if filters.get('expert') is not None:
+        conditions.append("z.id_эксперта = %s")
+        values.append(filters['expert'])
+    if since is not None:
+        kind, value = since
+        conditions.append("z.версия > %s" if kind == 'version' else "z.дата_изменения > %s")
+        values.append(value)
+    if after is not None:
+        conditions.append("(z.дата_создания, z.id_запроса) < (%s, %s)")
+        values.extend(after)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY z.дата_создания DESC, z.id_запроса DESC"
+    if limit is not None:
+        query += " LIMIT %s"
+        values.append(limit + 1)
+    return query, tuple(values)
+
+def requests_version(rows: List[Dict], since=None) -> Optional[int]:
+    """Версия, с которой клиенту запрашивать следующие изменения (?since=)"""
+    version = max((row['версия'] for row in rows if row.get('версия') is not None), default=None)
+    if version is None and since is not None and since[0] == 'version':
+        return since[1]
+    return version
+
+def expert_requests_page(rows: List[Dict], limit: Optional[int]) -> tuple:
+    """Обрезать лишнюю строку страницы; курсор следующей страницы или None"""
+    if limit is None or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    created = last['дата_создания']
+    created = created.isoformat() if hasattr(created, 'isoformat') else created
+    return rows, f"{created}:{last['id_запроса']}"
+
+def expert_requests_payload(rows: List[Dict], since, limit: Optional[int],
+                            current_version: Optional[int]) -> Dict:
+    """
+    Тело ответа GET /api/expert-requests
     
-    # Извлекаем пол из описания, если есть
-    gender = ''
-    if description:
-        if 'самец' in description.lower() or '(самец)' in description.lower():
-            gender = 'самец'
-        elif 'самка' in description.lower() or '(самка)' in description.lower():
-            gender = 'самка'
+    current_version - версия ленты на момент чтения (EXPERT_REQUESTS_VERSION_QUERY)
+    для полного списка; для ?since= версия считается по изменившимся строкам.
+    """
+    rows, next_cursor = expert_requests_page(rows, limit)
+    results = [format_request_dates(row) for row in rows]
+    payload = {
+        'success': True,
+        'requests': results,
+        'version': current_version if since is None else requests_version(results, since),
+        'delta': since is not None
+    }
+    if limit is not None:
+        payload['next_cursor'] = next_cursor
+    return payload
+
+def format_request_dates(result: Dict) -> Dict:
+    """Преобразует даты запроса к эксперту в строки"""
+    if result.get('дата_создания'):
+        result['дата_создания'] = result['дата_создания'].isoformat()
+    if result.get('дата_ответа'):
+        result['дата_ответа'] = result['дата_ответа'].isoformat()
+    if result.get('дата_наблюдения'):
+        result['дата_наблюдения'] = str(result['дата_наблюдения'])
+    return result
+
+def parse_stream_format(source) -> Optional[str]:
+    """Формат потоковой выдачи из параметра stream: 'json', 'ndjson' или None"""
+    stream = source.get('stream')
+    if stream in (None, '', False, 'false', '0'):
+        return None
+    if stream in (True, 'true', '1', 'json'):
+        return 'json'
+    if stream == 'ndjson':
+        return 'ndjson'
+    raise ValueError(f"Неверный формат потоковой выдачи: {stream}")
+
+def stream_rows(rows: Iterator[Dict], stream_format: str, key: str = 'results') -> Response:
+    """
+    Потоковый ответ: строки сериализуются и отправляются по мере чтения из базы
     
-    # Получаем список всех изображений
-    image_files = list(image_dir.glob('*.jpg')) + list(image_dir.glob('*.JPG')) + list(image_dir.glob('*.webp'))
+    json   - {"success": true, "<key>": [...], "count": N}
+    ndjson - по одному JSON-объекту на строку (application/x-ndjson)
     
-    # Создаем список кандидатов с приоритетами
-    candidates = []
+    Первая строка читается до отправки заголовков, чтобы ошибка запроса
+    вернулась обычным ответом с кодом ошибки.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    rows = itertools.chain([first], rows) if first is not None else iter(())
     
-    for img_file in image_files:
-        filename_lower = img_file.stem.lower()
-        
-        # Убираем расширение и нормализуем
-        filename_clean = filename_lower.replace('(', '').replace(')', '').replace('-', ' ').replace('_', ' ')
-        name_clean = name_lower.replace('-', ' ').replace('_', ' ')
-        
-        # Разбиваем на слова
-        filename_words = set(filename_clean.split())
-        name_words = set(name_clean.split())
-        
-        # Проверяем совпадение
-        common_words = filename_words.intersection(name_words)
+    def generate():
+        if stream_format == 'ndjson':
+            for row in rows:
+                yield app.json.dumps(row) + '\n'
+            return
         
-        if common_words:
-            # Приоритет: точное совпадение > частичное совпадение
-            priority = len(common_words)
-            
-            # Учитываем пол, если указан
-            if gender:
-                if gender in filename_lower:
-                    priority += 10  # Большой бонус за совпадение пола
-                elif '(самец)' in filename_lower or '(самка)' in filename_lower:
-                    priority -= 5  # Штраф, если пол не совпадает
-            
-            candidates.append((priority, img_file))
+        yield '{"success": true, "%s": [' % key
+        count = 0
+        for row in rows:
+            yield (',' if count else '') + app.json.dumps(row)
+            count += 1
+        yield '], "count": %d}' % count
+    
+    mimetype = 'application/x-ndjson' if stream_format == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def catalog_rows(rows: Iterator[Dict], insect_type: str, fields: Optional[List[str]],
+                 add_type: bool = False) -> Iterator[Dict]:
+    """Дополняет потоковые строки каталога так же, как обычные ответы /api/all и /api/search"""
+    for row in rows:
+        if (not fields or 'image_url' in fields) and not row.get('image_url'):
+            image_url = find_insect_image(row.get('name_ru', ''), insect_type, row.get('description', ''))
+            if image_url:
+                row['image_url'] = image_url
+        row = project_fields([row], fields)[0]
+        if add_type:
+            # Добавляем тип насекомого для фильтрации на фронтенде
+            row['insect_type'] = insect_type
+        yield row
+
+def parse_page_args(source) -> tuple:
+    """
+    Параметры постраничной выдачи из query string или тела запроса
     
-    # Сортируем по приоритету (больше = лучше)
-    candidates.sort(key=lambda x: x[0], reverse=True)
+    Returns:
+        (limit, cursor, fields); limit=None - вернуть все результаты
+    """
+    limit = source.get('limit')
+    if limit in (None, ''):
+        limit = None
+    else:
+        limit = int(limit)
+        if limit < 1:
+            raise ValueError('limit должен быть положительным')
+        limit = min(limit, PAGINATION_CONFIG['max_limit'])
     
-    if candidates:
-        best_match = candidates[0][1]
-        # Возвращаем относительный путь для URL
-        relative_path = best_match.relative_to(IMAGE_BASE_DIR)
-        return f'/data/{relative_path.as_posix()}'
+    cursor = source.get('cursor') or None
     
-    return ''
+    fields = source.get('fields')
+    if isinstance(fields, str):
+        fields = [name.strip() for name in fields.split(',') if name.strip()]
+    return limit, cursor, fields or None
+
+def catalog_search_params(source) -> Dict:
+    """Общие для всех типов параметры поиска /api/catalog (размер, цвет, место, период)"""
+    return {name: source.get(name) for name in CATALOG_SEARCH_PARAMS if source.get(name)}
+
+def image_query_fields(fields: Optional[List[str]]) -> Optional[List[str]]:
+    """Колонки, которые нужно выбрать из базы, чтобы подобрать image_url"""
+    if not fields or 'image_url' not in fields:
+        return fields
+    return list(fields) + ['name_ru', 'description']
+
+def project_fields(results: List[Dict], fields: Optional[List[str]]) -> List[Dict]:
+    """Оставить в результатах только запрошенные поля (id остаётся всегда)"""
+    if not fields:
+        return results
+    keep = set(fields) | {'id'}
+    return [{key: value for key, value in result.items() if key in keep} for result in results]
 
 @app.route('/')
 def index():
@@ -135,7 +425,10 @@ def login():
         if not username or not password:
             return jsonify({'error': 'Логин и пароль обязательны'}), 400
         
-        user = User.verify_password(username, password)
+        try:
+            user = User.verify_password(username, password)
+        except PasswordHashBusy as e:
+            return jsonify({'error': str(e)}), 503
         if user:
             login_user(user)
             return jsonify({
@@ -169,7 +462,10 @@ def register():
         if User.get_by_username(username):
             return jsonify({'error': 'Пользователь с таким логином уже существует'}), 400
         
-        user = User.create_user(username, email, password, name, 'пользователь')
+        try:
+            user = User.create_user(username, email, password, name, 'пользователь')
+        except PasswordHashBusy as e:
+            return jsonify({'error': str(e)}), 503
         if user:
             login_user(user)
             return jsonify({
@@ -236,26 +532,74 @@ def search_insects():
         if insect_type not in valid_types:
             return jsonify({'error': 'Неверный тип насекомого'}), 400
         
+        limit, cursor, fields = parse_page_args(data)
+        
+        # Большие выборки можно получать потоком (без пагинации и кэша)
+        stream_format = parse_stream_format(data)
+        if stream_format:
+            rows = db.iter_search_insects(insect_type, params, image_query_fields(fields))
+            return stream_rows(catalog_rows(rows, insect_type, fields), stream_format)
+        
         # Поиск в базе данных
-        results = db.search_insects(insect_type, params)
+        page = db.search_insects_page(insect_type, params, limit, cursor, image_query_fields(fields))
+        results = page['results']
         
         # Добавляем URL изображений к результатам
-        for result in results:
-            if not result.get('image_url'):
-                image_url = find_insect_image(
-                    result.get('name_ru', ''),
-                    insect_type,
-                    result.get('description', '')
-                )
-                if image_url:
+        if not fields or 'image_url' in fields:
+            for result, image_url in zip(results, find_insect_images(results, insect_type)):
+                if not result.get('image_url') and image_url:
                     result['image_url'] = image_url
+        results = project_fields(results, fields)
         
-        return jsonify({
-            'success': True,
-            'count': len(results),
-            'results': results
-        })
+        with metrics.stage('serialize'):
+            return jsonify({
+                'success': True,
+                'count': len(results),
+                'total': page['total'],
+                'next_cursor': page['next_cursor'],
+                'results': results
+            })
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search/similar', methods=['POST'])
+def search_similar_insects():
+    """API endpoint для поиска наиболее похожих видов (без строгого совпадения всех критериев)"""
+    try:
+        data = request.json
+        
+        insect_type = data.get('type')
+        params = data.get('params', {})
+        
+        valid_types = ['dragonfly', 'beetle', 'butterfly']
+        if insect_type not in valid_types:
+            return jsonify({'error': 'Неверный тип насекомого'}), 400
+        
+        top_k = int(data.get('limit') or 20)
+        if top_k < 1:
+            return jsonify({'error': 'limit должен быть положительным'}), 400
+        top_k = min(top_k, PAGINATION_CONFIG['max_limit'])
+        
+        with metrics.stage('rank'):
+            results = db.similar_insects(insect_type, params, top_k)
+        
+        # Добавляем URL изображений к результатам
+        for result, image_url in zip(results, find_insect_images(results, insect_type)):
+            if not result.get('image_url') and image_url:
+                result['image_url'] = image_url
+        
+        with metrics.stage('serialize'):
+            return jsonify({
+                'success': True,
+                'count': len(results),
+                'results': results
+            })
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -267,26 +611,120 @@ def get_all_insects(insect_type):
         if insect_type not in valid_types:
             return jsonify({'error': 'Неверный тип насекомого'}), 400
         
-        results = db.get_all_insects(insect_type)
+        limit, cursor, fields = parse_page_args(request.args)
         
-        # Добавляем URL изображений и тип насекомого к результатам
-        for result in results:
-            if not result.get('image_url'):
-                image_url = find_insect_image(
-                    result.get('name_ru', ''),
-                    insect_type,
-                    result.get('description', '')
-                )
-                if image_url:
+        stream_format = parse_stream_format(request.args)
+        if stream_format:
+            rows = db.iter_all_insects(insect_type, image_query_fields(fields))
+            return stream_rows(catalog_rows(rows, insect_type, fields, add_type=True), stream_format)
+        
+        page = db.get_all_insects_page(insect_type, limit, cursor, image_query_fields(fields))
+        results = page['results']
+        
+        # Добавляем URL изображений к результатам
+        if not fields or 'image_url' in fields:
+            for result, image_url in zip(results, find_insect_images(results, insect_type)):
+                if not result.get('image_url') and image_url:
                     result['image_url'] = image_url
-            # Добавляем тип насекомого для фильтрации на фронтенде
+        results = project_fields(results, fields)
+        
+        # Добавляем тип насекомого для фильтрации на фронтенде
+        for result in results:
             result['insect_type'] = insect_type
         
+        with metrics.stage('serialize'):
+            return jsonify({
+                'success': True,
+                'count': len(results),
+                'total': page['total'],
+                'next_cursor': page['next_cursor'],
+                'results': results
+            })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/key/<insect_type>', methods=['GET'])
+def identification_key_step(insect_type):
+    """
+    Шаг определительного ключа
+    
+    Query: node - номер узла (0 - начало), version - версия ключа из прошлого ответа.
+    Если каталог изменился и версия устарела, определение начинается заново.
+    """
+    try:
+        valid_types = ['dragonfly', 'beetle', 'butterfly']
+        if insect_type not in valid_types:
+            return jsonify({'error': 'Неверный тип насекомого'}), 400
+        
+        key, version = db.get_identification_key(insect_type)
+        key_version = f"{version[0]}.{version[1]}"
+        
+        node = int(request.args.get('node') or 0)
+        restarted = request.args.get('version', key_version) != key_version
+        if restarted:
+            node = 0
+        step = key.step(node)
+        
+        candidates = [key.rows[insect_id] for insect_id in step['candidates']]
+        image_urls = find_insect_images(candidates, insect_type)
+        step['candidates'] = [
+            {
+                'id': insect['id'],
+                'name_ru': insect.get('name_ru', ''),
+                'name_lat': insect.get('name_lat', ''),
+                'image_url': insect.get('image_url') or image_url
+            }
+            for insect, image_url in zip(candidates, image_urls)
+        ]
+        
         return jsonify({
             'success': True,
-            'count': len(results),
-            'results': results
+            'version': key_version,
+            'restarted': restarted,
+            'count': len(candidates),
+            **step
         })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/catalog', methods=['GET'])
+def get_catalog():
+    """Получить насекомых всех (или выбранных) типов одним запросом"""
+    try:
+        types = request.args.get('types')
+        insect_types = [t.strip() for t in types.split(',') if t.strip()] if types else list(INSECT_TYPES)
+        if any(t not in INSECT_TYPES for t in insect_types):
+            return jsonify({'error': 'Неверный тип насекомого'}), 400
+        
+        _, _, fields = parse_page_args(request.args)
+        # Поиск по нескольким типам - один запрос к секциям species
+        results = db.get_catalog(insect_types, image_query_fields(fields), catalog_search_params(request.args))
+        
+        # Добавляем URL изображений к результатам
+        if not fields or 'image_url' in fields:
+            for result, image_url in zip(results, find_catalog_images(results)):
+                if not result.get('image_url') and image_url:
+                    result['image_url'] = image_url
+        # Тип насекомого нужен фронтенду всегда
+        results = project_fields(results, fields and list(fields) + ['insect_type'])
+        
+        counts = {insect_type: 0 for insect_type in insect_types}
+        for result in results:
+            counts[result['insect_type']] += 1
+        
+        with metrics.stage('serialize'):
+            return jsonify({
+                'success': True,
+                'count': len(results),
+                'counts': counts,
+                'results': results
+            })
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -298,11 +736,15 @@ def get_filter_options(insect_type):
         if insect_type not in valid_types:
             return jsonify({'error': 'Неверный тип насекомого'}), 400
         
-        options = db.get_filter_options(insect_type)
-        return jsonify({
+        options, etag = db.get_filter_options_with_etag(insect_type)
+        response = jsonify({
             'success': True,
             'options': options
         })
+        # Повторный запрос с If-None-Match получит 304 без тела
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -320,10 +762,7 @@ def create_expert_request():
         if not description:
             return jsonify({'error': 'Описание насекомого обязательно'}), 400
         
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with db.cursor() as cursor:
             cursor.execute("""
                 INSERT INTO "ЗапросЭксперту" 
                 (id_пользователя, описание_насекомого, место_наблюдения, дата_наблюдения, дополнительные_данные, статус)
@@ -332,16 +771,12 @@ def create_expert_request():
             """, (current_user.id, description, location, observation_date or None, additional_data))
             
             request_id = cursor.fetchone()[0]
-            conn.commit()
-            
-            return jsonify({
-                'success': True,
-                'request_id': request_id,
-                'message': 'Запрос отправлен эксперту'
-            })
-        finally:
-            cursor.close()
-            conn.close()
+        
+        return jsonify({
+            'success': True,
+            'request_id': request_id,
+            'message': 'Запрос отправлен эксперту'
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -350,75 +785,73 @@ def create_expert_request():
 def get_expert_requests():
     """Получить запросы к эксперту"""
     try:
-        from psycopg2.extras import RealDictCursor
-        conn = db.get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        since = parse_since(request.args.get('since'))
+        filters = parse_request_filters(request.args)
+        limit, page_cursor, _ = parse_page_args(request.args)
         
-        try:
-            if current_user.is_admin():
-                # Админ видит все запросы
-                cursor.execute("""
-                    SELECT 
-                        z.id_запроса,
-                        z.описание_насекомого,
-                        z.место_наблюдения,
-                        z.дата_наблюдения,
-                        z.дополнительные_данные,
-                        z.статус,
-                        z.дата_создания,
-                        z.дата_ответа,
-                        z.ответ_эксперта,
-                        z.изображение_ответа,
-                        z.id_вида_насекомого,
-                        u.имя as имя_пользователя,
-                        u.email as email_пользователя
-                    FROM "ЗапросЭксперту" z
-                    LEFT JOIN "Пользователь" u ON z.id_пользователя = u.id_пользователя
-                    ORDER BY z.дата_создания DESC
-                """)
-            else:
-                # Обычный пользователь видит только свои запросы
-                cursor.execute("""
-                    SELECT 
-                        z.id_запроса,
-                        z.описание_насекомого,
-                        z.место_наблюдения,
-                        z.дата_наблюдения,
-                        z.дополнительные_данные,
-                        z.статус,
-                        z.дата_создания,
-                        z.дата_ответа,
-                        z.ответ_эксперта,
-                        z.изображение_ответа,
-                        z.id_вида_насекомого,
-                        u.имя as имя_пользователя,
-                        u.email as email_пользователя
-                    FROM "ЗапросЭксперту" z
-                    LEFT JOIN "Пользователь" u ON z.id_пользователя = u.id_пользователя
-                    WHERE z.id_пользователя = %s
-                    ORDER BY z.дата_создания DESC
-                """, (current_user.id,))
-            
-            results = [dict(row) for row in cursor.fetchall()]
-            # Преобразуем даты в строки
-            for result in results:
-                if result.get('дата_создания'):
-                    result['дата_создания'] = result['дата_создания'].isoformat()
-                if result.get('дата_ответа'):
-                    result['дата_ответа'] = result['дата_ответа'].isoformat()
-                if result.get('дата_наблюдения'):
-                    result['дата_наблюдения'] = str(result['дата_наблюдения'])
-            
-            return jsonify({
-                'success': True,
-                'requests': results
-            })
-        finally:
-            cursor.close()
-            conn.close()
+        stream_format = parse_stream_format(request.args)
+        if stream_format:
+            query, values = expert_requests_query(current_user, since, filters)
+            rows = (format_request_dates(row) for row in db.iter_rows(query, values))
+            return stream_rows(rows, stream_format, key='requests')
+        
+        query, values = expert_requests_query(current_user, since, filters,
+                                              parse_request_cursor(page_cursor), limit)
+        with db.cursor(dict_rows=True) as cursor:
+            current_version = None
+            if since is None:
+                # Версия читается до списка: изменения между запросами вернёт следующий ?since=
+                cursor.execute(EXPERT_REQUESTS_VERSION_QUERY)
+                current_version = cursor.fetchone()['версия']
+            cursor.execute(query, values)
+            rows = [dict(row) for row in cursor.fetchall()]
+        
+        with metrics.stage('serialize'):
+            return jsonify(expert_requests_payload(rows, since, limit, current_version))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/expert-request/<int:request_id>', methods=['GET'])
+@login_required
+def get_expert_request(request_id):
+    """Карточка запроса к эксперту (полная проекция): админ - любой, пользователь - свой"""
+    try:
+        query, values = expert_requests_query(current_user, request_id=request_id)
+        with db.cursor(dict_rows=True) as cursor:
+            cursor.execute(query, values)
+            row = cursor.fetchone()
+        
+        if row is None:
+            return jsonify({'error': 'Запрос не найден'}), 404
+        
+        return jsonify({
+            'success': True,
+            'request': format_request_dates(dict(row))
+        })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/expert-requests/events', methods=['GET'])
+@login_required
+def expert_request_events():
+    """
+    Поток изменений запросов к эксперту (Server-Sent Events)
+    
+    События change приходят после вставки или ответа на запрос (админ получает
+    все, пользователь - свои) и содержат id, status и version; клиент дочитывает
+    изменения через GET /api/expert-requests?since=<version>. Событие resync -
+    уведомления могли быть потеряны, нужно дочитать по последней известной версии.
+    """
+    try:
+        user_id = None if current_user.is_admin() else current_user.id
+        stream = request_events.stream(user_id)
+    except TooManySubscribers as e:
+        return jsonify({'error': str(e)}), 503
+    return Response(stream, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/insects-for-selection', methods=['GET'])
 @login_required
 def get_insects_for_selection():
@@ -427,60 +860,27 @@ def get_insects_for_selection():
         if not current_user.is_admin():
             return jsonify({'error': 'Доступ запрещен'}), 403
         
-        all_insects = []
+        type_labels = {
+            'dragonfly': 'Стрекоза',
+            'beetle': 'Жук',
+            'butterfly': 'Бабочка'
+        }
         
-        # Получаем стрекоз
-        dragonflies = db.get_all_insects('dragonfly')
-        for insect in dragonflies:
-            all_insects.append({
-                'id': insect.get('id'),
-                'name_ru': insect.get('name_ru', ''),
-                'name_lat': insect.get('name_lat', ''),
-                'type': 'dragonfly',
-                'type_label': 'Стрекоза',
-                'size': f"{insect.get('size_min', '')}-{insect.get('size_max', '')} мм" if insect.get('size_min') or insect.get('size_max') else '',
-                'color': insect.get('color', ''),
-                'image_url': find_insect_image(
-                    insect.get('name_ru', ''),
-                    'dragonfly',
-                    insect.get('description', '')
-                ) or insect.get('image_url', '')
-            })
+        # Все типы одним запросом
+        insects = db.get_catalog(fields=['name_ru', 'name_lat', 'size_min', 'size_max', 'color',
+                                         'description', 'image_url'])
         
-        # Получаем жуков
-        beetles = db.get_all_insects('beetle')
-        for insect in beetles:
-            all_insects.append({
-                'id': insect.get('id'),
-                'name_ru': insect.get('name_ru', ''),
-                'name_lat': insect.get('name_lat', ''),
-                'type': 'beetle',
-                'type_label': 'Жук',
-                'size': f"{insect.get('size_min', '')}-{insect.get('size_max', '')} мм" if insect.get('size_min') or insect.get('size_max') else '',
-                'color': insect.get('color', ''),
-                'image_url': find_insect_image(
-                    insect.get('name_ru', ''),
-                    'beetle',
-                    insect.get('description', '')
-                ) or insect.get('image_url', '')
-            })
-        
-        # Получаем бабочек
-        butterflies = db.get_all_insects('butterfly')
-        for insect in butterflies:
+        all_insects = []
+        for insect, image_url in zip(insects, find_catalog_images(insects)):
             all_insects.append({
                 'id': insect.get('id'),
                 'name_ru': insect.get('name_ru', ''),
                 'name_lat': insect.get('name_lat', ''),
-                'type': 'butterfly',
-                'type_label': 'Бабочка',
+                'type': insect['insect_type'],
+                'type_label': type_labels[insect['insect_type']],
                 'size': f"{insect.get('size_min', '')}-{insect.get('size_max', '')} мм" if insect.get('size_min') or insect.get('size_max') else '',
                 'color': insect.get('color', ''),
-                'image_url': find_insect_image(
-                    insect.get('name_ru', ''),
-                    'butterfly',
-                    insect.get('description', '')
-                ) or insect.get('image_url', '')
+                'image_url': image_url or insect.get('image_url', '')
             })
         
         return jsonify({
@@ -490,72 +890,6 @@ def get_insects_for_selection():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def find_insect_id_in_vid_nasekomogo(insect_id: int, insect_type: str) -> Optional[int]:
-    """
-    Находит соответствующий ID в таблице ВидНасекомого по ID из таблиц dragonflies/beetles/butterflies
-    
-    Args:
-        insect_id: ID из таблицы dragonflies/beetles/butterflies
-        insect_type: 'dragonfly', 'beetle' или 'butterfly'
-    
-    Returns:
-        ID из таблицы ВидНасекомого или None
-    """
-    if not insect_id:
-        return None
-    
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    try:
-        # Определяем таблицу
-        table_map = {
-            'dragonfly': 'dragonflies',
-            'beetle': 'beetles',
-            'butterfly': 'butterflies'
-        }
-        table_name = table_map.get(insect_type)
-        if not table_name:
-            return None
-        
-        # Получаем название насекомого
-        cursor.execute(f"""
-            SELECT name_ru, name_lat FROM {table_name} WHERE id = %s
-        """, (insect_id,))
-        
-        row = cursor.fetchone()
-        if not row:
-            return None
-        
-        name_ru, name_lat = row
-        
-        # Определяем тип для таблицы ВидНасекомого
-        type_map = {
-            'dragonfly': 'стрекоза',
-            'beetle': 'жук',
-            'butterfly': 'бабочка'
-        }
-        vid_type = type_map.get(insect_type)
-        
-        # Ищем в таблице ВидНасекомого
-        cursor.execute("""
-            SELECT id_вида FROM "ВидНасекомого"
-            WHERE название_русское = %s AND тип_насекомого = %s
-            LIMIT 1
-        """, (name_ru, vid_type))
-        
-        result = cursor.fetchone()
-        if result:
-            return result[0]
-        
-        return None
-    except Exception as e:
-        print(f"Ошибка при поиске ID в ВидНасекомого: {e}")
-        return None
-    finally:
-        cursor.close()
-        conn.close()
-
 @app.route('/api/expert-request/<int:request_id>/answer', methods=['POST'])
 @login_required
 def answer_expert_request(request_id):
@@ -573,48 +907,115 @@ def answer_expert_request(request_id):
         if not answer:
             return jsonify({'error': 'Ответ обязателен'}), 400
         
-        # Если указан ID насекомого, пытаемся найти соответствующий ID в ВидНасекомого
-        vid_insect_id = None
+        # Вид из каталога сопоставляется ВидНасекомого по species_crosswalk
+        # (sql/add_species_crosswalk.sql) в том же UPDATE; нет соответствия - NULL
         if insect_id and insect_type:
-            vid_insect_id = find_insect_id_in_vid_nasekomogo(insect_id, insect_type)
-            # Если не нашли, просто не устанавливаем это поле (оно опциональное)
-        
-        conn = db.get_connection()
-        cursor = conn.cursor()
+            try:
+                insect_id = int(insect_id)
+            except (TypeError, ValueError):
+                return jsonify({'error': f'Неверный ID насекомого: {insect_id}'}), 400
+        else:
+            insect_id = insect_type = None
         
-        try:
+        with db.cursor() as cursor:
             cursor.execute("""
                 UPDATE "ЗапросЭксперту"
                 SET ответ_эксперта = %s,
                     изображение_ответа = %s,
-                    id_вида_насекомого = %s,
+                    id_вида_насекомого = (
+                        SELECT id_вида FROM species_crosswalk
+                        WHERE insect_type = %s AND legacy_id = %s
+                    ),
                     id_эксперта = %s,
                     статус = 'отвечено',
                     дата_ответа = CURRENT_TIMESTAMP
                 WHERE id_запроса = %s
-            """, (answer, image_url or None, vid_insect_id, current_user.id, request_id))
-            
-            if cursor.rowcount == 0:
-                return jsonify({'error': 'Запрос не найден'}), 404
-            
-            conn.commit()
+            """, (answer, image_url or None, insect_type, insect_id, current_user.id, request_id))
             
-            return jsonify({
-                'success': True,
-                'message': 'Ответ отправлен'
-            })
-        finally:
-            cursor.close()
-            conn.close()
+            updated = cursor.rowcount
+        
+        if updated == 0:
+            return jsonify({'error': 'Запрос не найден'}), 404
+        
+        return jsonify({
+            'success': True,
+            'message': 'Ответ отправлен'
+        })
     except Exception as e:
         import traceback
         print(f"Ошибка при отправке ответа: {e}")
         print(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/admin/cache-stats', methods=['GET'])
+@login_required
+def get_cache_stats():
+    """Счётчики кэша результатов поиска (попадания, промахи, размер)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Доступ запрещен'}), 403
+    return jsonify({
+        'success': True,
+        'search': db.search_cache_stats()
+    })
+
+@app.route('/api/admin/slow-queries', methods=['GET', 'DELETE'])
+@login_required
+def get_slow_queries():
+    """
+    Сводка медленных SQL-запросов по формам параметров (худшие сверху)
+    
+    Query: ?sort=total|max|mean|count&limit=20; DELETE очищает сводку
+    """
+    if not current_user.is_admin():
+        return jsonify({'error': 'Доступ запрещен'}), 403
+    if request.method == 'DELETE':
+        slow_queries.reset()
+        return jsonify({'success': True})
+    try:
+        limit = int(request.args.get('limit') or 20)
+        shapes = slow_queries.summary(request.args.get('sort') or 'total', limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'threshold_ms': SLOW_QUERY_CONFIG['threshold_ms'],
+        'explain': SLOW_QUERY_CONFIG['explain'],
+        'shapes': shapes
+    })
+
+# Адреса и подсети, с которых /metrics доступен без входа (METRICS_CONFIG['allow_ips'])
+METRICS_ALLOWED_NETWORKS = [ipaddress.ip_network(ip, strict=False) for ip in METRICS_CONFIG['allow_ips']]
+
+def metrics_access_allowed() -> bool:
+    """Доступ к /metrics: токен Prometheus, разрешённый адрес или администратор"""
+    token = METRICS_CONFIG['token']
+    if token:
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip().encode(), token.encode()):
+            return True
+    try:
+        address = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        address = None
+    if address is not None and any(address in network for network in METRICS_ALLOWED_NETWORKS):
+        return True
+    return current_user.is_authenticated and current_user.is_admin()
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Метрики процесса в текстовом формате Prometheus (время запросов по маршрутам и SQL-запросам)"""
+    if not metrics_access_allowed():
+        return jsonify({'error': 'Доступ запрещен'}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/data/<path:filename>')
 def serve_image(filename):
-    """Отдача изображений из папки data"""
+    """
+    Отдача изображений из папки data
+    
+    С параметрами ?w=320&fmt=webp отдаётся уменьшенная копия или другой формат
+    (см. image_variants.py); fmt=auto или только w - формат по заголовку Accept.
+    """
     try:
         # Безопасность: проверяем, что путь не выходит за пределы data
         file_path = IMAGE_BASE_DIR / filename
@@ -624,7 +1025,25 @@ def serve_image(filename):
         if not file_path.exists():
             return jsonify({'error': 'Файл не найден'}), 404
         
-        return send_from_directory(IMAGE_BASE_DIR, filename)
+        variant = parse_variant(request.args, request.headers.get('Accept'))
+        if variant is None or file_path.suffix.lower() not in SOURCE_SUFFIXES:
+            return send_from_directory(IMAGE_BASE_DIR, filename)
+        
+        with metrics.stage('image_variant'):
+            variant_path = image_variants.get(file_path, variant, build=IMAGE_CONFIG['on_demand'])
+        if variant_path is None:
+            # Варианта ещё нет, формат не поддерживается или оригинал повреждён - отдаём оригинал
+            response = send_from_directory(IMAGE_BASE_DIR, filename)
+        else:
+            # URL не меняется при замене оригинала, поэтому max_age короткий, а повторная
+            # проверка по ETag (ключу кэша вариантов) отвечает 304 без тела
+            response = send_file(variant_path, mimetype=mimetype(variant), max_age=IMAGE_CONFIG['max_age'],
+                                 etag=image_variants.etag(variant_path))
+        if variant.negotiated:
+            response.vary.add('Accept')
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -0,0 +1,632 @@
+"""
+ASGI-режим приложения
+
+Эндпоинты поиска, каталога, фильтров и запросов к эксперту выполняются
+асинхронно на psycopg 3 (AsyncConnectionPool): пока запрос ждёт базу,
+процесс обслуживает другие запросы, и одно подключение занято только на
+время SQL-запроса. Остальные маршруты (страницы, вход, регистрация,
+операции администратора) передаются Flask-приложению из app.py.
+
+SQL строится теми же методами Database, что и в синхронном режиме, кэши
+(версии данных, результаты поиска, фасеты, пользователи) тоже общие.
+
+Запуск: python run_asgi.py (или uvicorn asgi_app:application)
+"""
+import asyncio
+import functools
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, FrozenSet, List, Optional, Tuple
+
+import psycopg
+import psycopg.errors
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg.types.json import Jsonb
+from psycopg_pool import AsyncConnectionPool
+from psycopg2.extras import Json
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+from app import (
+    EXPERT_REQUESTS_VERSION_QUERY, app as flask_app, catalog_rows, catalog_search_params, expert_requests_payload,
+    expert_requests_query, find_catalog_images, find_insect_images, format_request_dates, image_query_fields,
+    parse_page_args, parse_request_cursor, parse_request_filters, parse_since, parse_stream_format,
+    project_fields, request_events
+)
+import metrics
+import slow_queries
+from request_events import HEARTBEAT, TooManySubscribers, format_event, retry_hint
+from auth import User, USERS_VERSION_KEY, USERS_VERSION_QUERY, cached_users_version, remember_users_version
+from config import ASGI_CONFIG, CACHE_CONFIG, DB_CONFIG, DB_POOL_CONFIG, EVENTS_CONFIG, STREAM_CONFIG
+from database import ATTRIBUTE_SEARCH_PARAMS, ATTRIBUTE_TERMS_QUERY, Database, INSECT_TYPES
+
+
+def _adapt(values) -> List:
+    """Параметры запросов Database (psycopg2) в виде для psycopg 3"""
+    return [Jsonb(value.adapted) if isinstance(value, Json) else value for value in values or ()]
+
+
+class AsyncDatabase:
+    """Асинхронное выполнение запросов Database на пуле psycopg 3"""
+
+    def __init__(self):
+        # Построители SQL и общие кэши синхронного режима
+        self.sync = Database()
+        self._pool: Optional[AsyncConnectionPool] = None
+
+    async def open(self):
+        """Открыть пул подключений (при старте приложения)"""
+        conninfo = make_conninfo(
+            host=DB_CONFIG['host'],
+            port=DB_CONFIG['port'],
+            dbname=DB_CONFIG['database'],
+            user=DB_CONFIG['user'],
+            password=DB_CONFIG['password'],
+        )
+        self._pool = AsyncConnectionPool(
+            conninfo,
+            min_size=ASGI_CONFIG['db_pool_min'],
+            max_size=ASGI_CONFIG['db_pool_max'],
+            timeout=DB_POOL_CONFIG['acquire_timeout'],
+            max_idle=DB_POOL_CONFIG['idle_timeout'],
+            # psycopg 3 сам подготавливает запросы, выполненные на подключении
+            # несколько раз (prepare_threshold); prepared_max - предел на подключение
+            kwargs={'row_factory': dict_row,
+                    'prepare_threshold': 2 if DB_POOL_CONFIG['max_prepared'] > 0 else None},
+            configure=self._configure,
+            open=False,
+        )
+        await self._pool.open()
+
+    @staticmethod
+    async def _configure(conn):
+        if DB_POOL_CONFIG['max_prepared'] > 0:
+            conn.prepared_max = DB_POOL_CONFIG['max_prepared']
+
+    async def close(self):
+        """Закрыть пул подключений (при остановке приложения)"""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @asynccontextmanager
+    async def connection(self):
+        """Подключение из пула (время ожидания учитывается как этап db_connect)"""
+        started = time.perf_counter()
+        async with self._pool.connection() as conn:
+            metrics.add_stage('db_connect', time.perf_counter() - started)
+            yield conn
+
+    async def _execute(self, conn, query: str, values):
+        started = time.perf_counter()
+        cursor = None
+        try:
+            cursor = await conn.execute(query, _adapt(values))
+            return cursor
+        finally:
+            seconds = time.perf_counter() - started
+            metrics.record_query(query, seconds, cursor.rowcount if cursor else -1)
+            if slow_queries.is_slow(seconds):
+                shape = slow_queries.current_shape(query)
+                plan = await self._explain(conn, query, values) if slow_queries.should_explain(query, shape) else None
+                slow_queries.record(query, values, seconds, shape, plan)
+
+    @staticmethod
+    async def _explain(conn, query: str, values) -> str:
+        """План медленного запроса (см. database._TimedCursorMixin._explain) во вложенной транзакции"""
+        try:
+            async with conn.transaction(force_rollback=True):
+                cursor = await conn.execute(slow_queries.explain_query(query), _adapt(values))
+                return '\n'.join(next(iter(row.values())) for row in await cursor.fetchall())
+        except psycopg.Error as e:
+            return f"EXPLAIN не выполнен: {e}"
+
+    async def fetch_all(self, query: str, values=None) -> List[Dict]:
+        async with self.connection() as conn:
+            cursor = await self._execute(conn, query, values)
+            with metrics.stage('db_fetch'):
+                return await cursor.fetchall()
+
+    async def fetch_one(self, query: str, values=None) -> Optional[Dict]:
+        async with self.connection() as conn:
+            cursor = await self._execute(conn, query, values)
+            with metrics.stage('db_fetch'):
+                return await cursor.fetchone()
+
+    async def iter_rows(self, query: str, values=None) -> AsyncIterator[Dict]:
+        """Построчное чтение серверным курсором (см. Database.iter_rows)"""
+        async with self.connection() as conn:
+            async with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = STREAM_CONFIG['itersize']
+                started = time.perf_counter()
+                await cursor.execute(query, _adapt(values))
+                metrics.record_query(query, time.perf_counter() - started, -1)
+                async for row in cursor:
+                    yield row
+
+    async def data_version(self, insect_type: str) -> Tuple[int, int]:
+        """Версия данных каталога одного типа (см. Database.get_data_version)"""
+        self.sync._check_type(insect_type)
+        now = time.monotonic()
+        cached = Database._data_versions.get(insect_type)
+        if cached and now - cached[0] < CACHE_CONFIG['data_version_ttl']:
+            db_version = cached[1]
+        else:
+            try:
+                row = await self.fetch_one(
+                    "SELECT version FROM catalog_versions WHERE table_name = %s", (insect_type,)
+                )
+                db_version = row['version'] if row else 0
+            except psycopg.errors.UndefinedTable:
+                db_version = 0
+            Database._data_versions[insect_type] = (now, db_version)
+        return db_version, Database._local_versions.get(insect_type, 0)
+
+    async def select_page(self, insect_type: str, conditions: List[str], values: List,
+                          rank_sql: Optional[str], rank_values: List, limit: Optional[int],
+                          cursor: Optional[str], fields: Optional[List[str]]) -> Dict:
+        """Страница строк каталога (см. Database._select_page)"""
+        after = self.sync._parse_cursor(cursor, ranked=bool(rank_sql))
+        query, page_values = self.sync._page_query(conditions, values, rank_sql, rank_values,
+                                                   after, limit, fields)
+        rows = await self.fetch_all(query, page_values)
+        results, next_cursor = self.sync._page_results(rows, limit, bool(rank_sql))
+
+        if limit is None:
+            total = len(results)
+        elif after is None:
+            total = await self.count(insect_type, conditions, values)
+        else:
+            total = None
+        return {'results': results, 'next_cursor': next_cursor, 'total': total}
+
+    async def count(self, insect_type: str, conditions: List[str], values: List) -> int:
+        """Число строк по условиям (общий кэш с Database._count)"""
+        key = self.sync._count_key(conditions, values)
+        version = await self.data_version(insect_type)
+        cached = Database._count_cache.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+        row = await self.fetch_one(self.sync._count_query(conditions), values)
+        total = row['count']
+        self.sync._remember_count(key, version, total)
+        return total
+
+    async def search_insects_page(self, insect_type: str, params: Dict, limit: Optional[int] = None,
+                                  cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> Dict:
+        """Поиск с постраничной выдачей (см. Database.search_insects_page)"""
+        self.sync._check_type(insect_type)
+        key = self.sync._search_cache_key(insect_type, params, limit, cursor, fields)
+        version = await self.data_version(insect_type)
+        page = Database._search_cache.get(key, version)
+        if page is None:
+            conditions, values, rank_terms, rank_values = self.sync._search_conditions(
+                insect_type, params, await self.attribute_terms(insect_type, params))
+            rank_sql = " + ".join(rank_terms) if rank_terms else None
+            with slow_queries.query_shape(slow_queries.search_shape(insect_type, params)):
+                page = await self.select_page(insect_type, conditions, values, rank_sql, rank_values,
+                                              limit, cursor, fields)
+            Database._search_cache.put(key, version, page)
+        return dict(page, results=[dict(row) for row in page['results']])
+
+    async def attribute_terms(self, insect_type: str, params: Dict) -> Optional[Dict[str, FrozenSet[str]]]:
+        """Термины атрибутов каталога (см. Database._attribute_terms); None - в params нет атрибутов поиска"""
+        if not any(params.get(param) for param in ATTRIBUTE_SEARCH_PARAMS.get(insect_type, ())):
+            return None
+        version = await self.data_version(insect_type)
+        cached = Database._attribute_terms_cache.get(insect_type)
+        if cached and cached[0] == version:
+            return cached[1]
+        rows = await self.fetch_all(ATTRIBUTE_TERMS_QUERY, (insect_type, list(ATTRIBUTE_SEARCH_PARAMS[insect_type])))
+        terms = Database.group_attribute_terms((row['key'], row['term']) for row in rows)
+        Database._attribute_terms_cache[insect_type] = (version, terms)
+        return terms
+
+    async def get_all_insects_page(self, insect_type: str, limit: Optional[int] = None,
+                                   cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> Dict:
+        conditions, values, _, _ = self.sync._search_conditions(insect_type, {})
+        return await self.select_page(insect_type, conditions, values, None, [], limit, cursor, fields)
+
+    async def iter_search_insects(self, insect_type: str, params: Dict,
+                                  fields: Optional[List[str]] = None) -> AsyncIterator[Dict]:
+        conditions, values, rank_terms, rank_values = self.sync._search_conditions(
+            insect_type, params, await self.attribute_terms(insect_type, params))
+        rank_sql = " + ".join(rank_terms) if rank_terms else None
+        query, query_values = self.sync._page_query(conditions, values, rank_sql, rank_values,
+                                                    None, None, fields)
+        async for row in self.iter_rows(query, query_values):
+            row.pop('search_rank', None)
+            yield row
+
+    def iter_all_insects(self, insect_type: str, fields: Optional[List[str]] = None) -> AsyncIterator[Dict]:
+        conditions, values, _, _ = self.sync._search_conditions(insect_type, {})
+        query, query_values = self.sync._page_query(conditions, values, None, [], None, None, fields)
+        return self.iter_rows(query, query_values)
+
+    async def get_catalog(self, insect_types: Optional[List[str]] = None,
+                          fields: Optional[List[str]] = None, params: Optional[Dict] = None) -> List[Dict]:
+        """Насекомые нескольких типов одним запросом (см. Database.get_catalog)"""
+        query, values = self.sync._catalog_query(insect_types, fields, params)
+        return await self.fetch_all(query, values)
+
+    async def get_filter_options_with_etag(self, insect_type: str) -> Tuple[Dict, str]:
+        """
+        Фасеты фильтров с ETag (общий кэш с Database.get_filter_options_with_etag)
+
+        Фасеты пересчитываются только после изменения каталога, а разбор
+        значений - работа процессора, поэтому пересчёт выполняется в потоке.
+        """
+        version = await self.data_version(insect_type)
+        cached = Database._filter_options_cache.get(insect_type)
+        if cached and cached[0] == version:
+            return cached[1], cached[2]
+        return await asyncio.to_thread(self.sync.get_filter_options_with_etag, insect_type)
+
+
+db = AsyncDatabase()
+
+
+def json_response(payload, status_code: int = 200) -> Response:
+    """JSON-ответ с той же сериализацией, что jsonify во Flask"""
+    with metrics.stage('serialize'):
+        body = flask_app.json.dumps(payload)
+    return Response(body, status_code=status_code, media_type='application/json')
+
+
+def error_response(message: str, status_code: int) -> Response:
+    return json_response({'error': message}, status_code)
+
+
+def stream_response(rows: AsyncIterator[Dict], stream_format: str, key: str = 'results') -> StreamingResponse:
+    """Потоковый ответ (см. app.stream_rows)"""
+    async def generate():
+        if stream_format == 'ndjson':
+            async for row in rows:
+                yield flask_app.json.dumps(row) + '\n'
+            return
+
+        yield '{"success": true, "%s": [' % key
+        count = 0
+        async for row in rows:
+            yield (',' if count else '') + flask_app.json.dumps(row)
+            count += 1
+        yield '], "count": %d}' % count
+
+    media_type = 'application/x-ndjson' if stream_format == 'ndjson' else 'application/json'
+    return StreamingResponse(generate(), media_type=media_type)
+
+
+async def _prefetch(rows: AsyncIterator[Dict]) -> AsyncIterator[Dict]:
+    """Прочитать первую строку до отправки заголовков, чтобы ошибка запроса вернулась кодом ошибки"""
+    try:
+        first = await rows.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def chained():
+        if first is None:
+            return
+        yield first
+        async for row in rows:
+            yield row
+    return chained()
+
+
+async def _catalog_stream(rows: AsyncIterator[Dict], insect_type: str, fields: Optional[List[str]],
+                          add_type: bool = False) -> AsyncIterator[Dict]:
+    async for row in rows:
+        for result in catalog_rows([row], insect_type, fields, add_type):
+            yield result
+
+
+def _attach_images(results: List[Dict], image_urls: List[str]):
+    for result, image_url in zip(results, image_urls):
+        if not result.get('image_url') and image_url:
+            result['image_url'] = image_url
+
+
+def profiled(endpoint, route: str):
+    """
+    Профиль запроса асинхронного эндпоинта (см. app.start_request_profile)
+
+    route - шаблон маршрута в записи Flask, чтобы серии метрик обоих режимов совпадали.
+    """
+    @functools.wraps(endpoint)
+    async def wrapper(request: Request) -> Response:
+        profile = metrics.begin_request(route)
+        status = 500
+        try:
+            response = await endpoint(request)
+            status = response.status_code
+            server_timing = metrics.server_timing(profile)
+            if server_timing:
+                response.headers['Server-Timing'] = server_timing
+            return response
+        finally:
+            metrics.end_request(profile, request.method, status)
+    return wrapper
+
+
+async def current_user(request: Request) -> Optional[User]:
+    """Пользователь из сессии Flask-Login (cookie подписана тем же SECRET_KEY)"""
+    cookie = request.cookies.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return None
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        session = serializer.loads(cookie, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return None
+    user_id = session.get('_user_id')
+    if not user_id:
+        return None
+    user_id = int(user_id)
+    version = User.cache_version(user_id, await users_version())
+    user = User.get_cached(user_id, version)
+    if user is None:
+        row = await db.fetch_one("""
+            SELECT id_пользователя, username, email, имя, роль
+            FROM "Пользователь"
+            WHERE id_пользователя = %s
+        """, (user_id,))
+        user = User.remember(tuple(row.values()), version) if row else None
+    return user
+
+
+async def users_version() -> int:
+    """Версия пользователей в базе (см. auth.users_version)"""
+    version = cached_users_version()
+    if version is None:
+        try:
+            row = await db.fetch_one(USERS_VERSION_QUERY, (USERS_VERSION_KEY,))
+            version = row['version'] if row else 0
+        except psycopg.errors.UndefinedTable:
+            version = 0
+        remember_users_version(version)
+    return version
+
+
+async def search_insects(request: Request) -> Response:
+    """API endpoint для поиска насекомых по параметрам"""
+    try:
+        data = await request.json()
+        insect_type = data.get('type')
+        params = data.get('params', {})
+
+        if not insect_type:
+            return error_response('Тип насекомого не указан', 400)
+        if insect_type not in INSECT_TYPES:
+            return error_response('Неверный тип насекомого', 400)
+
+        limit, cursor, fields = parse_page_args(data)
+
+        stream_format = parse_stream_format(data)
+        if stream_format:
+            rows = await _prefetch(db.iter_search_insects(insect_type, params, image_query_fields(fields)))
+            return stream_response(_catalog_stream(rows, insect_type, fields), stream_format)
+
+        page = await db.search_insects_page(insect_type, params, limit, cursor, image_query_fields(fields))
+        results = page['results']
+        if not fields or 'image_url' in fields:
+            _attach_images(results, find_insect_images(results, insect_type))
+        results = project_fields(results, fields)
+
+        return json_response({
+            'success': True,
+            'count': len(results),
+            'total': page['total'],
+            'next_cursor': page['next_cursor'],
+            'results': results
+        })
+    except ValueError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def get_all_insects(request: Request) -> Response:
+    """Получить все насекомые определенного типа"""
+    insect_type = request.path_params['insect_type']
+    try:
+        if insect_type not in INSECT_TYPES:
+            return error_response('Неверный тип насекомого', 400)
+
+        limit, cursor, fields = parse_page_args(request.query_params)
+
+        stream_format = parse_stream_format(request.query_params)
+        if stream_format:
+            rows = await _prefetch(db.iter_all_insects(insect_type, image_query_fields(fields)))
+            return stream_response(_catalog_stream(rows, insect_type, fields, add_type=True), stream_format)
+
+        page = await db.get_all_insects_page(insect_type, limit, cursor, image_query_fields(fields))
+        results = page['results']
+        if not fields or 'image_url' in fields:
+            _attach_images(results, find_insect_images(results, insect_type))
+        results = project_fields(results, fields)
+        for result in results:
+            result['insect_type'] = insect_type
+
+        return json_response({
+            'success': True,
+            'count': len(results),
+            'total': page['total'],
+            'next_cursor': page['next_cursor'],
+            'results': results
+        })
+    except ValueError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def get_catalog(request: Request) -> Response:
+    """Получить насекомых всех (или выбранных) типов одним запросом"""
+    try:
+        types = request.query_params.get('types')
+        insect_types = [t.strip() for t in types.split(',') if t.strip()] if types else list(INSECT_TYPES)
+        if any(t not in INSECT_TYPES for t in insect_types):
+            return error_response('Неверный тип насекомого', 400)
+
+        _, _, fields = parse_page_args(request.query_params)
+        results = await db.get_catalog(insect_types, image_query_fields(fields),
+                                       catalog_search_params(request.query_params))
+        if not fields or 'image_url' in fields:
+            _attach_images(results, find_catalog_images(results))
+        results = project_fields(results, fields and list(fields) + ['insect_type'])
+
+        counts = {insect_type: 0 for insect_type in insect_types}
+        for result in results:
+            counts[result['insect_type']] += 1
+
+        return json_response({
+            'success': True,
+            'count': len(results),
+            'counts': counts,
+            'results': results
+        })
+    except ValueError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def get_filter_options(request: Request) -> Response:
+    """Получить уникальные значения для фильтров"""
+    insect_type = request.path_params['insect_type']
+    try:
+        if insect_type not in INSECT_TYPES:
+            return error_response('Неверный тип насекомого', 400)
+
+        options, etag = await db.get_filter_options_with_etag(insect_type)
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+        # Повторный запрос с If-None-Match получит 304 без тела
+        if_none_match = request.headers.get('if-none-match', '')
+        if f'"{etag}"' in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+            return Response(status_code=304, headers=headers)
+
+        response = json_response({'success': True, 'options': options})
+        response.headers.update(headers)
+        return response
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def get_expert_requests(request: Request) -> Response:
+    """Получить запросы к эксперту"""
+    try:
+        user = await current_user(request)
+        if user is None:
+            return error_response('Требуется вход в систему', 401)
+
+        since = parse_since(request.query_params.get('since'))
+        filters = parse_request_filters(request.query_params)
+        limit, page_cursor, _ = parse_page_args(request.query_params)
+
+        stream_format = parse_stream_format(request.query_params)
+        if stream_format:
+            query, values = expert_requests_query(user, since, filters)
+
+            async def formatted(rows):
+                async for row in rows:
+                    yield format_request_dates(row)
+            rows = await _prefetch(db.iter_rows(query, values))
+            return stream_response(formatted(rows), stream_format, key='requests')
+
+        query, values = expert_requests_query(user, since, filters, parse_request_cursor(page_cursor), limit)
+        current_version = None
+        if since is None:
+            current_version = (await db.fetch_one(EXPERT_REQUESTS_VERSION_QUERY))['версия']
+        rows = await db.fetch_all(query, values)
+        return json_response(expert_requests_payload(rows, since, limit, current_version))
+    except ValueError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def get_expert_request(request: Request) -> Response:
+    """Карточка запроса к эксперту (см. app.get_expert_request)"""
+    try:
+        user = await current_user(request)
+        if user is None:
+            return error_response('Требуется вход в систему', 401)
+
+        query, values = expert_requests_query(user, request_id=int(request.path_params['request_id']))
+        row = await db.fetch_one(query, values)
+        if row is None:
+            return error_response('Запрос не найден', 404)
+        return json_response({
+            'success': True,
+            'request': format_request_dates(row)
+        })
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def expert_request_events(request: Request) -> Response:
+    """
+    Поток изменений запросов к эксперту (см. app.expert_request_events)
+
+    Слушатель LISTEN общий с Flask-частью процесса; события передаются в цикл
+    событий через call_soon_threadsafe, поэтому открытый поток не занимает поток пула.
+    """
+    user = await current_user(request)
+    if user is None:
+        return error_response('Требуется вход в систему', 401)
+
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    try:
+        token = request_events.subscribe(lambda event: loop.call_soon_threadsafe(events.put_nowait, event),
+                                         None if user.is_admin() else user.id)
+    except TooManySubscribers as e:
+        return error_response(str(e), 503)
+
+    async def generate():
+        try:
+            yield retry_hint()
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), EVENTS_CONFIG['heartbeat'])
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                    continue
+                yield format_event(event)
+        finally:
+            request_events.unsubscribe(token)
+
+    return StreamingResponse(generate(), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    await db.open()
+    try:
+        yield
+    finally:
+        await db.close()
+
+
+application = Starlette(
+    routes=[
+        Route('/api/search', profiled(search_insects, '/api/search'), methods=['POST']),
+        Route('/api/all/{insect_type}', profiled(get_all_insects, '/api/all/<insect_type>'), methods=['GET']),
+        Route('/api/catalog', profiled(get_catalog, '/api/catalog'), methods=['GET']),
+        Route('/api/filter-options/{insect_type}',
+              profiled(get_filter_options, '/api/filter-options/<insect_type>'), methods=['GET']),
+        Route('/api/expert-requests', profiled(get_expert_requests, '/api/expert-requests'), methods=['GET']),
+        Route('/api/expert-request/{request_id:int}',
+              profiled(get_expert_request, '/api/expert-request/<int:request_id>'), methods=['GET']),
+        Route('/api/expert-requests/events',
+              profiled(expert_request_events, '/api/expert-requests/events'), methods=['GET']),
+        # Всё остальное обслуживает Flask-приложение
+        Mount('/', WSGIMiddleware(flask_app)),
+    ],
+    lifespan=lifespan,
+)
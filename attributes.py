@@ -0,0 +1,132 @@
+"""
+Структурированные атрибуты насекомых
+
+Импорт из Excel склеивает дополнительные поля (цвет глаз, среда, надкрылья,
+рисунок крыльев и т.д.) в текстовое поле description вида
+"Цвет глаз: зелёные; Среда: пруды; Пол: самец". Для поиска эти поля хранятся
+отдельно в колонке attributes (JSONB) в нормализованном виде:
+
+    {"eye_color": ["зеленые с синим", "зеленые", "синим"], "gender": ["самец"]}
+
+Каждый атрибут - список терминов: нормализованное значение целиком, его части
+(через запятую, "/" или "или") и отдельные слова. Поиск проверяет вхождение
+одного термина: attributes @> '{"eye_color": ["зеленые"]}', что использует
+GIN-индекс по attributes.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Подпись поля в description -> ключ в attributes
+DESCRIPTION_LABELS = {
+    'Добавочный цвет': 'extra_color',
+    'Тип цвета': 'color_type',
+    'Цвет глаз': 'eye_color',
+    'Среда': 'environment',
+    'Пол': 'gender',
+    'Семейство': 'family',
+    'Подотряд': 'suborder',
+    'Особенности': 'features',
+    'Тип поверхности': 'surface_type',
+    'Надкрылья': 'elytra',
+    'Биотоп': 'biotope',
+    'Род': 'genus',
+    'Рисунок': 'wing_pattern',
+    'Тело': 'body',
+    'Гусеница': 'caterpillar',
+    'Кормовое растение': 'food_plant',
+}
+
+# Ключевые слова в описании, по которым бабочка считается дневной или ночной
+TIME_OF_DAY_KEYWORDS = {
+    'день': ['дневн', 'днем', 'днём', 'дневная'],
+    'ночь': ['ночн', 'ночью', 'ночная']
+}
+
+# Служебные слова, которые не становятся отдельными терминами
+STOP_WORDS = {'или', 'со', 'на', 'до', 'от', 'при', 'для'}
+
+_WINGSPAN_RE = re.compile(r'Размах крыльев:\s*(\d+(?:\.\d+)?)?\s*[–-]?\s*(\d+(?:\.\d+)?)?\s*мм')
+
+
+def normalize(value: str) -> str:
+    """Привести значение к виду для сравнения: нижний регистр, ё -> е, одиночные пробелы"""
+    return ' '.join(str(value).lower().replace('ё', 'е').split())
+
+
+def terms(value: Optional[str]) -> List[str]:
+    """Термины, по которым значение атрибута находится поиском"""
+    if value is None:
+        return []
+    full = normalize(value)
+    if not full:
+        return []
+
+    result = [full]
+    for part in re.split(r'[,;/]|\sили\s', full):
+        part = part.strip()
+        if part and part not in result:
+            result.append(part)
+    for word in re.findall(r'\w+', full):
+        if len(word) > 1 and word not in STOP_WORDS and word not in result:
+            result.append(word)
+    return result
+
+
+def build_attributes(fields: Dict[str, Optional[str]], description: Optional[str] = None) -> Dict[str, List[str]]:
+    """
+    Собрать колонку attributes из исходных полей
+
+    Args:
+        fields: ключ атрибута (eye_color, environment, ...) -> исходное значение
+        description: полное описание; по нему определяется время суток (для бабочек)
+
+    Returns:
+        Словарь ключ -> список терминов (пустые атрибуты не включаются)
+    """
+    attributes = {}
+    for key, value in fields.items():
+        value_terms = terms(value)
+        if value_terms:
+            attributes[key] = value_terms
+
+    if description:
+        description_lower = description.lower()
+        time_of_day = [
+            period for period, keywords in TIME_OF_DAY_KEYWORDS.items()
+            if any(keyword in description_lower for keyword in keywords)
+        ]
+        if time_of_day:
+            attributes['time_of_day'] = time_of_day
+    return attributes
+
+
+def parse_description(description: Optional[str]) -> Dict[str, str]:
+    """Разобрать description вида "Подпись: значение; ..." в ключ атрибута -> значение"""
+    fields = {}
+    if not description:
+        return fields
+    for part in description.split(';'):
+        label, sep, value = part.partition(':')
+        if not sep:
+            continue
+        key = DESCRIPTION_LABELS.get(label.strip())
+        if key and value.strip():
+            fields[key] = value.strip()
+    return fields
+
+
+def attributes_from_description(description: Optional[str]) -> Dict[str, List[str]]:
+    """Построить attributes для уже сохранённой записи по её описанию"""
+    return build_attributes(parse_description(description), description)
+
+
+def parse_wingspan(description: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
+    """Достать размах крыльев (min, max) из строки "Размах крыльев: 30.0–40.0 мм" описания"""
+    if not description:
+        return None, None
+    match = _WINGSPAN_RE.search(description)
+    if not match:
+        return None, None
+    low = float(match.group(1)) if match.group(1) else None
+    high = float(match.group(2)) if match.group(2) else None
+    return low if low is not None else high, high if high is not None else low
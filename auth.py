@@ -1,7 +1,111 @@
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+import psycopg2.errors
 from database import Database
-from typing import Optional, Dict
+from result_cache import ResultCache
+from config import AUTH_CONFIG
+from typing import Callable, Optional, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+# Экземпляр работает через общий пул подключений Database
+db = Database()
+
+# Пользователи по id для load_user, который вызывается на каждый запрос
+# авторизованного пользователя. Версия записи - (версия пользователей в базе,
+# номер изменения пользователя в этом процессе). Версию в базе увеличивает
+# триггер на "Пользователь" (sql/add_user_versions.sql) при любой смене роли,
+# в том числе из другого процесса или psql; номер изменения - User.invalidate.
+# Строка, прочитанная до изменения, не попадёт в кэш как актуальная
+_user_cache = ResultCache(AUTH_CONFIG['user_cache_size'], AUTH_CONFIG['user_cache_ttl'])
+_user_generations: Dict[int, int] = {}
+_user_generations_lock = threading.Lock()
+
+# Запись catalog_versions с версией пользователей и её последнее прочитанное
+# значение: (время проверки, версия)
+USERS_VERSION_KEY = 'Пользователь'
+USERS_VERSION_QUERY = "SELECT version FROM catalog_versions WHERE table_name = %s"
+_users_version: Optional[Tuple[float, int]] = None
+
+# Хеширование паролей нагружает процессор, поэтому выполняется в небольшом
+# отдельном пуле потоков: всплеск входов занимает не больше hash_workers
+# потоков и не вытесняет остальные запросы
+_hash_executor = ThreadPoolExecutor(max_workers=AUTH_CONFIG['hash_workers'],
+                                    thread_name_prefix='password-hash')
+_hash_slots = threading.BoundedSemaphore(AUTH_CONFIG['hash_workers'] + AUTH_CONFIG['hash_queue'])
+
+
+def cached_users_version() -> Optional[int]:
+    """Версия пользователей, если она проверена меньше user_version_ttl секунд назад (иначе None)"""
+    cached = _users_version
+    if cached and time.monotonic() - cached[0] < AUTH_CONFIG['user_version_ttl']:
+        return cached[1]
+    return None
+
+
+def remember_users_version(version: int):
+    """Запомнить версию пользователей, прочитанную из базы"""
+    global _users_version
+    _users_version = (time.monotonic(), version)
+
+
+def users_version() -> int:
+    """Версия пользователей в базе (перечитывается не чаще, чем раз в user_version_ttl секунд)"""
+    version = cached_users_version()
+    if version is not None:
+        return version
+    try:
+        with db.cursor() as cursor:
+            cursor.execute(USERS_VERSION_QUERY, (USERS_VERSION_KEY,))
+            row = cursor.fetchone()
+        version = row[0] if row else 0
+    except psycopg2.errors.UndefinedTable:
+        # sql/add_catalog_versions.sql не применён - остаются TTL и User.invalidate
+        version = 0
+    remember_users_version(version)
+    return version
+
+
+class PasswordHashBusy(RuntimeError):
+    """Очередь хеширования паролей заполнена - вход нужно повторить позже"""
+
+
+def _run_hashing(func: Callable, *args):
+    """Выполнить функцию хеширования в пуле потоков и дождаться результата"""
+    if not _hash_slots.acquire(timeout=AUTH_CONFIG['hash_timeout']):
+        raise PasswordHashBusy('Слишком много одновременных входов, попробуйте позже')
+    try:
+        return _hash_executor.submit(func, *args).result()
+    finally:
+        _hash_slots.release()
+
+
+def hash_password(password: str) -> str:
+    """Хеш пароля с текущими параметрами AUTH_CONFIG"""
+    return _run_hashing(
+        generate_password_hash, password,
+        AUTH_CONFIG['password_hash_method'], AUTH_CONFIG['password_salt_length']
+    )
+
+
+def _hash_params(password_hash: str) -> str:
+    """Метод и стоимость из хеша ('scrypt:32768:8:1$соль$хеш' -> 'scrypt:32768:8:1')"""
+    return password_hash.split('$', 1)[0]
+
+
+_configured_params: Dict[str, str] = {}
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """Хеш посчитан не с теми параметрами, что заданы в AUTH_CONFIG"""
+    method = AUTH_CONFIG['password_hash_method']
+    if method not in _configured_params:
+        # werkzeug дополняет сокращённую запись ('scrypt') параметрами по умолчанию,
+        # поэтому полный вид метода берём из хеша пустой строки
+        _configured_params[method] = _hash_params(generate_password_hash('', method))
+    return _hash_params(password_hash) != _configured_params[method]
+
 
 class User(UserMixin):
     """Класс пользователя для Flask-Login"""
@@ -17,14 +121,31 @@ class User(UserMixin):
         """Проверка, является ли пользователь админом"""
         return self.role in ('админ', 'эксперт')
     
+    @staticmethod
+    def from_row(row: Tuple) -> 'User':
+        """Создать пользователя из строки (id, username, email, имя, роль)"""
+        return User(
+            user_id=row[0],
+            username=row[1] or '',
+            email=row[2] or '',
+            name=row[3] or '',
+            role=row[4] or 'пользователь'
+        )
+    
+    @staticmethod
+    def cache_version(user_id: int, db_version: int) -> Tuple[int, int]:
+        """Версия записи пользователя в кэше (берётся до чтения строки из базы)"""
+        return db_version, _user_generations.get(user_id, 0)
+    
     @staticmethod
     def get_by_id(user_id: int) -> Optional['User']:
-        """Получить пользователя по ID"""
-        db = Database()
-        conn = db.get_connection()
-        cursor = conn.cursor()
+        """Получить пользователя по ID (через кэш пользователей)"""
+        version = User.cache_version(user_id, users_version())
+        user = User.get_cached(user_id, version)
+        if user is not None:
+            return user
         
-        try:
+        with db.cursor() as cursor:
             cursor.execute("""
                 SELECT id_пользователя, username, email, имя, роль
                 FROM "Пользователь"
@@ -32,27 +153,47 @@ class User(UserMixin):
             """, (user_id,))
             
             row = cursor.fetchone()
-            if row:
-                return User(
-                    user_id=row[0],
-                    username=row[1] or '',
-                    email=row[2] or '',
-                    name=row[3] or '',
-                    role=row[4] or 'пользователь'
-                )
-            return None
-        finally:
-            cursor.close()
-            conn.close()
+        
+        if row:
+            return User.remember(row, version)
+        return None
+    
+    @staticmethod
+    def get_cached(user_id: int, version: Tuple[int, int]) -> Optional['User']:
+        """Пользователь из кэша без обращения к базе (None, если его там нет)"""
+        row = _user_cache.get(user_id, version)
+        return User.from_row(row) if row is not None else None
+    
+    @staticmethod
+    def remember(row: Tuple, version: Tuple[int, int]) -> 'User':
+        """Сохранить строку пользователя в кэше и вернуть пользователя"""
+        row = tuple(row[:5])
+        _user_cache.put(row[0], version, row)
+        return User.from_row(row)
+    
+    @staticmethod
+    def set_role(user_id: int, role: str) -> bool:
+        """Изменить роль пользователя (в других процессах кэш сбросит версия пользователей в базе)"""
+        with db.cursor() as cursor:
+            cursor.execute("""
+                UPDATE "Пользователь" SET роль = %s
+                WHERE id_пользователя = %s
+            """, (role, user_id))
+            updated = cursor.rowcount
+        User.invalidate(user_id)
+        return updated > 0
+    
+    @staticmethod
+    def invalidate(user_id: int):
+        """Сбросить пользователя в кэше (после изменения его данных в базе)"""
+        with _user_generations_lock:
+            _user_generations[user_id] = _user_generations.get(user_id, 0) + 1
+        _user_cache.invalidate(user_id)
     
     @staticmethod
     def get_by_username(username: str) -> Optional['User']:
         """Получить пользователя по username"""
-        db = Database()
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with db.cursor() as cursor:
             cursor.execute("""
                 SELECT id_пользователя, username, email, имя, роль
                 FROM "Пользователь"
@@ -60,62 +201,44 @@ class User(UserMixin):
             """, (username,))
             
             row = cursor.fetchone()
-            if row:
-                return User(
-                    user_id=row[0],
-                    username=row[1] or '',
-                    email=row[2] or '',
-                    name=row[3] or '',
-                    role=row[4] or 'пользователь'
-                )
-            return None
-        finally:
-            cursor.close()
-            conn.close()
+        
+        if row:
+            return User.from_row(row)
+        return None
     
     @staticmethod
     def create_user(username: str, email: str, password: str, name: str, role: str = 'пользователь') -> Optional['User']:
         """Создать нового пользователя"""
-        db = Database()
-        conn = db.get_connection()
-        cursor = conn.cursor()
+        # Хешируем пароль
+        password_hash = hash_password(password)
         
         try:
-            # Хешируем пароль
-            password_hash = generate_password_hash(password)
-            
-            cursor.execute("""
-                INSERT INTO "Пользователь" (username, email, пароль, имя, роль)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id_пользователя
-            """, (username, email, password_hash, name, role))
-            
-            user_id = cursor.fetchone()[0]
-            conn.commit()
-            
-            return User(
-                user_id=user_id,
-                username=username,
-                email=email,
-                name=name,
-                role=role
-            )
+            with db.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO "Пользователь" (username, email, пароль, имя, роль)
+                    VALUES (%s, %s, %s, %s, %s)
+                    RETURNING id_пользователя
+                """, (username, email, password_hash, name, role))
+                
+                user_id = cursor.fetchone()[0]
         except Exception as e:
-            conn.rollback()
             print(f"Ошибка при создании пользователя: {e}")
             return None
-        finally:
-            cursor.close()
-            conn.close()
+        
+        # id мог принадлежать удалённому пользователю - старую запись сбрасываем
+        User.invalidate(user_id)
+        return User(
+            user_id=user_id,
+            username=username,
+            email=email,
+            name=name,
+            role=role
+        )
     
     @staticmethod
     def verify_password(username: str, password: str) -> Optional['User']:
         """Проверить пароль и вернуть пользователя"""
-        db = Database()
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
-        try:
+        with db.cursor() as cursor:
             cursor.execute("""
                 SELECT id_пользователя, username, email, имя, роль, пароль
                 FROM "Пользователь"
@@ -123,17 +246,25 @@ class User(UserMixin):
             """, (username,))
             
             row = cursor.fetchone()
-            if row and row[5]:  # Если есть пароль
-                if check_password_hash(row[5], password):
-                    return User(
-                        user_id=row[0],
-                        username=row[1] or '',
-                        email=row[2] or '',
-                        name=row[3] or '',
-                        role=row[4] or 'пользователь'
-                    )
-            return None
-        finally:
-            cursor.close()
-            conn.close()
-
+        
+        # Хеш проверяем уже после возврата подключения в пул
+        if row and row[5]:  # Если есть пароль
+            if _run_hashing(check_password_hash, row[5], password):
+                if needs_rehash(row[5]):
+                    User._rehash_password(row[0], password)
+                return User.from_row(row)
+        return None
+    
+    @staticmethod
+    def _rehash_password(user_id: int, password: str):
+        """Пересчитать хеш пароля с текущими параметрами (после успешного входа)"""
+        try:
+            password_hash = hash_password(password)
+            with db.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE "Пользователь" SET пароль = %s
+                    WHERE id_пользователя = %s
+                """, (password_hash, user_id))
+        except Exception as e:
+            # Вход не должен ломаться из-за перехеширования - попробуем в следующий раз
+            print(f"Ошибка при обновлении хеша пароля: {e}")
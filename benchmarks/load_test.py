@@ -0,0 +1,621 @@
+"""
+Нагрузочное тестирование HTTP API
+
+Работает в два шага:
+
+    # 1. Отдельная база с синтетическим каталогом (10 000 видов каждого типа)
+    python benchmarks/load_test.py seed --db insects_bench --rows 10000
+
+    # 2. Сервер на этой базе и нагрузка на него
+    DB_NAME=insects_bench python app.py        # или run_asgi.py
+    python benchmarks/load_test.py run --url http://localhost:5001 --db insects_bench \\
+        --concurrency 16 --duration 10 --output results.json
+
+seed создаёт базу (если её нет), применяет SQL-миграции из sql/, заполняет
+таблицу каталога species синтетическими видами и добавляет пользователей и запросы
+к эксперту для эндпоинтов с авторизацией. Генератор детерминирован (--seed),
+поэтому одинаковые параметры дают одинаковые данные.
+
+run по очереди нагружает сценарии и пишет JSON с задержками p50/p95/p99,
+пропускной способностью, ошибками и числом запросов к БД на HTTP-запрос
+(по pg_stat_statements, если расширение установлено, иначе по числу транзакций).
+Результаты разных коммитов сравниваются по этому файлу.
+"""
+import argparse
+import csv
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from werkzeug.security import generate_password_hash
+
+# Добавляем корневую директорию в путь для импорта
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+from config import DB_CONFIG, AUTH_CONFIG
+from attributes import attributes_from_description, parse_wingspan
+
+# Типы насекомых - секции таблицы каталога species
+INSECT_TYPES = ['dragonfly', 'beetle', 'butterfly']
+
+# Миграции, нужные приложению, в порядке применения
+SQL_FILES = [
+    'create_tables.sql',
+    'add_auth_and_requests.sql',
+    'add_catalog_versions.sql',
+    'add_structured_attributes.sql',
+    'add_text_search_indexes.sql',
+    'add_import_upsert.sql',
+    'add_expert_request_changes.sql',
+    'add_species_partitioning.sql',
+    'add_species_crosswalk.sql',
+    'add_user_versions.sql',
+]
+
+BENCH_ADMIN = ('bench_admin', 'bench_admin_password')
+BENCH_USER = ('bench_user', 'bench_user_password')
+
+# Словари для синтетических видов
+COLORS = ['зелёный', 'синий', 'красный', 'жёлтый', 'чёрный', 'коричневый', 'бронзовый',
+          'голубой', 'оранжевый', 'фиолетовый', 'серый', 'белый']
+COLOR_MODIFIERS = ['', 'тёмно-', 'светло-', 'ярко-', 'металлически-']
+HABITATS = ['пруды', 'реки', 'озёра', 'болота', 'луга', 'леса', 'поля', 'сады', 'парки',
+            'ручьи', 'опушки', 'берега водоёмов']
+SEASONS = ['весна', 'лето', 'осень', 'май', 'июнь', 'июль', 'август', 'сентябрь']
+EYE_COLORS = ['зеленые', 'синие', 'коричневые', 'красные', 'голубовато-зеленые', 'черные']
+ENVIRONMENTS = ['стоячие водоемы', 'медленные реки', 'быстрые ручьи', 'болота с тростником']
+SURFACES = ['матовый', 'глянцевый', 'металлический блеск', 'шагреневый']
+ELYTRA = ['гладкие', 'зернистые', 'с бороздками', 'с ямками', 'морщинистые']
+WING_PATTERNS = ['пятна', 'полосы', 'глазки', 'однотонные', 'волнистые линии', 'кайма']
+TIMES_OF_DAY = ['дневная', 'ночная']
+
+
+def bench_db_config(db_name: str) -> Dict:
+    """Параметры подключения к базе бенчмарка"""
+    return dict(DB_CONFIG, database=db_name)
+
+
+def ensure_database(db_name: str):
+    """Создать базу, если её нет"""
+    conn = psycopg2.connect(**dict(DB_CONFIG, database='postgres'))
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db_name,))
+            if cursor.fetchone():
+                print(f"✅ База данных '{db_name}' уже существует")
+            else:
+                cursor.execute(f'CREATE DATABASE "{db_name}"')
+                print(f"✅ База данных '{db_name}' создана")
+    finally:
+        conn.close()
+
+
+def apply_migrations(conn):
+    """Применить SQL-миграции приложения"""
+    for filename in SQL_FILES:
+        path = os.path.join(PROJECT_ROOT, 'sql', filename)
+        with open(path, encoding='utf-8') as f:
+            sql = f.read()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(sql)
+            print(f"   ✅ {filename}")
+        except psycopg2.Error as e:
+            # Например, нет прав на CREATE EXTENSION pg_trgm - остальное работает и без этого
+            print(f"   ⚠️  {filename}: {e.pgerror or e}")
+
+
+def synthetic_species(insect_type: str, index: int, rng: random.Random) -> Dict:
+    """Один синтетический вид с описанием в формате импорта из Excel"""
+    size_min = round(rng.uniform(5, 80), 1)
+    size_max = round(size_min + rng.uniform(0, 20), 1)
+    color = f"{rng.choice(COLOR_MODIFIERS)}{rng.choice(COLORS)}"
+    if rng.random() < 0.4:
+        color += f", {rng.choice(COLORS)}"
+    gender = rng.choice(['самец', 'самка'])
+
+    parts = []
+    if insect_type == 'dragonfly':
+        wingspan_min = round(size_min * rng.uniform(1.1, 1.6), 1)
+        parts += [
+            f"Размах крыльев: {wingspan_min}–{round(wingspan_min + rng.uniform(0, 15), 1)} мм",
+            f"Цвет глаз: {rng.choice(EYE_COLORS)}",
+            f"Среда: {rng.choice(ENVIRONMENTS)}",
+            f"Пол: {gender}",
+        ]
+    elif insect_type == 'beetle':
+        parts += [
+            f"Тип поверхности: {rng.choice(SURFACES)}",
+            f"Надкрылья: {rng.choice(ELYTRA)}",
+            f"Цвет глаз: {rng.choice(EYE_COLORS)}",
+        ]
+    else:
+        parts += [
+            f"Рисунок: {rng.choice(WING_PATTERNS)}",
+            f"Особенности: {rng.choice(TIMES_OF_DAY)} бабочка",
+        ]
+    description = '; '.join(parts)
+
+    wingspan_min, wingspan_max = parse_wingspan(description)
+    return {
+        'name_ru': f"Вид {index} {rng.choice(HABITATS)}",
+        'name_lat': f"Species synthetica {index}",
+        'size_min': size_min,
+        'size_max': size_max,
+        'color': color,
+        'habitat': ', '.join(rng.sample(HABITATS, rng.randint(1, 3))),
+        'season': ', '.join(rng.sample(SEASONS, rng.randint(1, 3))),
+        'description': description,
+        'wingspan_min': wingspan_min,
+        'wingspan_max': wingspan_max,
+        'sex': gender if insect_type == 'dragonfly' else None,
+        'attributes': json.dumps(attributes_from_description(description), ensure_ascii=False),
+    }
+
+
+def copy_rows(conn, table_name: str, columns: List[str], rows):
+    """Загрузить строки через COPY пачками, не держа весь CSV в памяти"""
+    def flush(buffer: io.StringIO):
+        buffer.seek(0)
+        with conn.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer
+            )
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    pending = 0
+    for row in rows:
+        writer.writerow(['\\N' if row[column] is None else row[column] for column in columns])
+        pending += 1
+        if pending >= 50000:
+            flush(buffer)
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            pending = 0
+    if pending:
+        flush(buffer)
+
+
+def upsert_user(cursor, username: str, password: str, name: str, role: str) -> int:
+    password_hash = generate_password_hash(password, AUTH_CONFIG['password_hash_method'])
+    cursor.execute("""
+        INSERT INTO "Пользователь" (имя, email, username, пароль, роль)
+        VALUES (%s, %s, %s, %s, %s)
+        ON CONFLICT (username) DO UPDATE SET пароль = EXCLUDED.пароль, роль = EXCLUDED.роль
+        RETURNING id_пользователя
+    """, (name, f"{username}@bench.local", username, password_hash, role))
+    return cursor.fetchone()[0]
+
+
+def seed(args):
+    """Создать базу бенчмарка и заполнить её синтетическими данными"""
+    print(f"🚀 Подготовка базы '{args.db}': {args.rows} видов каждого типа")
+    ensure_database(args.db)
+
+    conn = psycopg2.connect(**bench_db_config(args.db))
+    conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+    try:
+        print("📄 Применение миграций...")
+        apply_migrations(conn)
+
+        columns = ['insect_type', 'name_ru', 'name_lat', 'size_min', 'size_max', 'color', 'habitat', 'season',
+                   'description', 'wingspan_min', 'wingspan_max', 'sex', 'attributes']
+        with conn.cursor() as cursor:
+            cursor.execute("TRUNCATE species RESTART IDENTITY")
+        for insect_type in INSECT_TYPES:
+            started = time.perf_counter()
+            rng = random.Random(f"{args.seed}:{insect_type}")
+            copy_rows(conn, 'species', columns,
+                      (dict(synthetic_species(insect_type, i, rng), insect_type=insect_type)
+                       for i in range(1, args.rows + 1)))
+            print(f"   ✅ {insect_type}: {args.rows} строк за {time.perf_counter() - started:.1f} с")
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE species")
+
+        print("👤 Пользователи и запросы к эксперту...")
+        with conn.cursor() as cursor:
+            upsert_user(cursor, BENCH_ADMIN[0], BENCH_ADMIN[1], 'Администратор бенчмарка', 'админ')
+            user_id = upsert_user(cursor, BENCH_USER[0], BENCH_USER[1], 'Пользователь бенчмарка', 'пользователь')
+            cursor.execute('TRUNCATE "ЗапросЭксперту" RESTART IDENTITY')
+
+        requests_count = args.requests if args.requests is not None else max(args.rows // 10, 100)
+        rng = random.Random(f"{args.seed}:requests")
+        start = datetime(2024, 1, 1)
+
+        def expert_requests():
+            for i in range(requests_count):
+                created = start + timedelta(minutes=i * 7)
+                answered = rng.random() < 0.5
+                yield {
+                    'id_пользователя': user_id,
+                    'описание_насекомого': f"{rng.choice(COLORS)} насекомое у воды, запрос {i}",
+                    'место_наблюдения': rng.choice(HABITATS),
+                    'дата_наблюдения': (date(2024, 5, 1) + timedelta(days=i % 120)).isoformat(),
+                    'статус': 'отвечено' if answered else 'ожидает',
+                    'дата_создания': created.isoformat(sep=' '),
+                    'дата_ответа': (created + timedelta(hours=5)).isoformat(sep=' ') if answered else None,
+                    'ответ_эксперта': 'Похоже на синтетический вид' if answered else None,
+                }
+
+        copy_rows(conn, '"ЗапросЭксперту"',
+                  ['id_пользователя', 'описание_насекомого', 'место_наблюдения', 'дата_наблюдения',
+                   'статус', 'дата_создания', 'дата_ответа', 'ответ_эксперта'],
+                  expert_requests())
+        print(f"   ✅ Пользователи {BENCH_ADMIN[0]}, {BENCH_USER[0]}; запросов к эксперту: {requests_count}")
+    finally:
+        conn.close()
+
+    print(f"\n🎉 Готово. Запустите сервер на этой базе: DB_NAME={args.db} python app.py")
+
+
+class Scenario:
+    """Сценарий нагрузки: набор HTTP-запросов к одному эндпоинту"""
+
+    def __init__(self, name: str, method: str, requests: List[Tuple[str, Optional[Dict]]],
+                 login: Optional[Tuple[str, str]] = None):
+        """
+        Args:
+            name: имя сценария в отчёте
+            method: GET или POST
+            requests: пары (путь, JSON-тело), перебираются по кругу
+            login: логин и пароль, если эндпоинт требует входа
+        """
+        self.name = name
+        self.method = method
+        self.requests = requests
+        self.login = login
+
+
+def search_bodies(rng: random.Random, count: int, page_size: int) -> List[Tuple[str, Dict]]:
+    """Разнообразные тела /api/search: часть повторяется, как у популярных запросов"""
+    bodies = []
+    for _ in range(count):
+        insect_type = rng.choice(INSECT_TYPES)
+        params = {}
+        if rng.random() < 0.6:
+            params['color'] = rng.choice(COLORS)
+        if rng.random() < 0.4:
+            params['habitat'] = rng.choice(HABITATS)
+        if rng.random() < 0.3:
+            params['season'] = rng.choice(SEASONS)
+        if rng.random() < 0.5:
+            params['size_min'] = rng.choice([10, 20, 30])
+            params['size_max'] = params['size_min'] + rng.choice([10, 20, 40])
+        if insect_type == 'dragonfly' and rng.random() < 0.4:
+            params['eye_color'] = rng.choice(EYE_COLORS)
+        if insect_type == 'beetle' and rng.random() < 0.4:
+            params['elytra'] = rng.choice(ELYTRA)
+        body = {'type': insect_type, 'params': params}
+        if page_size:
+            body['limit'] = page_size
+        bodies.append(('/api/search', body))
+    return bodies
+
+
+def build_scenarios(args) -> List[Scenario]:
+    rng = random.Random(f"{args.seed}:scenarios")
+    page = f"?limit={args.page_size}" if args.page_size else ''
+    scenarios = [Scenario('search', 'POST', search_bodies(rng, 200, args.page_size))]
+    for insect_type in INSECT_TYPES:
+        scenarios.append(Scenario(f"all_{insect_type}", 'GET', [(f"/api/all/{insect_type}{page}", None)]))
+    for insect_type in INSECT_TYPES:
+        scenarios.append(Scenario(f"filter_options_{insect_type}", 'GET',
+                                  [(f"/api/filter-options/{insect_type}", None)]))
+    # Поиск по всем типам сразу - один запрос к секциям species
+    scenarios.append(Scenario('catalog_search', 'GET', [
+        (f"/api/catalog?{urlencode({'color': color, 'fields': 'name_ru,color'})}", None) for color in COLORS
+    ]))
+    scenarios.append(Scenario('expert_requests_admin', 'GET', [('/api/expert-requests', None)], BENCH_ADMIN))
+    scenarios.append(Scenario('expert_requests_user', 'GET', [('/api/expert-requests', None)], BENCH_USER))
+    queue = urlencode({'view': 'list', 'limit': 50, 'status': 'ожидает'})
+    scenarios.append(Scenario('expert_queue_admin', 'GET', [(f"/api/expert-requests?{queue}", None)], BENCH_ADMIN))
+    scenarios.append(Scenario('expert_request_create', 'POST', [
+        ('/api/expert-request', {
+            'description': f"Нагрузочный запрос {i}: {rng.choice(COLORS)} насекомое",
+            'location': rng.choice(HABITATS),
+            'observation_date': '2024-06-01',
+        })
+        for i in range(50)
+    ], BENCH_USER))
+
+    if args.scenarios:
+        selected = set(args.scenarios.split(','))
+        scenarios = [scenario for scenario in scenarios if scenario.name in selected]
+    return scenarios
+
+
+class HttpClient:
+    """HTTP-клиент с постоянным соединением (по одному на поток нагрузки)"""
+
+    def __init__(self, url: str, cookie: str = '', timeout: float = 30.0):
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._connect = lambda: connection_class(parts.hostname, parts.port, timeout=timeout)
+        self._conn = self._connect()
+        self.cookie = cookie
+
+    def request(self, method: str, path: str, body: Optional[Dict] = None) -> Tuple[int, bytes, Dict]:
+        headers = {'Accept': 'application/json'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        try:
+            self._conn.request(method, path, body=payload, headers=headers)
+            response = self._conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            # Сервер закрыл keep-alive соединение - переподключаемся один раз
+            self._conn.close()
+            self._conn = self._connect()
+            self._conn.request(method, path, body=payload, headers=headers)
+            response = self._conn.getresponse()
+        data = response.read()
+        return response.status, data, dict(response.getheaders())
+
+    def close(self):
+        self._conn.close()
+
+
+def login_cookie(url: str, username: str, password: str) -> str:
+    """Войти и вернуть cookie сессии"""
+    client = HttpClient(url)
+    try:
+        status, data, headers = client.request('POST', '/login', {'username': username, 'password': password})
+    finally:
+        client.close()
+    if status != 200:
+        raise RuntimeError(f"Не удалось войти как {username}: HTTP {status} {data[:200]!r}")
+    cookie = headers.get('Set-Cookie') or headers.get('set-cookie', '')
+    return cookie.split(';', 1)[0]
+
+
+class DbStats:
+    """Счётчики запросов к базе бенчмарка до и после сценария"""
+
+    def __init__(self, db_name: str, settle: float):
+        self.conn = psycopg2.connect(**bench_db_config(db_name))
+        self.conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        self.settle = settle
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+            self.has_statements = cursor.fetchone() is not None
+        self.source = 'pg_stat_statements' if self.has_statements else 'pg_stat_database.xact'
+
+    def snapshot(self) -> int:
+        with self.conn.cursor() as cursor:
+            if self.has_statements:
+                cursor.execute("""
+                    SELECT coalesce(sum(calls), 0) FROM pg_stat_statements
+                    WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                """)
+            else:
+                # Счётчики транзакций другие процессы сбрасывают с задержкой
+                time.sleep(self.settle)
+                cursor.execute("SELECT pg_stat_clear_snapshot()")
+                cursor.execute("""
+                    SELECT xact_commit + xact_rollback FROM pg_stat_database
+                    WHERE datname = current_database()
+                """)
+            return int(cursor.fetchone()[0])
+
+    def delta(self, before: int, after: int) -> int:
+        # Сам запрос snapshot «до» тоже попадает в счётчик
+        return max(after - before - 1, 0)
+
+    def close(self):
+        self.conn.close()
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Перцентиль с линейной интерполяцией (q от 0 до 100)"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def run_scenario(args, scenario: Scenario, cookie: str) -> Dict:
+    """Нагружать сценарий args.duration секунд с args.concurrency потоками"""
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors: List[str] = []
+    lock = threading.Lock()
+    counter = iter(range(10 ** 12))
+
+    def worker(deadline: float, record: bool):
+        client = HttpClient(args.url, cookie)
+        local_latencies = []
+        local_statuses: Dict[int, int] = {}
+        local_errors = []
+        try:
+            while time.perf_counter() < deadline:
+                with lock:
+                    i = next(counter)
+                path, body = scenario.requests[i % len(scenario.requests)]
+                started = time.perf_counter()
+                try:
+                    status, _, _ = client.request(scenario.method, path, body)
+                except Exception as e:
+                    local_errors.append(f"{type(e).__name__}: {e}")
+                    continue
+                local_latencies.append(time.perf_counter() - started)
+                local_statuses[status] = local_statuses.get(status, 0) + 1
+        finally:
+            client.close()
+        if record:
+            with lock:
+                latencies.extend(local_latencies)
+                errors.extend(local_errors)
+                for status, count in local_statuses.items():
+                    statuses[status] = statuses.get(status, 0) + count
+
+    # Прогрев: соединения, кэши приложения и базы
+    if args.warmup > 0:
+        with ThreadPoolExecutor(args.concurrency) as executor:
+            deadline = time.perf_counter() + args.warmup
+            list(executor.map(lambda _: worker(deadline, False), range(args.concurrency)))
+
+    before = args.db_stats.snapshot() if args.db_stats else None
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        deadline = started + args.duration
+        list(executor.map(lambda _: worker(deadline, True), range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    after = args.db_stats.snapshot() if args.db_stats else None
+
+    latencies.sort()
+    requests_done = len(latencies)
+    failed = sum(count for status, count in statuses.items() if status >= 400) + len(errors)
+    result = {
+        'method': scenario.method,
+        'path': scenario.requests[0][0],
+        'requests': requests_done,
+        'errors': failed,
+        'status_codes': {str(status): count for status, count in sorted(statuses.items())},
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(requests_done / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            name: round(value * 1000, 3) if value is not None else None
+            for name, value in (
+                ('p50', percentile(latencies, 50)),
+                ('p95', percentile(latencies, 95)),
+                ('p99', percentile(latencies, 99)),
+                ('mean', sum(latencies) / requests_done if requests_done else None),
+                ('max', latencies[-1] if latencies else None),
+            )
+        },
+    }
+    if errors:
+        result['error_samples'] = errors[:5]
+    if args.db_stats:
+        queries = args.db_stats.delta(before, after)
+        result['db'] = {
+            'source': args.db_stats.source,
+            'total': queries,
+            'per_request': round(queries / requests_done, 3) if requests_done else None,
+        }
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def table_sizes(db_stats: Optional[DbStats]) -> Optional[Dict[str, int]]:
+    if not db_stats:
+        return None
+    with db_stats.conn.cursor() as cursor:
+        cursor.execute("SELECT insect_type, count(*) FROM species GROUP BY insect_type")
+        sizes = dict(cursor.fetchall())
+    return {insect_type: sizes.get(insect_type, 0) for insect_type in INSECT_TYPES}
+
+
+def run(args):
+    """Нагрузить сценарии и записать отчёт"""
+    args.db_stats = DbStats(args.db, args.stats_settle) if args.db else None
+    scenarios = build_scenarios(args)
+    cookies: Dict[Tuple[str, str], str] = {}
+
+    report = {
+        'meta': {
+            'url': args.url,
+            'database': args.db,
+            'tables': table_sizes(args.db_stats),
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'page_size': args.page_size,
+            'commit': git_commit(),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+        },
+        'scenarios': {},
+    }
+
+    print(f"🚀 Нагрузка {args.url}: {args.concurrency} потоков, {args.duration} с на сценарий")
+    try:
+        for scenario in scenarios:
+            cookie = ''
+            if scenario.login:
+                if scenario.login not in cookies:
+                    cookies[scenario.login] = login_cookie(args.url, *scenario.login)
+                cookie = cookies[scenario.login]
+            result = run_scenario(args, scenario, cookie)
+            report['scenarios'][scenario.name] = result
+            latency = result['latency_ms']
+            db_part = f", БД/запрос {result['db']['per_request']}" if 'db' in result else ''
+            print(f"   {scenario.name:<26} {result['throughput_rps']:>9.1f} rps  "
+                  f"p50 {latency['p50']} мс  p95 {latency['p95']} мс  p99 {latency['p99']} мс  "
+                  f"ошибок {result['errors']}{db_part}")
+    finally:
+        if args.db_stats:
+            args.db_stats.close()
+
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        print(f"\n✅ Отчёт записан в {args.output}")
+    else:
+        print(payload)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочное тестирование HTTP API')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = subparsers.add_parser('seed', help='создать базу с синтетическими данными')
+    seed_parser.add_argument('--db', default='insects_bench', help='имя базы бенчмарка')
+    seed_parser.add_argument('--rows', type=int, default=10000, help='видов каждого типа (1k-1M)')
+    seed_parser.add_argument('--requests', type=int, default=None,
+                             help='запросов к эксперту (по умолчанию rows/10)')
+    seed_parser.add_argument('--seed', default='42', help='зерно генератора данных')
+
+    run_parser = subparsers.add_parser('run', help='нагрузить запущенный сервер')
+    run_parser.add_argument('--url', default='http://localhost:5001', help='адрес сервера')
+    run_parser.add_argument('--db', default='insects_bench',
+                            help="база сервера для подсчёта запросов к БД ('' - не считать)")
+    run_parser.add_argument('--concurrency', type=int, default=8, help='одновременных клиентов')
+    run_parser.add_argument('--duration', type=float, default=10.0, help='секунд на сценарий')
+    run_parser.add_argument('--warmup', type=float, default=2.0, help='секунд прогрева перед сценарием')
+    run_parser.add_argument('--page-size', type=int, default=100,
+                            help='limit для /api/all и /api/search (0 - без пагинации)')
+    run_parser.add_argument('--scenarios', default='', help='сценарии через запятую (по умолчанию все)')
+    run_parser.add_argument('--stats-settle', type=float, default=11.0,
+                            help='ожидание счётчиков транзакций без pg_stat_statements, с')
+    run_parser.add_argument('--seed', default='42', help='зерно генератора параметров поиска')
+    run_parser.add_argument('--output', default='', help='файл отчёта JSON (по умолчанию stdout)')
+
+    args = parser.parse_args()
+    if args.command == 'seed':
+        seed(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""
+Микробенчмарки горячих участков кода на Python (без базы данных)
+
+Замеряются:
+- поиск изображений (ImageIndex): построение индекса по папке с тысячами
+  файлов, поиск по уже построенному индексу без кэша и с кэшем;
+- извлечение фасетов фильтров (Database._load_filter_options) - регулярные
+  выражения и очистка значений; вместо базы подставляется заглушка курсора,
+  которая отдаёт синтетические строки каталога;
+- разбор колонок при импорте (parse_size_range, clean_text по значению
+  и колонками pandas - size_columns, text_column).
+
+Входные данные синтетические и детерминированные, их размер задаётся --scale.
+
+    python benchmarks/micro_bench.py                          # все замеры
+    python benchmarks/micro_bench.py --filter facets --scale 5
+    python benchmarks/micro_bench.py --output baseline.json
+    python benchmarks/micro_bench.py --compare baseline.json  # код возврата 1 при регрессии
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+# Добавляем корневую директорию и scripts/ в путь для импорта
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'scripts'))
+from database import Database
+from image_index import ImageIndex, FOLDER_MAP
+from import_excel_data import parse_size_range, clean_text, size_columns, text_column
+
+# Словари для синтетических данных
+NAME_WORDS = ['бабка', 'стрелка', 'красотка', 'дозорщик', 'коромысло', 'лютка', 'жужелица',
+              'бегунчик', 'голубянка', 'белянка', 'перламутровка', 'червонец', 'пестрокрылка']
+NAME_EPITHETS = ['бронзовая', 'обыкновенная', 'металлическая', 'болотная', 'лесная', 'луговая',
+                 'пятнистая', 'синяя', 'зелёная', 'блестящая', 'золотистая', 'тёмная', 'степная']
+COLORS = ['зелёный', 'синий', 'красный', 'жёлтый', 'чёрный', 'коричневый', 'бронзовый',
+          'светло-голубой', 'оранжевый', 'фиолетовый', 'более тёмный чем у самца',
+          'металлический блеск', 'с отливом', 'красный или оранжевый']
+HABITATS = ['пруды', 'реки', 'озёра', 'болота', 'луга', 'леса', 'поля', 'сады', 'опушки']
+SEASONS = ['весна', 'лето', 'осень', 'май', 'июнь', 'июль', 'август', 'сентябрь']
+EYE_COLORS = ['зеленые', 'синие', 'коричневые сверху, желтые снизу', 'красные или бурые',
+              'голубовато-зеленые', 'черные']
+ENVIRONMENTS = ['стоячие водоемы', 'медленные реки', 'быстрые ручьи', 'болота с тростником']
+SURFACES = ['матовый', 'глянцевый', 'металлический блеск', 'шагреневый']
+ELYTRA = ['гладкие', 'зернистые', 'с бороздками', 'с ямками', 'морщинистые']
+WING_PATTERNS = ['пятна', 'полосы', 'глазки', 'кайма по краю крыльев', 'волнистые линии']
+FILLER = ['встречается', 'часто', 'у', 'воды', 'летает', 'низко', 'над', 'травой', 'держится',
+          'группами', 'в', 'солнечную', 'погоду', 'личинки', 'развиваются', 'медленно']
+
+
+def species_name(rng: random.Random, index: int) -> str:
+    return f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_EPITHETS)} {index}"
+
+
+def long_description(rng: random.Random, insect_type: str, words: int) -> str:
+    """Описание в формате импорта из Excel с длинным свободным текстом"""
+    if insect_type == 'dragonfly':
+        parts = [f"Цвет глаз: {rng.choice(EYE_COLORS)}", f"Среда: {rng.choice(ENVIRONMENTS)}",
+                 f"Пол: {rng.choice(['самец', 'самка'])}"]
+    elif insect_type == 'beetle':
+        parts = [f"Тип поверхности / Блеск: {rng.choice(SURFACES)}", f"Надкрылья: {rng.choice(ELYTRA)}"]
+    else:
+        parts = [f"Рисунок крыльев: {rng.choice(WING_PATTERNS)}", "Особенности: дневная бабочка"]
+    parts.append('Примечание: ' + ' '.join(rng.choice(FILLER) for _ in range(words)))
+    return '; '.join(parts)
+
+
+def synthetic_rows(insect_type: str, count: int, words: int, seed: int = 42) -> List[Dict]:
+    """Строки каталога для заглушки базы"""
+    rng = random.Random(f"{seed}:{insect_type}:{count}")
+    return [
+        {
+            'color': ', '.join(rng.sample(COLORS, rng.randint(1, 3))),
+            'habitat': ', '.join(rng.sample(HABITATS, rng.randint(1, 3))),
+            'season': ', '.join(rng.sample(SEASONS, rng.randint(1, 2))),
+            'description': long_description(rng, insect_type, words),
+        }
+        for _ in range(count)
+    ]
+
+
+class StubCursor:
+    """
+    Курсор-заглушка для запросов фасетов вида
+    SELECT [DISTINCT] колонка FROM таблица WHERE ... [ILIKE '%...%'] [ORDER BY ...]
+    """
+
+    _select_re = re.compile(r'SELECT\s+(DISTINCT\s+)?(\w+)\s+FROM', re.IGNORECASE)
+    _ilike_re = re.compile(r"ILIKE\s+'%([^%']+)%'", re.IGNORECASE)
+
+    def __init__(self, rows: List[Dict]):
+        self.rows = rows
+        self._result: List[Dict] = []
+
+    def execute(self, query: str, values=None):
+        if values is not None:
+            # С параметрами psycopg2 ждёт %% вместо %; значения заглушке не нужны
+            query = query.replace('%%', '%')
+        match = self._select_re.search(query)
+        distinct, column = bool(match.group(1)), match.group(2)
+        patterns = [pattern.lower() for pattern in self._ilike_re.findall(query)]
+        result = []
+        for row in self.rows:
+            value = row.get(column)
+            if not value:
+                continue
+            if patterns and not any(pattern in value.lower() for pattern in patterns):
+                continue
+            result.append(value)
+        if distinct:
+            result = sorted(set(result))
+        self._result = [{column: value} for value in result]
+
+    def fetchall(self) -> List[Dict]:
+        return self._result
+
+
+class StubDatabase(Database):
+    """Database, у которой cursor() отдаёт заглушку с заранее подготовленными строками"""
+
+    def __init__(self, rows: List[Dict]):
+        super().__init__()
+        self.rows = rows
+
+    @contextmanager
+    def cursor(self, dict_rows: bool = False):
+        yield StubCursor(self.rows)
+
+
+def make_image_dir(base_dir: Path, insect_type: str, count: int, seed: int = 42) -> List[str]:
+    """Создать папку с count пустыми файлами изображений; вернуть названия видов"""
+    rng = random.Random(f"{seed}:images:{count}")
+    image_dir = base_dir / FOLDER_MAP[insect_type]
+    image_dir.mkdir(parents=True, exist_ok=True)
+    names = []
+    for i in range(count):
+        name = species_name(rng, i)
+        names.append(name)
+        stem = name.replace(' ', '-')
+        if rng.random() < 0.3:
+            for gender in ('самец', 'самка'):
+                (image_dir / f"{stem}({gender}).jpg").touch()
+        else:
+            (image_dir / f"{stem}.jpg").touch()
+    return names
+
+
+class Bench:
+    """Замер одной функции: setup() готовит данные и возвращает замеряемую функцию"""
+
+    def __init__(self, name: str, setup: Callable[[], Callable[[], object]], items: int):
+        self.name = name
+        self.setup = setup
+        self.items = items
+
+
+def build_benchmarks(scale: float, tmp_dir: Path, words: int) -> List[Bench]:
+    benches = []
+
+    # Поиск изображений
+    for count in (int(1000 * scale), int(10000 * scale)):
+        base_dir = tmp_dir / f"images_{count}"
+        names = make_image_dir(base_dir, 'dragonfly', count)
+        rng = random.Random(count)
+        queries = [(name, rng.choice(['', 'Пол: самец', 'Пол: самка'])) for name in rng.sample(names, min(500, count))]
+
+        def index_build(base_dir=base_dir):
+            index = ImageIndex(base_dir)
+            return lambda: index._folder(FOLDER_MAP['dragonfly'], force=True)
+
+        def find_cold(base_dir=base_dir, queries=queries):
+            index = ImageIndex(base_dir)
+            index.build()
+            folder = index._folder(FOLDER_MAP['dragonfly'])
+
+            def run():
+                # Без кэша уже выполненных поисков - как после перестройки индекса
+                folder.lookups.clear()
+                return index.find_many(queries, 'dragonfly')
+            return run
+
+        def find_warm(base_dir=base_dir, queries=queries):
+            index = ImageIndex(base_dir)
+            index.build()
+            index.find_many(queries, 'dragonfly')
+            return lambda: index.find_many(queries, 'dragonfly')
+
+        benches.append(Bench(f"images.build[{count} files]", index_build, count))
+        benches.append(Bench(f"images.find_cold[{count} files]", find_cold, len(queries)))
+        benches.append(Bench(f"images.find_warm[{count} files]", find_warm, len(queries)))
+
+    # Фасеты фильтров
+    for insect_type in ('dragonfly', 'beetle', 'butterfly'):
+        for count in (int(1000 * scale), int(20000 * scale)):
+            def facets(insect_type=insect_type, count=count):
+                db = StubDatabase(synthetic_rows(insect_type, count, words))
+                return lambda: db._load_filter_options(insect_type)
+            benches.append(Bench(f"facets.{insect_type}[{count} rows]", facets, count))
+
+    # Разбор колонок импорта
+    count = int(20000 * scale)
+    rng = random.Random(count)
+    sizes = [rng.choice(['60–72', '20-28', ' 35,5 — 41 ', '45', '', None, 'около 30 мм', float('nan')])
+             for _ in range(count)]
+    texts = [rng.choice([' зелёный, синий ', '', None, float('nan'), 'бронзовый']) for _ in range(count)]
+
+    benches.append(Bench(f"import.parse_size_range[{count}]",
+                         lambda: lambda: [parse_size_range(value) for value in sizes], count))
+    benches.append(Bench(f"import.size_columns[{count}]",
+                         lambda: (lambda series: lambda: size_columns(series))(pd.Series(sizes)),
+                         count))
+    benches.append(Bench(f"import.clean_text[{count}]",
+                         lambda: lambda: [clean_text(value) for value in texts], count))
+    benches.append(Bench(f"import.text_column[{count}]",
+                         lambda: (lambda series: lambda: text_column(series))(pd.Series(texts)),
+                         count))
+    return benches
+
+
+def measure(func: Callable[[], object], repeat: int, min_time: float) -> Dict:
+    """Время одного вызова (мс): число вызовов в серии подбирается под min_time секунд"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    timings = [t / number * 1000 for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'number': number,
+        'repeat': repeat,
+        'min_ms': round(min(timings), 4),
+        'median_ms': round(statistics.median(timings), 4),
+        'max_ms': round(max(timings), 4),
+    }
+
+
+def compare(results: Dict, baseline_path: str, max_ratio: float) -> List[str]:
+    """Замеры, медиана которых выросла больше чем в max_ratio раз относительно базовых"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)['results']
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        ratio = result['median_ms'] / base['median_ms'] if base['median_ms'] else 1.0
+        result['baseline_median_ms'] = base['median_ms']
+        result['ratio'] = round(ratio, 3)
+        if ratio > max_ratio:
+            regressions.append(f"{name}: {base['median_ms']} -> {result['median_ms']} мс (x{ratio:.2f})")
+    return regressions
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Микробенчмарки горячих участков кода')
+    parser.add_argument('--scale', type=float, default=1.0, help='множитель размера входных данных')
+    parser.add_argument('--words', type=int, default=60, help='слов свободного текста в описании')
+    parser.add_argument('--filter', default='', help='запускать только замеры, содержащие подстроку')
+    parser.add_argument('--repeat', type=int, default=5, help='серий на замер')
+    parser.add_argument('--min-time', type=float, default=0.2, help='длительность одной серии, с')
+    parser.add_argument('--output', default='', help='файл отчёта JSON')
+    parser.add_argument('--compare', default='', help='базовый отчёт JSON для сравнения')
+    parser.add_argument('--max-regression', type=float, default=1.25,
+                        help='допустимый рост медианы относительно базового отчёта')
+    args = parser.parse_args()
+
+    results = {}
+    print(f"🚀 Микробенчмарки (scale={args.scale})")
+    with tempfile.TemporaryDirectory(prefix='insects_bench_') as tmp:
+        for bench in build_benchmarks(args.scale, Path(tmp), args.words):
+            if args.filter and args.filter not in bench.name:
+                continue
+            result = measure(bench.setup(), args.repeat, args.min_time)
+            result['items'] = bench.items
+            result['per_item_us'] = round(result['median_ms'] * 1000 / bench.items, 4) if bench.items else None
+            results[bench.name] = result
+            print(f"   {bench.name:<42} медиана {result['median_ms']:>10.3f} мс  "
+                  f"({result['per_item_us']} мкс на элемент)")
+
+    regressions = compare(results, args.compare, args.max_regression) if args.compare else []
+
+    if args.output:
+        report = {
+            'meta': {
+                'scale': args.scale,
+                'words': args.words,
+                'commit': git_commit(),
+                'started_at': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+            },
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ Отчёт записан в {args.output}")
+
+    if regressions:
+        print(f"\n❌ Регрессии (больше x{args.max_regression}):")
+        for line in regressions:
+            print(f"   {line}")
+        sys.exit(1)
+    if args.compare:
+        print("\n✅ Регрессий нет")
+
+
+if __name__ == '__main__':
+    main()
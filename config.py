@@ -16,3 +16,155 @@ DB_CONFIG = {
     'password': os.getenv('DB_PASSWORD', '')
 }
 
+
+# Параметры пула подключений к PostgreSQL
+DB_POOL_CONFIG = {
+    # Сколько подключений открыть при старте и держать всегда, и максимальное число
+    # подключений. Возвращённые подключения (до maxconn) остаются открытыми, пока
+    # не простоят дольше idle_timeout
+    'minconn': int(os.getenv('DB_POOL_MIN', '1')),
+    'maxconn': int(os.getenv('DB_POOL_MAX', '10')),
+    # Сколько секунд ждать свободное подключение, прежде чем выдать ошибку
+    'acquire_timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+    # Подключения, простаивавшие дольше (сек), закрываются и открываются заново
+    'idle_timeout': float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+    # Через сколько секунд простоя подключение проверяется запросом SELECT 1
+    'healthcheck_interval': float(os.getenv('DB_POOL_HEALTHCHECK_INTERVAL', '30')),
+    # Сколько различных запросов поиска держать подготовленными (PREPARE) на одном
+    # подключении (0 - не подготавливать). Подготовленные запросы живут, пока живёт
+    # подключение: свободные подключения остаются в пуле до DB_POOL_IDLE_TIMEOUT
+    'max_prepared': int(os.getenv('DB_PREPARED_STATEMENTS', '64')),
+}
+
+# Параметры кэшей приложения
+CACHE_CONFIG = {
+    # Как долго (сек) считать версию данных таблицы каталога актуальной,
+    # прежде чем перечитать её из catalog_versions
+    'data_version_ttl': float(os.getenv('DATA_VERSION_TTL', '2')),
+    # Кэш результатов поиска: число записей (0 - выключен) и их время жизни (сек)
+    'search_cache_size': int(os.getenv('SEARCH_CACHE_SIZE', '256')),
+    'search_cache_ttl': float(os.getenv('SEARCH_CACHE_TTL', '300')),
+}
+
+# Параметры поиска
+SEARCH_CONFIG = {
+    # Режим поиска по color/habitat/season:
+    #   ilike    - подстрока (ILIKE '%...%'), работает без дополнительных индексов
+    #   trigram  - подстрока или нечёткое совпадение pg_trgm с ранжированием по похожести
+    #   fulltext - полнотекстовый поиск to_tsvector('russian') с ранжированием ts_rank
+    # Режимы trigram и fulltext требуют sql/add_text_search_indexes.sql
+    'text_mode': os.getenv('SEARCH_TEXT_MODE', 'ilike'),
+}
+
+# Постраничная выдача /api/all и /api/search
+PAGINATION_CONFIG = {
+    # Без limit в запросе возвращаются все результаты (как раньше)
+    'max_limit': int(os.getenv('API_MAX_PAGE_SIZE', '500')),
+}
+
+# Потоковая выдача больших списков (stream=json|ndjson)
+STREAM_CONFIG = {
+    # Сколько строк серверный курсор забирает из базы за раз
+    'itersize': int(os.getenv('STREAM_ITERSIZE', '500')),
+}
+
+# Пользователи
+AUTH_CONFIG = {
+    # Кэш пользователей для load_user: число записей и время жизни (сек).
+    # Изменение пользователя в базе увеличивает версию пользователей
+    # (sql/add_user_versions.sql); процессы перечитывают её не реже, чем раз
+    # в user_version_ttl секунд, и после этого не отдают старые записи
+    'user_cache_size': int(os.getenv('USER_CACHE_SIZE', '1024')),
+    'user_cache_ttl': float(os.getenv('USER_CACHE_TTL', '60')),
+    'user_version_ttl': float(os.getenv('USER_VERSION_TTL', '2')),
+    # Метод и стоимость хеширования паролей в формате werkzeug:
+    # 'scrypt:32768:8:1' (scrypt:n:r:p) или 'pbkdf2:sha256:600000'.
+    # Пароли со старыми параметрами перехешируются при успешном входе
+    'password_hash_method': os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'),
+    'password_salt_length': int(os.getenv('PASSWORD_SALT_LENGTH', '16')),
+    # Хеширование выполняется в отдельном пуле потоков: число потоков,
+    # сколько запросов может ждать в очереди и сколько (сек) ждать места в ней
+    'hash_workers': int(os.getenv('PASSWORD_HASH_WORKERS', '2')),
+    'hash_queue': int(os.getenv('PASSWORD_HASH_QUEUE', '32')),
+    'hash_timeout': float(os.getenv('PASSWORD_HASH_TIMEOUT', '5')),
+}
+
+# ASGI-режим (asgi_app.py, запуск: python run_asgi.py)
+ASGI_CONFIG = {
+    'host': os.getenv('ASGI_HOST', '0.0.0.0'),
+    'port': int(os.getenv('ASGI_PORT', '8000')),
+    'workers': int(os.getenv('ASGI_WORKERS', '1')),
+    # Асинхронный пул держит больше подключений: одно подключение
+    # занято только на время запроса к базе, а не всего HTTP-запроса
+    'db_pool_min': int(os.getenv('ASGI_DB_POOL_MIN', '2')),
+    'db_pool_max': int(os.getenv('ASGI_DB_POOL_MAX', '20')),
+}
+
+# Метрики и профилирование запросов (metrics.py, эндпоинт /metrics)
+METRICS_CONFIG = {
+    # Учёт времени HTTP-запросов, этапов обработки и SQL-запросов
+    'enabled': os.getenv('METRICS_ENABLED', '1') != '0',
+    # Заголовок Server-Timing с этапами в каждом ответе
+    'server_timing': os.getenv('SERVER_TIMING', '1') != '0',
+    # Сколько различных SQL-запросов учитывать отдельно (остальные - в 'other')
+    'max_query_series': int(os.getenv('METRICS_MAX_QUERIES', '200')),
+    # Доступ к /metrics: администратор в сессии, заголовок Authorization: Bearer <token>
+    # (пусто - вход по токену выключен) или адрес клиента из списка (адреса и подсети
+    # через запятую). За обратным прокси адрес клиента - адрес прокси
+    'token': os.getenv('METRICS_TOKEN', ''),
+    'allow_ips': [ip.strip() for ip in os.getenv('METRICS_ALLOW_IPS', '127.0.0.1,::1').split(',') if ip.strip()],
+}
+
+# Журнал медленных SQL-запросов (slow_queries.py, GET /api/admin/slow-queries)
+SLOW_QUERY_CONFIG = {
+    # Порог (мс), начиная с которого запрос считается медленным (0 - журнал выключен)
+    'threshold_ms': float(os.getenv('SLOW_QUERY_MS', '500')),
+    # Записывать план EXPLAIN (ANALYZE, BUFFERS) для SELECT. Запрос при этом
+    # выполняется ещё раз, поэтому план снимается не чаще, чем раз в
+    # explain_interval секунд для одной формы параметров
+    'explain': os.getenv('SLOW_QUERY_EXPLAIN', '0') != '0',
+    'explain_interval': float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', '300')),
+    # Файл журнала (JSON по строке на запрос) с ротацией по размеру
+    'log_file': os.getenv('SLOW_QUERY_LOG', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                         'logs', 'slow_queries.log')),
+    'log_max_bytes': int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+    'log_backup_count': int(os.getenv('SLOW_QUERY_LOG_BACKUPS', '5')),
+    # Сколько различных форм параметров хранить в сводке
+    'max_shapes': int(os.getenv('SLOW_QUERY_MAX_SHAPES', '500')),
+}
+
+# Лента изменений запросов к эксперту (LISTEN/NOTIFY -> Server-Sent Events)
+EVENTS_CONFIG = {
+    # Канал NOTIFY из sql/add_expert_request_changes.sql
+    'channel': os.getenv('EVENTS_CHANNEL', 'expert_requests'),
+    # Интервал (сек) комментариев-пингов, чтобы прокси не закрывали простаивающий поток
+    'heartbeat': float(os.getenv('EVENTS_HEARTBEAT', '15')),
+    # Пауза (сек) перед переподключением слушателя после потери соединения с базой
+    'reconnect_delay': float(os.getenv('EVENTS_RECONNECT_DELAY', '5')),
+    # Максимум одновременно открытых потоков событий на процесс (0 - без ограничения)
+    'max_subscribers': int(os.getenv('EVENTS_MAX_SUBSCRIBERS', '100')),
+    # Из них - потоков через Flask (app.py): каждый занимает поток сервера, пока вкладка
+    # открыта, поэтому предел должен быть заметно меньше числа потоков WSGI-сервера.
+    # Сверх предела - ответ 503, и вкладка обновляется редким опросом ?since=
+    'max_blocking_subscribers': int(os.getenv('EVENTS_MAX_FLASK_SUBSCRIBERS', '4')),
+}
+
+# Уменьшенные копии и WebP/AVIF-варианты изображений /data (image_variants.py)
+IMAGE_CONFIG = {
+    # Папка кэша вариантов; имя файла - хеш содержимого оригинала и параметров варианта
+    'cache_dir': os.getenv('IMAGE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           'cache', 'images')),
+    # Допустимые ширины (px): запрошенная ширина округляется вверх до ближайшей из списка,
+    # чтобы число вариантов одного изображения было ограничено
+    'widths': [int(w) for w in os.getenv('IMAGE_WIDTHS', '160,320,640,1280').split(',') if w.strip()],
+    # Качество сжатия WebP/JPEG (1-95) и AVIF: у AVIF шкала другая, и сопоставимая
+    # картинка получается при меньшем значении
+    'quality': int(os.getenv('IMAGE_QUALITY', '80')),
+    'avif_quality': int(os.getenv('IMAGE_AVIF_QUALITY', '60')),
+    # Строить недостающий вариант при запросе; 0 - только заранее построенные
+    # (scripts/build_image_variants.py), иначе отдаётся оригинал
+    'on_demand': os.getenv('IMAGE_ON_DEMAND', '1') != '0',
+    # Cache-Control: max-age (сек) для вариантов. URL варианта не зависит от содержимого
+    # оригинала, поэтому срок короткий; после него браузер проверяет вариант по ETag
+    'max_age': int(os.getenv('IMAGE_MAX_AGE', '300')),
+}
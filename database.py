@@ -1,16 +1,411 @@
+import os
+import threading
+import time
+import json
+import hashlib
+import uuid
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Optional
+import psycopg2.errors
+from psycopg2.extras import RealDictCursor, Json
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+from psycopg2.pool import PoolError
+from typing import FrozenSet, Iterator, List, Dict, Optional, Tuple
 import re
-from config import DB_CONFIG
+from config import DB_CONFIG, DB_POOL_CONFIG, CACHE_CONFIG, SEARCH_CONFIG, STREAM_CONFIG, METRICS_CONFIG, SLOW_QUERY_CONFIG
+import metrics
+import slow_queries
+from result_cache import ResultCache
+from similarity import SpeciesMatrix, rank_species
+from identification_key import IdentificationKey
+from attributes import normalize, attributes_from_description, parse_description, parse_wingspan, TIME_OF_DAY_KEYWORDS
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул подключений к PostgreSQL
+
+    Ожидает свободное подключение (вместо немедленной ошибки), проверяет
+    живость долго простаивавших подключений и пересоздаёт подключения,
+    простаивавшие дольше idle_timeout. Возвращённые подключения остаются
+    открытыми до maxconn (ThreadedConnectionPool закрывает всё сверх minconn),
+    поэтому подготовленные на них запросы переживают запрос HTTP.
+    """
+
+    def __init__(self, config: Dict, minconn: int = 1, maxconn: int = 10,
+                 acquire_timeout: float = 10.0, idle_timeout: float = 300.0,
+                 healthcheck_interval: float = 30.0, max_prepared: int = 64):
+        self.config = config
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.acquire_timeout = acquire_timeout
+        self.idle_timeout = idle_timeout
+        self.healthcheck_interval = healthcheck_interval
+        self.max_prepared = max_prepared
+        self.pid = os.getpid()
+
+        self._slots = threading.BoundedSemaphore(maxconn)
+        # Свободные подключения; берётся последнее возвращённое, чтобы лишние
+        # при спаде нагрузки подключения простаивали и закрывались по idle_timeout
+        self._idle: List = []
+        # Время возврата подключения в пул: conn -> time.monotonic()
+        self._last_used: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+        # Подготовленные запросы каждого подключения (исчезают вместе с подключением)
+        self._prepared: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+        for _ in range(min(minconn, maxconn)):
+            conn = self._connect()
+            self._last_used[conn] = time.monotonic()
+            self._idle.append(conn)
+
+    def getconn(self):
+        """Взять подключение из пула, при необходимости дождавшись свободного"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise PoolError('Нет свободных подключений к базе данных')
+        try:
+            return self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close: bool = False):
+        """Вернуть подключение в пул (или закрыть его, если close=True)"""
+        try:
+            if not close and not conn.closed:
+                status = conn.info.transaction_status
+                if status == TRANSACTION_STATUS_UNKNOWN:
+                    close = True
+                elif status != TRANSACTION_STATUS_IDLE:
+                    # Незавершённая транзакция не должна достаться следующему запросу
+                    try:
+                        conn.rollback()
+                    except psycopg2.Error:
+                        close = True
+            if close or conn.closed:
+                self._discard(conn)
+                return
+            with self._lock:
+                self._last_used[conn] = time.monotonic()
+                self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    def prepared_statements(self, conn) -> 'PreparedStatements':
+        """Подготовленные запросы подключения conn (подключение используется одним потоком)"""
+        with self._lock:
+            statements = self._prepared.get(conn)
+            if statements is None:
+                statements = self._prepared[conn] = PreparedStatements(self.max_prepared)
+            return statements
+
+    def idle_count(self) -> int:
+        """Число открытых свободных подключений"""
+        with self._lock:
+            return len(self._idle)
+
+    def closeall(self):
+        """Закрыть свободные подключения пула (выданные закроются при возврате)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def _connect(self):
+        return psycopg2.connect(
+            host=self.config['host'],
+            port=self.config['port'],
+            database=self.config['database'],
+            user=self.config['user'],
+            password=self.config['password']
+        )
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                expired = self._expired_idle()
+                conn = self._idle.pop() if self._idle else None
+                last_used = self._last_used.get(conn) if conn is not None else None
+            for stale in expired:
+                self._discard(stale)
+            if conn is None:
+                return self._connect()
+
+            idle = time.monotonic() - last_used if last_used is not None else 0.0
+            if conn.closed or idle > self.idle_timeout:
+                self._discard(conn)
+                continue
+            if idle > self.healthcheck_interval and not self._is_alive(conn):
+                self._discard(conn)
+                continue
+            return conn
+
+    def _expired_idle(self) -> List:
+        """Снять с начала списка (самые давние) подключения старше idle_timeout, оставив minconn"""
+        now = time.monotonic()
+        expired = []
+        while len(self._idle) > self.minconn:
+            last_used = self._last_used.get(self._idle[0])
+            if last_used is not None and now - last_used <= self.idle_timeout:
+                break
+            expired.append(self._idle.pop(0))
+        return expired
+
+    def _discard(self, conn):
+        with self._lock:
+            self._last_used.pop(conn, None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+
+class PreparedStatements:
+    """
+    Серверные подготовленные запросы одного подключения (LRU)
+
+    Ключ - текст запроса с плейсхолдерами %s: сочетание условий поиска даёт
+    всегда один и тот же текст, а значения передаются отдельно. Запросы,
+    которые не удалось подготовить, запоминаются, чтобы не пытаться снова.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        # текст запроса -> имя подготовленного запроса (None - выполнять без подготовки)
+        self._names: 'OrderedDict[str, Optional[str]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __contains__(self, query: str) -> bool:
+        return query in self._names
+
+    def get(self, query: str) -> Optional[str]:
+        name = self._names.get(query)
+        if query in self._names:
+            self._names.move_to_end(query)
+        return name
+
+    def add(self, query: str, name: Optional[str]) -> List[str]:
+        """Запомнить запрос; возвращает имена вытесненных запросов для DEALLOCATE"""
+        self._names[query] = name
+        self._names.move_to_end(query)
+        evicted = []
+        while len(self._names) > self.maxsize:
+            _, old_name = self._names.popitem(last=False)
+            if old_name is not None:
+                evicted.append(old_name)
+        return evicted
+
+
+# Тексты подготовленных запросов по именам - метрики и журнал медленных
+# запросов показывают исходный SQL, а не EXECUTE q_...
+_prepared_sources: Dict[str, str] = {}
+MAX_PREPARED_SOURCES = 4096
+
+
+def prepared_name(query: str) -> str:
+    """Имя подготовленного запроса - хеш его текста"""
+    name = 'q_' + hashlib.sha1(query.encode('utf-8')).hexdigest()[:20]
+    if name not in _prepared_sources and len(_prepared_sources) < MAX_PREPARED_SOURCES:
+        _prepared_sources[name] = query
+    return name
+
+
+def statement_source(query):
+    """Исходный текст запроса для EXECUTE подготовленного запроса (иначе сам query)"""
+    if isinstance(query, str) and query.startswith('EXECUTE q_'):
+        return _prepared_sources.get(query.split(None, 2)[1], query)
+    return query
+
+
+def positional_query(query: str) -> Tuple[str, int]:
+    """Запрос с плейсхолдерами psycopg2 (%s, %%) в виде для PREPARE ($1, %) и число параметров"""
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group(0) == '%%':
+            return '%'
+        count += 1
+        return f'${count}'
+
+    return re.sub(r'%%|%s', replace, query), count
+
+
+class _TimedCursorMixin:
+    """
+    Учёт времени и числа строк каждого SQL-запроса курсора (см. metrics.py)
+    и запись медленных запросов в журнал (см. slow_queries.py)
+    """
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._finish(query, vars, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            # Параметры пакетной вставки в журнал не пишем - их может быть очень много
+            self._finish(query, None, time.perf_counter() - started, explain=False)
+
+    def _finish(self, query, vars, seconds: float, explain: bool = True):
+        source = statement_source(query)
+        metrics.record_query(source, seconds, self.rowcount)
+        if slow_queries.is_slow(seconds):
+            shape = slow_queries.current_shape(source)
+            plan = None
+            if explain and slow_queries.should_explain(source, shape):
+                # EXPLAIN ANALYZE EXECUTE показывает план подготовленного запроса
+                plan = self._explain(query, vars)
+            slow_queries.record(source, vars, seconds, shape, plan)
+
+    def _explain(self, query, vars) -> str:
+        """План EXPLAIN (ANALYZE, BUFFERS) в точке сохранения, чтобы не влиять на транзакцию"""
+        conn = self.connection
+        try:
+            # Обычный курсор: сам EXPLAIN в метрики и журнал не попадает
+            with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cursor:
+                if not conn.autocommit:
+                    cursor.execute("SAVEPOINT slow_query_explain")
+                try:
+                    cursor.execute(slow_queries.explain_query(query), vars)
+                    return '\n'.join(row[0] for row in cursor.fetchall())
+                finally:
+                    if not conn.autocommit:
+                        cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                        cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        except psycopg2.Error as e:
+            return f"EXPLAIN не выполнен: {e}"
+
+    def fetchone(self):
+        with metrics.stage('db_fetch'):
+            return super().fetchone()
+
+    def fetchmany(self, size=None):
+        with metrics.stage('db_fetch'):
+            return super().fetchmany(size) if size is not None else super().fetchmany()
+
+    def fetchall(self):
+        with metrics.stage('db_fetch'):
+            return super().fetchall()
+
+
+class TimedCursor(_TimedCursorMixin, psycopg2.extensions.cursor):
+    pass
+
+
+class TimedRealDictCursor(_TimedCursorMixin, RealDictCursor):
+    pass
+
+
+def cursor_factory(dict_rows: bool = False):
+    """Класс курсора: с учётом времени запросов, если включены метрики или журнал медленных запросов"""
+    if METRICS_CONFIG['enabled'] or SLOW_QUERY_CONFIG['threshold_ms'] > 0:
+        return TimedRealDictCursor if dict_rows else TimedCursor
+    return RealDictCursor if dict_rows else None
+
+
+# Типы насекомых в порядке вывода каталога
+INSECT_TYPES = ('dragonfly', 'beetle', 'butterfly')
+
+# Таблица каталога, секционированная по insect_type (sql/add_species_partitioning.sql);
+# условие insect_type = ... оставляет в плане запроса только секцию нужного типа
+CATALOG_TABLE = 'species'
+
+# Параметры поиска, общие для всех типов (фильтр get_catalog по всему каталогу)
+CATALOG_SEARCH_PARAMS = ('size_min', 'size_max', 'color', 'habitat', 'season')
+
+# Параметры поиска по колонке attributes: имя параметра совпадает с ключом атрибута
+ATTRIBUTE_SEARCH_PARAMS = {
+    'dragonfly': ('eye_color', 'environment', 'gender'),
+    'beetle': ('surface_type', 'elytra'),
+    'butterfly': ('wing_pattern',),
+}
+
+# Все термины атрибутов поиска в каталоге типа (см. Database._attribute_terms)
+ATTRIBUTE_TERMS_QUERY = f"""
+    SELECT DISTINCT attr.key, term
+    FROM {CATALOG_TABLE},
+         jsonb_each(attributes) AS attr(key, terms),
+         jsonb_array_elements_text(attr.terms) AS term
+    WHERE insect_type = %s AND attr.key = ANY(%s)
+"""
+
+# Колонки каталога, доступные для проекции fields
+CATALOG_COLUMNS = (
+    'id', 'name_ru', 'name_lat', 'size_min', 'size_max', 'color', 'habitat', 'season',
+    'description', 'image_url', 'wingspan_min', 'wingspan_max', 'sex', 'attributes'
+)
+
+# Сколько различных запросов хранит кэш количества строк
+COUNT_CACHE_SIZE = 1024
+
+
+def _canonical_value(value):
+    """Значение параметра запроса в виде, пригодном для ключа кэша"""
+    if isinstance(value, Json):
+        return json.dumps(value.adapted, ensure_ascii=False, sort_keys=True)
+    return value
+
 
 class Database:
+    # Пул общий для всех экземпляров Database в процессе
+    _pool: Optional[ConnectionPool] = None
+    _pool_lock = threading.Lock()
+
+    # Версии данных каталога: insect_type -> (время проверки, версия из catalog_versions)
+    _data_versions: Dict[str, Tuple[float, int]] = {}
+    # Локальные счётчики записей этого процесса: insect_type -> число вызовов add_insect
+    _local_versions: Dict[str, int] = {}
+    _versions_lock = threading.Lock()
+    # Фасеты фильтров: insect_type -> (версия данных, options, etag)
+    _filter_options_cache: Dict[str, Tuple[Tuple[int, int], Dict, str]] = {}
+    _filter_options_lock = threading.Lock()
+    # Число строк для первых страниц: (условия, параметры) -> (версия данных, число)
+    _count_cache: Dict[tuple, Tuple[Tuple[int, int], int]] = {}
+    # Матрицы признаков для similar_insects: тип -> (версия данных, матрица)
+    _similarity_cache: Dict[str, Tuple[Tuple[int, int], SpeciesMatrix]] = {}
+    _similarity_lock = threading.Lock()
+    # Термины атрибутов поиска: тип -> (версия данных, ключ атрибута -> термины)
+    _attribute_terms_cache: Dict[str, Tuple[Tuple[int, int], Dict[str, FrozenSet[str]]]] = {}
+    # Определительные ключи: тип -> (версия данных, ключ)
+    _key_cache: Dict[str, Tuple[Tuple[int, int], IdentificationKey]] = {}
+    # Ключ каждого типа строит один поток; ключи разных типов строятся независимо
+    _key_locks: Dict[str, threading.Lock] = {insect_type: threading.Lock() for insect_type in INSECT_TYPES}
+    # Результаты search_insects_page по нормализованным параметрам
+    _search_cache = ResultCache(CACHE_CONFIG['search_cache_size'], CACHE_CONFIG['search_cache_ttl'])
+
     def __init__(self):
         self.config = DB_CONFIG
         # Не создаем таблицы автоматически - они должны быть созданы через SQL скрипт
     
     def get_connection(self):
-        """Получить подключение к PostgreSQL"""
+        """
+        Получить отдельное (не из пула) подключение к PostgreSQL
+
+        Используется скриптами, которые сами управляют жизнью подключения.
+        Код приложения должен использовать connection()/cursor().
+        """
         return psycopg2.connect(
             host=self.config['host'],
             port=self.config['port'],
@@ -18,6 +413,104 @@ class Database:
             user=self.config['user'],
             password=self.config['password']
         )
+
+    def get_pool(self) -> ConnectionPool:
+        """Получить общий пул подключений, создав его при первом обращении"""
+        pool = Database._pool
+        # После fork (gunicorn и т.п.) подключения родителя использовать нельзя
+        if pool is not None and pool.pid == os.getpid():
+            return pool
+        with Database._pool_lock:
+            pool = Database._pool
+            if pool is None or pool.pid != os.getpid():
+                pool = ConnectionPool(self.config, **DB_POOL_CONFIG)
+                Database._pool = pool
+            return pool
+
+    @classmethod
+    def close_pool(cls):
+        """Закрыть общий пул подключений"""
+        with cls._pool_lock:
+            if cls._pool is not None and cls._pool.pid == os.getpid():
+                cls._pool.closeall()
+            cls._pool = None
+
+    @contextmanager
+    def connection(self):
+        """
+        Подключение из пула в виде контекстного менеджера
+
+        При нормальном выходе транзакция фиксируется, при исключении -
+        откатывается; подключение в любом случае возвращается в пул.
+        """
+        pool = self.get_pool()
+        with metrics.stage('db_connect'):
+            conn = pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            raise
+        finally:
+            pool.putconn(conn)
+
+    @contextmanager
+    def cursor(self, dict_rows: bool = False):
+        """
+        Курсор на подключении из пула
+
+        Args:
+            dict_rows: возвращать строки в виде словарей (RealDictCursor)
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor(cursor_factory=cursor_factory(dict_rows))
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+    
+    def get_data_version(self, insect_type: str) -> Tuple[int, int]:
+        """
+        Версия данных каталога одного типа насекомых
+
+        Складывается из версии в catalog_versions (её увеличивают триггеры
+        при любой записи, в том числе из скрипта импорта) и локального счётчика
+        записей этого процесса. Версия из БД перечитывается не чаще, чем раз
+        в CACHE_CONFIG['data_version_ttl'] секунд.
+        """
+        self._check_type(insect_type)
+        
+        now = time.monotonic()
+        cached = Database._data_versions.get(insect_type)
+        if cached and now - cached[0] < CACHE_CONFIG['data_version_ttl']:
+            db_version = cached[1]
+        else:
+            try:
+                with self.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT version FROM catalog_versions WHERE table_name = %s",
+                        (insect_type,)
+                    )
+                    row = cursor.fetchone()
+                db_version = row[0] if row else 0
+            except psycopg2.errors.UndefinedTable:
+                # sql/add_catalog_versions.sql не применён - остаются только локальные версии
+                db_version = 0
+            Database._data_versions[insect_type] = (now, db_version)
+        
+        return db_version, Database._local_versions.get(insect_type, 0)
+    
+    def _bump_data_version(self, insect_type: str):
+        """Отметить запись в каталог, сделанную этим процессом"""
+        with Database._versions_lock:
+            Database._local_versions[insect_type] = Database._local_versions.get(insect_type, 0) + 1
+        # Версию из БД перечитаем при следующем обращении
+        Database._data_versions.pop(insect_type, None)
     
     def search_insects(self, insect_type: str, params: Dict) -> List[Dict]:
         """
@@ -30,25 +523,79 @@ class Database:
         Returns:
             Список найденных насекомых
         """
-        # Правильные имена таблиц
-        table_names = {
-            'dragonfly': 'dragonflies',
-            'beetle': 'beetles',
-            'butterfly': 'butterflies'
-        }
-        table_name = table_names.get(insect_type)
-        if not table_name:
-            raise ValueError(f"Неверный тип насекомого: {insect_type}")
+        return self.search_insects_page(insect_type, params)['results']
+    
+    def search_insects_page(self, insect_type: str, params: Dict, limit: Optional[int] = None,
+                            cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> Dict:
+        """
+        Поиск насекомых по параметрам с постраничной выдачей
         
-        conn = self.get_connection()
-        # Используем RealDictCursor для получения результатов в виде словарей
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        Args:
+            insect_type: 'dragonfly', 'beetle' или 'butterfly'
+            params: словарь с параметрами поиска
+            limit: размер страницы (None - все результаты)
+            cursor: next_cursor предыдущей страницы
+            fields: колонки результата (None - все)
+        
+        Returns:
+            {'results': [...], 'next_cursor': str или None, 'total': int или None}
+        """
+        self._check_type(insect_type)
+        
+        # Одинаковые поиски отдаются из кэша, пока не изменится версия данных типа
+        key = self._search_cache_key(insect_type, params, limit, cursor, fields)
+        version = self.get_data_version(insect_type)
+        page = Database._search_cache.get(key, version)
+        if page is None:
+            conditions, values, rank_terms, rank_values = self._search_conditions(insect_type, params)
+            rank_sql = " + ".join(rank_terms) if rank_terms else None
+            with slow_queries.query_shape(slow_queries.search_shape(insect_type, params)):
+                page = self._select_page(insect_type, conditions, values, rank_sql, rank_values,
+                                         limit, cursor, fields)
+            Database._search_cache.put(key, version, page)
+        
+        # Вызывающий код дополняет строки (image_url), поэтому отдаём копии
+        return dict(page, results=[dict(row) for row in page['results']])
+    
+    @staticmethod
+    def _search_cache_key(insect_type: str, params: Dict, limit: Optional[int],
+                          cursor: Optional[str], fields: Optional[List[str]]) -> tuple:
+        """Ключ кэша поиска: пустые параметры не влияют на запрос и отбрасываются"""
+        canonical_params = tuple(sorted(
+            (name, json.dumps(value, ensure_ascii=False, sort_keys=True))
+            for name, value in (params or {}).items() if value
+        ))
+        return (insect_type, SEARCH_CONFIG['text_mode'], canonical_params, limit, cursor,
+                tuple(sorted(set(fields))) if fields else None)
+    
+    @staticmethod
+    def search_cache_stats() -> Dict:
+        """Счётчики кэша результатов поиска"""
+        return Database._search_cache.stats()
+    
+    def _search_conditions(self, insect_type: Optional[str], params: Dict,
+                           attribute_terms: Optional[Dict[str, FrozenSet[str]]] = None
+                           ) -> Tuple[List[str], List, List[str], List]:
+        """
+        Условия WHERE для search_insects
+        
+        Первое условие выбирает секцию species по типу. Без insect_type
+        (поиск по всему каталогу, см. get_catalog) применяются только общие параметры.
         
-        # Формируем запрос с условиями
-        query = f"SELECT * FROM {table_name} WHERE 1=1"
+        Args:
+            attribute_terms: термины атрибутов каталога (см. _attribute_terms);
+                None - прочитать их, если в params есть атрибуты поиска
+        
+        Returns:
+            (условия, их параметры, слагаемые ранга похожести, их параметры)
+        """
         conditions = []
         values = []
         
+        if insect_type is not None:
+            conditions.append("insect_type = %s")
+            values.append(self._check_type(insect_type))
+        
         # Общие параметры
         if params.get('size_min'):
             conditions.append("size_max >= %s")
@@ -58,17 +605,35 @@ class Database:
             conditions.append("size_min <= %s")
             values.append(float(params['size_max']))
         
-        if params.get('color'):
-            conditions.append("color ILIKE %s")
-            values.append(f"%{params['color']}%")
-        
-        if params.get('habitat'):
-            conditions.append("habitat ILIKE %s")
-            values.append(f"%{params['habitat']}%")
+        # Свободный текст: цвет, место нахождения, период
+        rank_terms = []
+        rank_values = []
+        text_mode = SEARCH_CONFIG['text_mode']
+        for field in ('color', 'habitat', 'season'):
+            value = params.get(field)
+            if not value:
+                continue
+            
+            if text_mode == 'trigram':
+                # Подстрока или нечёткое совпадение слова (оба условия используют индекс gin_trgm_ops)
+                conditions.append(f"({field} ILIKE %s OR %s <%% {field})")
+                values.extend([f"%{value}%", value])
+                rank_terms.append(f"word_similarity(%s, coalesce({field}, ''))")
+                rank_values.append(value)
+            elif text_mode == 'fulltext':
+                # Выражение должно совпадать с индексом idx_*_fts
+                tsvector = f"to_tsvector('russian', coalesce({field}, ''))"
+                conditions.append(f"{tsvector} @@ plainto_tsquery('russian', %s)")
+                values.append(value)
+                rank_terms.append(f"ts_rank({tsvector}, plainto_tsquery('russian', %s))")
+                rank_values.append(value)
+            else:
+                conditions.append(f"{field} ILIKE %s")
+                values.append(f"%{value}%")
         
-        if params.get('season'):
-            conditions.append("season ILIKE %s")
-            values.append(f"%{params['season']}%")
+        # Фильтры по колонке attributes собираются в одно условие вхождения,
+        # которое обслуживает GIN-индекс: attributes @> '{"eye_color": ["зеленые"]}'
+        attribute_filters = {}
         
         # Специфичные параметры для стрекоз
         if insect_type == 'dragonfly':
@@ -80,528 +645,879 @@ class Database:
                 conditions.append("size_min <= %s")
                 values.append(float(params['body_length_max']))
             
-            if params.get('wingspan_min') or params.get('wingspan_max'):
-                # Ищем в описании размах крыльев
-                if params.get('wingspan_min'):
-                    conditions.append("description ILIKE %s")
-                    values.append(f"%размах%{params['wingspan_min']}%")
-                if params.get('wingspan_max'):
-                    conditions.append("description ILIKE %s")
-                    values.append(f"%размах%{params['wingspan_max']}%")
-            
-            if params.get('eye_color'):
-                conditions.append("description ILIKE %s")
-                values.append(f"%цвет глаз%{params['eye_color']}%")
-            
-            if params.get('environment'):
-                conditions.append("description ILIKE %s")
-                values.append(f"%среда%{params['environment']}%")
-            
-            if params.get('gender'):
-                conditions.append("description ILIKE %s")
-                values.append(f"%пол%{params['gender']}%")
-        
-        # Специфичные параметры для жуков
-        elif insect_type == 'beetle':
-            if params.get('surface_type'):
-                conditions.append("description ILIKE %s")
-                values.append(f"%{params['surface_type']}%")
-            
-            if params.get('elytra'):
-                conditions.append("description ILIKE %s")
-                values.append(f"%надкрылья%{params['elytra']}%")
+            # Размах крыльев хранится в отдельных колонках
+            if params.get('wingspan_min'):
+                conditions.append("wingspan_max >= %s")
+                values.append(float(params['wingspan_min']))
+            
+            if params.get('wingspan_max'):
+                conditions.append("wingspan_min <= %s")
+                values.append(float(params['wingspan_max']))
         
         # Специфичные параметры для бабочек
         elif insect_type == 'butterfly':
-            if params.get('wing_pattern'):
-                conditions.append("description ILIKE %s")
-                values.append(f"%рисунок%{params['wing_pattern']}%")
-            
-            if params.get('time_of_day'):
-                # Ищем в описании информацию о времени суток
-                time_keywords = {
-                    'день': ['дневн', 'днем', 'днём', 'дневная'],
-                    'ночь': ['ночн', 'ночью', 'ночная']
-                }
-                if params['time_of_day'] in time_keywords:
-                    time_conditions = []
-                    for keyword in time_keywords[params['time_of_day']]:
-                        time_conditions.append("description ILIKE %s")
-                        values.append(f"%{keyword}%")
-                    if time_conditions:
-                        conditions.append("(" + " OR ".join(time_conditions) + ")")
+            # Время суток определяется при импорте по ключевым словам описания
+            if params.get('time_of_day') in TIME_OF_DAY_KEYWORDS:
+                attribute_filters['time_of_day'] = [params['time_of_day']]
         
-        if conditions:
-            query += " AND " + " AND ".join(conditions)
+        # Цвет глаз, среда, пол, поверхность, надкрылья, рисунок крыльев
+        for param in ATTRIBUTE_SEARCH_PARAMS.get(insect_type, ()):
+            if not params.get(param):
+                continue
+            value = normalize(params[param])
+            if attribute_terms is None:
+                attribute_terms = self._attribute_terms(insect_type)
+            if value in attribute_terms.get(param, ()):
+                attribute_filters[param] = [value]
+            else:
+                # Такого термина в каталоге нет (например, часть слова "зелен"):
+                # ищем подстроку в терминах атрибута, как раньше в description
+                conditions.append(f"attributes->>'{param}' ILIKE %s")
+                values.append(f"%{value}%")
         
-        cursor.execute(query, values)
+        if attribute_filters:
+            conditions.append("attributes @> %s::jsonb")
+            values.append(Json(attribute_filters))
         
-        # Получаем результаты в виде словарей
-        results = [dict(row) for row in cursor.fetchall()]
+        return conditions, values, rank_terms, rank_values
+    
+    def _attribute_terms(self, insect_type: str) -> Dict[str, FrozenSet[str]]:
+        """
+        Термины атрибутов поиска, которые есть в каталоге типа
         
-        cursor.close()
-        conn.close()
-        return results
+        По ним _search_conditions выбирает условие: известный термин ищется
+        вхождением attributes @> (GIN-индекс), остальные - подстрокой.
+        Перечитываются при изменении версии данных.
+        """
+        version = self.get_data_version(insect_type)
+        cached = Database._attribute_terms_cache.get(insect_type)
+        if cached and cached[0] == version:
+            return cached[1]
+        
+        with self.cursor() as cursor:
+            cursor.execute(ATTRIBUTE_TERMS_QUERY, (insect_type, list(ATTRIBUTE_SEARCH_PARAMS[insect_type])))
+            terms = self.group_attribute_terms(cursor.fetchall())
+        Database._attribute_terms_cache[insect_type] = (version, terms)
+        return terms
+    
+    @staticmethod
+    def group_attribute_terms(rows) -> Dict[str, FrozenSet[str]]:
+        """Строки ATTRIBUTE_TERMS_QUERY (ключ, термин) -> ключ атрибута -> термины"""
+        grouped: Dict[str, set] = {}
+        for key, term in rows:
+            grouped.setdefault(key, set()).add(term)
+        return {key: frozenset(terms) for key, terms in grouped.items()}
+    
+    def similar_insects(self, insect_type: str, params: Dict, top_k: int = 20) -> List[Dict]:
+        """
+        Виды, наиболее похожие на описание params (см. similarity.py)
+        
+        В отличие от search_insects критерии не обязаны совпадать все сразу:
+        каждый вид получает взвешенную оценку match_score, возвращаются top_k лучших.
+        """
+        return rank_species(self._species_matrix(insect_type), params, top_k)
+    
+    def _species_matrix(self, insect_type: str) -> SpeciesMatrix:
+        """Матрица признаков каталога; перестраивается при изменении версии данных"""
+        version = self.get_data_version(insect_type)
+        cached = Database._similarity_cache.get(insect_type)
+        if cached and cached[0] == version:
+            return cached[1]
+        
+        with Database._similarity_lock:
+            # Пока ждали блокировку, матрицу мог построить другой поток
+            cached = Database._similarity_cache.get(insect_type)
+            if cached and cached[0] == version:
+                return cached[1]
+            
+            matrix = SpeciesMatrix(insect_type, self.get_all_insects(insect_type))
+            Database._similarity_cache[insect_type] = (version, matrix)
+            return matrix
+    
+    def get_identification_key(self, insect_type: str) -> Tuple[IdentificationKey, Tuple[int, int]]:
+        """
+        Определительный ключ по текущему каталогу (см. identification_key.py)
+        
+        Ключ строится при первом обращении. После изменения версии данных
+        таблицы ключ перестраивается в фоновом потоке (неизменившиеся поддеревья
+        берутся из прошлого ключа), а до его готовности отдаётся прошлый ключ
+        со своей версией - запросы не ждут перестроения.
+        
+        Returns:
+            (ключ, версия данных, по которой он построен)
+        """
+        insect_type = self._check_type(insect_type)
+        version = self.get_data_version(insect_type)
+        cached = Database._key_cache.get(insect_type)
+        if cached and cached[0] == version:
+            return cached[1], cached[0]
+        
+        lock = Database._key_locks[insect_type]
+        if cached:
+            # Перестроение уже идёт - отдаём прошлый ключ
+            if lock.acquire(blocking=False):
+                thread = threading.Thread(target=self._rebuild_identification_key,
+                                          args=(insect_type, lock), name=f'identification-key-{insect_type}',
+                                          daemon=True)
+                try:
+                    thread.start()
+                except Exception:
+                    lock.release()
+                    raise
+            return cached[1], cached[0]
+        
+        with lock:
+            # Пока ждали блокировку, ключ мог построить другой поток
+            cached = Database._key_cache.get(insect_type)
+            if cached:
+                return cached[1], cached[0]
+            return self._build_identification_key(insect_type, None)
+    
+    def _build_identification_key(self, insect_type: str,
+                                  previous: Optional[IdentificationKey]) -> Tuple[IdentificationKey, Tuple[int, int]]:
+        # Версия читается до строк: если каталог изменится во время построения,
+        # ключ будет перестроен при следующем обращении
+        version = self.get_data_version(insect_type)
+        key = IdentificationKey(insect_type, self.get_all_insects(insect_type), previous)
+        Database._key_cache[insect_type] = (version, key)
+        return key, version
+    
+    def _rebuild_identification_key(self, insect_type: str, lock: threading.Lock):
+        """Перестроить ключ в фоне; блокировку типа взял вызывающий поток"""
+        try:
+            cached = Database._key_cache.get(insect_type)
+            if cached and cached[0] == self.get_data_version(insect_type):
+                return
+            self._build_identification_key(insect_type, cached[1] if cached else None)
+        except Exception as e:
+            print(f"⚠️ Не удалось перестроить определительный ключ ({insect_type}): {e}")
+        finally:
+            lock.release()
     
     def get_all_insects(self, insect_type: str) -> List[Dict]:
         """Получить все насекомые определенного типа"""
-        # Правильные имена таблиц
-        table_names = {
-            'dragonfly': 'dragonflies',
-            'beetle': 'beetles',
-            'butterfly': 'butterflies'
-        }
-        table_name = table_names.get(insect_type)
-        if not table_name:
+        return self.get_all_insects_page(insect_type)['results']
+    
+    def get_all_insects_page(self, insect_type: str, limit: Optional[int] = None,
+                             cursor: Optional[str] = None, fields: Optional[List[str]] = None) -> Dict:
+        """Получить насекомых определенного типа постранично (см. search_insects_page)"""
+        conditions, values, _, _ = self._search_conditions(insect_type, {})
+        return self._select_page(insect_type, conditions, values, None, [], limit, cursor, fields)
+    
+    def get_catalog(self, insect_types: Optional[List[str]] = None,
+                    fields: Optional[List[str]] = None, params: Optional[Dict] = None) -> List[Dict]:
+        """
+        Получить насекомых нескольких типов одним запросом
+        
+        Все типы лежат в species, поэтому каталог читается одним запросом
+        к секциям выбранных типов на одном соединении пула.
+        
+        Args:
+            insect_types: типы в нужном порядке (None - все три)
+            fields: колонки результата (None - все)
+            params: общие параметры поиска (size_min, size_max, color, habitat, season)
+        
+        Returns:
+            Список насекомых с полем insect_type, по типам и id
+        """
+        query, values = self._catalog_query(insect_types, fields, params)
+        with self.cursor(dict_rows=True) as db_cursor:
+            db_cursor.execute(query, values)
+            return [dict(row) for row in db_cursor.fetchall()]
+    
+    def _catalog_query(self, insect_types: Optional[List[str]], fields: Optional[List[str]],
+                       params: Optional[Dict]) -> Tuple[str, List]:
+        """SQL и параметры get_catalog: секции выбранных типов, порядок - как в insect_types"""
+        insect_types = list(insect_types or INSECT_TYPES)
+        for insect_type in insect_types:
+            self._check_type(insect_type)
+        columns = self._select_columns(fields or CATALOG_COLUMNS)
+        
+        conditions, values, _, _ = self._search_conditions(None, params or {})
+        where = " AND ".join(["insect_type = ANY(%s::text[])"] + conditions)
+        query = (f"SELECT insect_type, {columns} FROM {CATALOG_TABLE} WHERE {where}"
+                 " ORDER BY array_position(%s::text[], insect_type::text), id")
+        return query, [insect_types] + values + [insect_types]
+    
+    @staticmethod
+    def _check_type(insect_type: str) -> str:
+        """Проверить тип насекомого (значение подставляется в условия по секциям species)"""
+        if insect_type not in INSECT_TYPES:
             raise ValueError(f"Неверный тип насекомого: {insect_type}")
+        return insect_type
+    
+    def _select_page(self, insect_type: str, conditions: List[str], values: List,
+                     rank_sql: Optional[str], rank_values: List, limit: Optional[int],
+                     cursor: Optional[str], fields: Optional[List[str]]) -> Dict:
+        """
+        Выбрать страницу строк каталога
         
-        conn = self.get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        Страницы листаются по ключу (keyset): без ранжирования - по id,
+        с ранжированием - по (ранг DESC, id). Курсор - значения ключа
+        последней строки страницы, поэтому глубокие страницы не дороже первой.
+        """
+        after = self._parse_cursor(cursor, ranked=bool(rank_sql))
+        query, page_values = self._page_query(conditions, values, rank_sql, rank_values,
+                                              after, limit, fields)
         
-        cursor.execute(f"SELECT * FROM {table_name}")
+        # Используем RealDictCursor для получения результатов в виде словарей
+        with self.cursor(dict_rows=True) as db_cursor:
+            self._execute_prepared(db_cursor, query, page_values)
+            rows = [dict(row) for row in db_cursor.fetchall()]
+        
+        results, next_cursor = self._page_results(rows, limit, bool(rank_sql))
+        
+        if limit is None:
+            total = len(results)
+        elif after is None:
+            # Общее число считается только для первой страницы
+            total = self._count(insect_type, conditions, values)
+        else:
+            total = None
+        
+        return {'results': results, 'next_cursor': next_cursor, 'total': total}
+    
+    @staticmethod
+    def _page_results(rows: List[Dict], limit: Optional[int], ranked: bool) -> Tuple[List[Dict], Optional[str]]:
+        """Обрезать лишнюю строку страницы и вычислить курсор следующей страницы"""
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = f"{last['search_rank']!r}:{last['id']}" if ranked else str(last['id'])
+        
+        if ranked:
+            for row in rows:
+                row.pop('search_rank', None)
+        return rows, next_cursor
+    
+    def _execute_prepared(self, db_cursor, query: str, values: List):
+        """
+        Выполнить запрос через серверный подготовленный запрос подключения
+        
+        Формы запросов поиска повторяются (их число ограничено сочетаниями
+        фильтров), поэтому запрос подготавливается один раз на подключение,
+        а дальше PostgreSQL не разбирает и не планирует его заново.
+        Подготовка выполняется в точке сохранения: если тип параметра не
+        выводится, запрос просто выполняется обычным образом.
+        """
+        pool = self.get_pool()
+        if pool.max_prepared <= 0:
+            db_cursor.execute(query, values)
+            return
+        
+        conn = db_cursor.connection
+        statements = pool.prepared_statements(conn)
+        if query in statements:
+            name = statements.get(query)
+        else:
+            name = prepared_name(query)
+            positional, count = positional_query(query)
+            # Служебные команды выполняются обычным курсором - в метрики и журнал не попадают
+            with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as service:
+                service.execute("SAVEPOINT prepare_statement")
+                try:
+                    service.execute(f"PREPARE {name} AS {positional}")
+                except psycopg2.Error:
+                    service.execute("ROLLBACK TO SAVEPOINT prepare_statement")
+                    name = None
+                service.execute("RELEASE SAVEPOINT prepare_statement")
+                for evicted in statements.add(query, name):
+                    service.execute(f"DEALLOCATE {evicted}")
+        
+        if name is None:
+            db_cursor.execute(query, values)
+        elif values:
+            db_cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(values))})", values)
+        else:
+            db_cursor.execute(f"EXECUTE {name}")
+    
+    def _page_query(self, conditions: List[str], values: List,
+                    rank_sql: Optional[str], rank_values: List, after, limit: Optional[int],
+                    fields: Optional[List[str]]) -> Tuple[str, List]:
+        """SQL и параметры выборки строк каталога после ключа after (см. _select_page)"""
+        columns = self._select_columns(fields)
+        select_values = []
+        where = list(conditions)
+        where_values = list(values)
+        
+        if rank_sql:
+            columns += f", {rank_sql} AS search_rank"
+            select_values = list(rank_values)
+        
+        if after is not None:
+            if rank_sql:
+                last_rank, last_id = after
+                where.append(f"(({rank_sql}) < %s OR (({rank_sql}) = %s AND id > %s))")
+                where_values += list(rank_values) + [last_rank] + list(rank_values) + [last_rank, last_id]
+            else:
+                where.append("id > %s")
+                where_values.append(after)
         
-        # Получаем результаты в виде словарей
-        results = [dict(row) for row in cursor.fetchall()]
+        query = f"SELECT {columns} FROM {CATALOG_TABLE}"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY search_rank DESC, id" if rank_sql else " ORDER BY id"
         
-        cursor.close()
-        conn.close()
-        return results
+        page_values = select_values + where_values
+        if limit is not None:
+            # Лишняя строка показывает, есть ли следующая страница
+            query += " LIMIT %s"
+            page_values.append(limit + 1)
+        return query, page_values
+    
+    def iter_rows(self, query: str, values=None, itersize: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Построчно читать результат запроса через серверный (именованный) курсор
+        
+        Строки приходят из базы пачками по itersize, поэтому память не растёт
+        с размером выборки. Подключение занято, пока генератор не исчерпан
+        или не закрыт; незавершённая транзакция откатывается при возврате в пул.
+        """
+        with self.connection() as conn:
+            with conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=cursor_factory(True)) as cursor:
+                cursor.itersize = itersize or STREAM_CONFIG['itersize']
+                cursor.execute(query, values)
+                for row in cursor:
+                    yield dict(row)
+    
+    def iter_all_insects(self, insect_type: str, fields: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Построчно получить всех насекомых определенного типа (см. iter_rows)"""
+        conditions, values, _, _ = self._search_conditions(insect_type, {})
+        query, query_values = self._page_query(conditions, values, None, [], None, None, fields)
+        return self.iter_rows(query, query_values)
+    
+    def iter_search_insects(self, insect_type: str, params: Dict,
+                            fields: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Построчно получить результаты search_insects (без кэша результатов)"""
+        conditions, values, rank_terms, rank_values = self._search_conditions(insect_type, params)
+        rank_sql = " + ".join(rank_terms) if rank_terms else None
+        query, query_values = self._page_query(conditions, values, rank_sql, rank_values,
+                                               None, None, fields)
+        for row in self.iter_rows(query, query_values):
+            row.pop('search_rank', None)
+            yield row
+    
+    def _select_columns(self, fields: Optional[List[str]]) -> str:
+        """Список колонок SELECT для проекции fields (id включается всегда)"""
+        if not fields:
+            return ', '.join(CATALOG_COLUMNS)
+        unknown = [name for name in fields if name not in CATALOG_COLUMNS]
+        if unknown:
+            raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+        columns = ['id'] + [name for name in CATALOG_COLUMNS if name in fields and name != 'id']
+        return ', '.join(columns)
+    
+    @staticmethod
+    def _parse_cursor(cursor: Optional[str], ranked: bool):
+        """Разобрать курсор страницы: 'id' или 'ранг:id'"""
+        if not cursor:
+            return None
+        try:
+            if ranked:
+                last_rank, last_id = str(cursor).rsplit(':', 1)
+                return float(last_rank), int(last_id)
+            return int(cursor)
+        except ValueError:
+            raise ValueError(f"Неверный курсор: {cursor}")
+    
+    def _count(self, insect_type: str, conditions: List[str], values: List) -> int:
+        """Число строк по условиям; кэшируется до изменения версии данных типа"""
+        key = self._count_key(conditions, values)
+        version = self.get_data_version(insect_type)
+        cached = Database._count_cache.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+        
+        with self.cursor() as db_cursor:
+            self._execute_prepared(db_cursor, self._count_query(conditions), values)
+            total = db_cursor.fetchone()[0]
+        
+        self._remember_count(key, version, total)
+        return total
+    
+    @staticmethod
+    def _count_key(conditions: List[str], values: List) -> tuple:
+        # Тип насекомого входит в параметры первого условия
+        return tuple(conditions), tuple(_canonical_value(v) for v in values)
+    
+    @staticmethod
+    def _count_query(conditions: List[str]) -> str:
+        query = f"SELECT count(*) FROM {CATALOG_TABLE}"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return query
+    
+    @staticmethod
+    def _remember_count(key: tuple, version: Tuple[int, int], total: int):
+        if len(Database._count_cache) >= COUNT_CACHE_SIZE:
+            Database._count_cache.clear()
+        Database._count_cache[key] = (version, total)
     
     def add_insect(self, insect_type: str, data: Dict):
-        """Добавить насекомое в базу данных"""
-        # Правильные имена таблиц
-        table_names = {
-            'dragonfly': 'dragonflies',
-            'beetle': 'beetles',
-            'butterfly': 'butterflies'
-        }
-        table_name = table_names.get(insect_type)
-        if not table_name:
-            raise ValueError(f"Неверный тип насекомого: {insect_type}")
+        """
+        Добавить насекомое в базу данных
+        
+        Если в data нет attributes, размаха крыльев или пола, они извлекаются
+        из description, чтобы запись находилась структурированным поиском.
+        """
+        self._check_type(insect_type)
         
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        data = dict(data)
+        if 'attributes' not in data:
+            data['attributes'] = attributes_from_description(data.get('description'))
+        if 'wingspan_min' not in data and 'wingspan_max' not in data:
+            data['wingspan_min'], data['wingspan_max'] = parse_wingspan(data.get('description'))
+        if 'sex' not in data:
+            data['sex'] = parse_description(data.get('description')).get('gender')
+        if isinstance(data['attributes'], dict):
+            data['attributes'] = Json(data['attributes'])
+        
+        data['insect_type'] = insect_type
         
         columns = ', '.join(data.keys())
         # PostgreSQL использует %s для параметров
         placeholders = ', '.join(['%s' for _ in data])
         values = list(data.values())
         
-        query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
-        cursor.execute(query, values)
+        query = f"INSERT INTO {CATALOG_TABLE} ({columns}) VALUES ({placeholders})"
+        with self.cursor() as cursor:
+            cursor.execute(query, values)
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+        self._bump_data_version(insect_type)
     
     def get_filter_options(self, insect_type: str) -> Dict:
-        """Получить уникальные значения для фильтров из базы данных"""
-        table_names = {
-            'dragonfly': 'dragonflies',
-            'beetle': 'beetles',
-            'butterfly': 'butterflies'
-        }
-        table_name = table_names.get(insect_type)
-        if not table_name:
-            raise ValueError(f"Неверный тип насекомого: {insect_type}")
+        """Получить уникальные значения для фильтров (из кэша, если данные не менялись)"""
+        options, _ = self.get_filter_options_with_etag(insect_type)
+        return options
+    
+    def get_filter_options_with_etag(self, insect_type: str) -> Tuple[Dict, str]:
+        """
+        Получить фасеты фильтров вместе с их ETag
         
-        conn = self.get_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        Фасеты вычисляются один раз и хранятся в кэше процесса, пока не
+        изменится версия данных таблицы (см. get_data_version).
+        Возвращаемый словарь общий для всех вызовов - его нельзя изменять.
+        
+        Returns:
+            (options, etag), где etag - хеш содержимого options
+        """
+        version = self.get_data_version(insect_type)
+        cached = Database._filter_options_cache.get(insect_type)
+        if cached and cached[0] == version:
+            return cached[1], cached[2]
+        
+        with Database._filter_options_lock:
+            # Пока ждали блокировку, фасеты мог пересчитать другой поток
+            cached = Database._filter_options_cache.get(insect_type)
+            if cached and cached[0] == version:
+                return cached[1], cached[2]
+            
+            options = self._load_filter_options(insect_type)
+            payload = json.dumps(options, ensure_ascii=False, sort_keys=True)
+            etag = hashlib.sha1(payload.encode('utf-8')).hexdigest()
+            Database._filter_options_cache[insect_type] = (version, options, etag)
+            return options, etag
+    
+    def _load_filter_options(self, insect_type: str) -> Dict:
+        """Получить уникальные значения для фильтров из базы данных"""
+        # Тип передаётся параметром (psycopg2 подставляет значение на стороне клиента,
+        # поэтому секция species по-прежнему выбирается при планировании)
+        self._check_type(insect_type)
         
         options = {}
         
-        if insect_type == 'dragonfly':
-            # Базовые цвета для быстрого поиска
-            basic_colors = [
-                'синий', 'голубой', 'зелёный', 'жёлтый', 'красный', 
-                'коричневый', 'чёрный', 'белый', 'оранжевый', 'фиолетовый',
-                'бронзовый', 'металлический', 'серый'
-            ]
-            options['basic_colors'] = basic_colors
-            
-            # Получаем уникальные основные цвета из поля color
-            cursor.execute(f"""
-                SELECT DISTINCT color
-                FROM {table_name}
-                WHERE color IS NOT NULL AND color != ''
-                ORDER BY color
-            """)
-            main_colors = []
-            for row in cursor.fetchall():
-                color_str = row['color']
-                if color_str:
-                    # Разбиваем цвета, если они разделены запятыми
-                    colors = [c.strip() for c in color_str.split(',')]
-                    main_colors.extend(colors)
-            
-            # Очищаем странные значения
-            cleaned_colors = []
-            exclude_patterns = [
-                'более', 'менее', 'чем у', 'вариа', 'светл', 'тускл',
-                'чем у самца', 'чем у S.', 'sanguineum', 'торокс', 'брюшко',
-                'сегмент', 'отметин', 'пятно', 'полос', 'рисунок', 'фон',
-                'пруинов', 'отлив', 'блеск', 'грудь', 'U-образн'
-            ]
-            
-            for color in main_colors:
-                if color and len(color) > 2:
-                    color_lower = color.lower()
-                    # Пропускаем цвета с исключающими паттернами
-                    if not any(pattern in color_lower for pattern in exclude_patterns):
-                        # Ограничиваем длину
-                        if len(color) < 80:
-                            cleaned_colors.append(color)
-            
-            # Убираем дубликаты и сортируем
-            options['colors'] = sorted(list(set(cleaned_colors)))
-            
-            # Базовые цвета глаз для быстрого поиска
-            basic_eye_colors = [
-                'зелёные', 'коричневые', 'чёрные', 'синие', 'голубые',
-                'красные', 'жёлтые', 'серые'
-            ]
-            options['basic_eye_colors'] = basic_eye_colors
-            
-            # Получаем уникальные цвета глаз из описания
-            cursor.execute(f"""
-                SELECT description
-                FROM {table_name}
-                WHERE description IS NOT NULL AND description ILIKE '%цвет глаз%'
-            """)
-            eye_colors_set = set()
-            for row in cursor.fetchall():
-                desc = row['description']
-                # Ищем паттерн "Цвет глаз: ..."
-                matches = re.findall(r'Цвет глаз:\s*([^;]+)', desc, re.IGNORECASE)
-                for match in matches:
-                    color = match.strip()
-                    if color and len(color) < 100:
-                        eye_colors_set.add(color)
-            
-            # Очищаем странные значения для цветов глаз
-            cleaned_eye_colors = []
-            exclude_patterns_eye = [
-                'сверху', 'снизу', 'пятно', 'отлив', 'или', '/', 'вариа'
-            ]
-            
-            for color in eye_colors_set:
-                if color and len(color) > 2:
-                    color_lower = color.lower()
-                    # Пропускаем слишком сложные описания
-                    if not any(pattern in color_lower for pattern in exclude_patterns_eye):
-                        if len(color) < 50:
-                            cleaned_eye_colors.append(color)
-                    else:
-                        # Если содержит "или", берем первую часть
-                        if ' или ' in color_lower or ' / ' in color_lower:
-                            first_part = color.split(' или ')[0].split(' / ')[0].strip()
-                            if first_part and len(first_part) < 30:
-                                cleaned_eye_colors.append(first_part)
+        with self.cursor(dict_rows=True) as cursor:
+            if insect_type == 'dragonfly':
+                # Базовые цвета для быстрого поиска
+                basic_colors = [
+                    'синий', 'голубой', 'зелёный', 'жёлтый', 'красный', 
+                    'коричневый', 'чёрный', 'белый', 'оранжевый', 'фиолетовый',
+                    'бронзовый', 'металлический', 'серый'
+                ]
+                options['basic_colors'] = basic_colors
+            
+                # Получаем уникальные основные цвета из поля color
+                cursor.execute(f"""
+                    SELECT DISTINCT color
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND color IS NOT NULL AND color != ''
+                    ORDER BY color
+                """, (insect_type,))
+                main_colors = []
+                for row in cursor.fetchall():
+                    color_str = row['color']
+                    if color_str:
+                        # Разбиваем цвета, если они разделены запятыми
+                        colors = [c.strip() for c in color_str.split(',')]
+                        main_colors.extend(colors)
+            
+                # Очищаем странные значения
+                cleaned_colors = []
+                exclude_patterns = [
+                    'более', 'менее', 'чем у', 'вариа', 'светл', 'тускл',
+                    'чем у самца', 'чем у S.', 'sanguineum', 'торокс', 'брюшко',
+                    'сегмент', 'отметин', 'пятно', 'полос', 'рисунок', 'фон',
+                    'пруинов', 'отлив', 'блеск', 'грудь', 'U-образн'
+                ]
+            
+                for color in main_colors:
+                    if color and len(color) > 2:
+                        color_lower = color.lower()
+                        # Пропускаем цвета с исключающими паттернами
+                        if not any(pattern in color_lower for pattern in exclude_patterns):
+                            # Ограничиваем длину
+                            if len(color) < 80:
+                                cleaned_colors.append(color)
+            
+                # Убираем дубликаты и сортируем
+                options['colors'] = sorted(list(set(cleaned_colors)))
+            
+                # Базовые цвета глаз для быстрого поиска
+                basic_eye_colors = [
+                    'зелёные', 'коричневые', 'чёрные', 'синие', 'голубые',
+                    'красные', 'жёлтые', 'серые'
+                ]
+                options['basic_eye_colors'] = basic_eye_colors
+            
+                # Получаем уникальные цвета глаз из описания
+                cursor.execute(f"""
+                    SELECT description
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND description IS NOT NULL AND description ILIKE '%%цвет глаз%%'
+                """, (insect_type,))
+                eye_colors_set = set()
+                for row in cursor.fetchall():
+                    desc = row['description']
+                    # Ищем паттерн "Цвет глаз: ..."
+                    matches = re.findall(r'Цвет глаз:\s*([^;]+)', desc, re.IGNORECASE)
+                    for match in matches:
+                        color = match.strip()
+                        if color and len(color) < 100:
+                            eye_colors_set.add(color)
+            
+                # Очищаем странные значения для цветов глаз
+                cleaned_eye_colors = []
+                exclude_patterns_eye = [
+                    'сверху', 'снизу', 'пятно', 'отлив', 'или', '/', 'вариа'
+                ]
+            
+                for color in eye_colors_set:
+                    if color and len(color) > 2:
+                        color_lower = color.lower()
+                        # Пропускаем слишком сложные описания
+                        if not any(pattern in color_lower for pattern in exclude_patterns_eye):
+                            if len(color) < 50:
+                                cleaned_eye_colors.append(color)
+                        else:
+                            # Если содержит "или", берем первую часть
+                            if ' или ' in color_lower or ' / ' in color_lower:
+                                first_part = color.split(' или ')[0].split(' / ')[0].strip()
+                                if first_part and len(first_part) < 30:
+                                    cleaned_eye_colors.append(first_part)
+                            else:
+                                # Берем основную часть до запятой
+                                main_part = color.split(',')[0].strip()
+                                if main_part and len(main_part) < 50:
+                                    cleaned_eye_colors.append(main_part)
+            
+                # Убираем дубликаты и сортируем
+                options['eye_colors'] = sorted(list(set(cleaned_eye_colors)))
+            
+                # Базовые места нахождения для быстрого поиска
+                basic_habitats = [
+                    'лес', 'луг', 'водоем', 'сад', 'поле', 'болото', 
+                    'река', 'озеро', 'пруд', 'ручей', 'берег', 'опушка'
+                ]
+                options['basic_habitats'] = basic_habitats
+            
+                # Получаем все уникальные места нахождения
+                cursor.execute(f"""
+                    SELECT DISTINCT habitat
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND habitat IS NOT NULL AND habitat != ''
+                    ORDER BY habitat
+                """, (insect_type,))
+                all_habitats = [row['habitat'] for row in cursor.fetchall()]
+                options['habitats'] = all_habitats
+                options['all_habitats'] = all_habitats  # Для совместимости
+            
+                # Получаем уникальные среды (тип водоёма) из описания
+                cursor.execute(f"""
+                    SELECT description
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND description IS NOT NULL AND description ILIKE '%%среда%%'
+                """, (insect_type,))
+                environments_set = set()
+                for row in cursor.fetchall():
+                    desc = row['description']
+                    # Ищем паттерн "Среда: ..."
+                    matches = re.findall(r'Среда:\s*([^;]+)', desc, re.IGNORECASE)
+                    for match in matches:
+                        env = match.strip()
+                        if env and len(env) < 150:
+                            environments_set.add(env)
+                options['environments'] = sorted(list(environments_set))
+            
+                # Получаем уникальные периоды
+                cursor.execute(f"""
+                    SELECT DISTINCT season
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND season IS NOT NULL AND season != ''
+                    ORDER BY season
+                """, (insect_type,))
+                options['seasons'] = [row['season'] for row in cursor.fetchall()]
+        
+            elif insect_type == 'beetle':
+                # Базовые цвета для жуков
+                basic_colors = [
+                    'чёрный', 'бронзовый', 'зелёный', 'коричневый', 'красный',
+                    'синий', 'фиолетовый', 'золотистый', 'медный', 'металлический'
+                ]
+                options['basic_colors'] = basic_colors
+            
+                # Получаем уникальные основные цвета
+                cursor.execute(f"""
+                    SELECT DISTINCT color
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND color IS NOT NULL AND color != ''
+                    ORDER BY color
+                """, (insect_type,))
+                main_colors = []
+                for row in cursor.fetchall():
+                    color_str = row['color']
+                    if color_str:
+                        colors = [c.strip() for c in color_str.split(',')]
+                        main_colors.extend(colors)
+            
+                # Очищаем странные значения
+                cleaned_colors = []
+                exclude_patterns = [
+                    'более', 'менее', 'чем у', 'вариа', 'светл', 'тускл',
+                    'отлив', 'блеск', 'блестящ', 'матов', 'голова', 'переднеспинка',
+                    'верх', 'низ', 'часто', 'выражен', 'сильн', 'слаб'
+                ]
+            
+                for color in main_colors:
+                    if color and len(color) > 2:
+                        color_lower = color.lower()
+                        if not any(pattern in color_lower for pattern in exclude_patterns):
+                            if len(color) < 60:
+                                cleaned_colors.append(color)
+            
+                options['colors'] = sorted(list(set(cleaned_colors)))
+            
+                # Базовые типы поверхности/блеска для жуков
+                basic_surface_types = [
+                    'глянцевый', 'матовый', 'блестящий', 'металлический',
+                    'полуматовый', 'тусклый', 'яркий'
+                ]
+                options['basic_surface_types'] = basic_surface_types
+            
+                # Получаем все типы поверхности из описания
+                cursor.execute(f"""
+                    SELECT description
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND description IS NOT NULL AND (description ILIKE '%%тип поверхности%%' OR description ILIKE '%%блеск%%')
+                """, (insect_type,))
+                surface_types_set = set()
+                for row in cursor.fetchall():
+                    desc = row['description']
+                    # Ищем паттерн "Тип поверхности / Блеск: ..." или "Тип поверхности: ..."
+                    matches = re.findall(r'Тип поверхности[^:]*:\s*([^;]+)', desc, re.IGNORECASE)
+                    if not matches:
+                        # Пробуем найти просто "блеск" или "блестящ"
+                        matches = re.findall(r'[Бб]леск[^:]*:\s*([^;]+)', desc, re.IGNORECASE)
+                    for match in matches:
+                        surface = match.strip()
+                        if surface and len(surface) < 100:
+                            surface_types_set.add(surface)
+            
+                # Очищаем значения
+                cleaned_surface_types = []
+                for surface in surface_types_set:
+                    if surface and len(surface) > 2:
+                        cleaned_surface_types.append(surface)
+                options['all_surface_types'] = sorted(list(set(cleaned_surface_types)))
+            
+                # Базовые типы надкрылий
+                basic_elytra = [
+                    'гладкие', 'зернистые', 'морщинистые', 'точечные',
+                    'бороздчатые', 'ребристые', 'ямчатые'
+                ]
+                options['basic_elytra'] = basic_elytra
+            
+                # Получаем все типы надкрылий из описания
+                cursor.execute(f"""
+                    SELECT description
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND description IS NOT NULL AND description ILIKE '%%надкрыль%%'
+                """, (insect_type,))
+                elytra_set = set()
+                for row in cursor.fetchall():
+                    desc = row['description']
+                    # Ищем паттерн "Надкрылья: ..."
+                    matches = re.findall(r'Надкрыль[^:]*:\s*([^;]+)', desc, re.IGNORECASE)
+                    for match in matches:
+                        elytra = match.strip()
+                        if elytra and len(elytra) < 100:
+                            elytra_set.add(elytra)
+            
+                cleaned_elytra = []
+                for elytra in elytra_set:
+                    if elytra and len(elytra) > 2:
+                        cleaned_elytra.append(elytra)
+                options['all_elytra'] = sorted(list(set(cleaned_elytra)))
+            
+                # Базовые места нахождения для жуков
+                basic_habitats = [
+                    'лес', 'луг', 'сад', 'поле', 'болото', 'берег',
+                    'опушка', 'поляна', 'парк', 'огород'
+                ]
+                options['basic_habitats'] = basic_habitats
+            
+                # Получаем все места нахождения
+                cursor.execute(f"""
+                    SELECT DISTINCT habitat
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND habitat IS NOT NULL AND habitat != ''
+                    ORDER BY habitat
+                """, (insect_type,))
+                all_habitats = [row['habitat'] for row in cursor.fetchall()]
+                options['habitats'] = all_habitats
+                options['all_habitats'] = all_habitats
+            
+                # Базовые периоды активности
+                basic_seasons = [
+                    'весна', 'лето', 'осень', 'зима',
+                    'май', 'июнь', 'июль', 'август'
+                ]
+                options['basic_seasons'] = basic_seasons
+            
+                # Получаем все периоды
+                cursor.execute(f"""
+                    SELECT DISTINCT season
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND season IS NOT NULL AND season != ''
+                    ORDER BY season
+                """, (insect_type,))
+                all_seasons = [row['season'] for row in cursor.fetchall()]
+                options['seasons'] = all_seasons
+                options['all_seasons'] = all_seasons
+        
+            elif insect_type == 'butterfly':
+                # Базовые цвета для бабочек
+                basic_colors = [
+                    'белый', 'жёлтый', 'коричневый', 'красный', 'синий',
+                    'чёрный', 'оранжевый', 'розовый', 'фиолетовый', 'серый'
+                ]
+                options['basic_colors'] = basic_colors
+            
+                # Получаем уникальные основные цвета
+                cursor.execute(f"""
+                    SELECT DISTINCT color
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND color IS NOT NULL AND color != ''
+                    ORDER BY color
+                """, (insect_type,))
+                main_colors = []
+                for row in cursor.fetchall():
+                    color_str = row['color']
+                    if color_str:
+                        colors = [c.strip() for c in color_str.split(',')]
+                        main_colors.extend(colors)
+            
+                # Очищаем странные значения
+                cleaned_colors = []
+                exclude_patterns = [
+                    'основной цвет', 'крыльев', 'передние', 'задние',
+                    'мраморн', 'ажурн', 'волнист', 'линии', 'рисунок',
+                    'оттенок', 'отлив', 'или', 'желтовато', 'красновато'
+                ]
+            
+                for color in main_colors:
+                    if color and len(color) > 2:
+                        color_lower = color.lower()
+                        if not any(pattern in color_lower for pattern in exclude_patterns):
+                            if len(color) < 50:
+                                cleaned_colors.append(color)
                         else:
-                            # Берем основную часть до запятой
-                            main_part = color.split(',')[0].strip()
-                            if main_part and len(main_part) < 50:
-                                cleaned_eye_colors.append(main_part)
-            
-            # Убираем дубликаты и сортируем
-            options['eye_colors'] = sorted(list(set(cleaned_eye_colors)))
-            
-            # Базовые места нахождения для быстрого поиска
-            basic_habitats = [
-                'лес', 'луг', 'водоем', 'сад', 'поле', 'болото', 
-                'река', 'озеро', 'пруд', 'ручей', 'берег', 'опушка'
-            ]
-            options['basic_habitats'] = basic_habitats
-            
-            # Получаем все уникальные места нахождения
-            cursor.execute(f"""
-                SELECT DISTINCT habitat
-                FROM {table_name}
-                WHERE habitat IS NOT NULL AND habitat != ''
-                ORDER BY habitat
-            """)
-            all_habitats = [row['habitat'] for row in cursor.fetchall()]
-            options['habitats'] = all_habitats
-            options['all_habitats'] = all_habitats  # Для совместимости
-            
-            # Получаем уникальные среды (тип водоёма) из описания
-            cursor.execute(f"""
-                SELECT description
-                FROM {table_name}
-                WHERE description IS NOT NULL AND description ILIKE '%среда%'
-            """)
-            environments_set = set()
-            for row in cursor.fetchall():
-                desc = row['description']
-                # Ищем паттерн "Среда: ..."
-                matches = re.findall(r'Среда:\s*([^;]+)', desc, re.IGNORECASE)
-                for match in matches:
-                    env = match.strip()
-                    if env and len(env) < 150:
-                        environments_set.add(env)
-            options['environments'] = sorted(list(environments_set))
-            
-            # Получаем уникальные периоды
-            cursor.execute(f"""
-                SELECT DISTINCT season
-                FROM {table_name}
-                WHERE season IS NOT NULL AND season != ''
-                ORDER BY season
-            """)
-            options['seasons'] = [row['season'] for row in cursor.fetchall()]
-        
-        elif insect_type == 'beetle':
-            # Базовые цвета для жуков
-            basic_colors = [
-                'чёрный', 'бронзовый', 'зелёный', 'коричневый', 'красный',
-                'синий', 'фиолетовый', 'золотистый', 'медный', 'металлический'
-            ]
-            options['basic_colors'] = basic_colors
-            
-            # Получаем уникальные основные цвета
-            cursor.execute(f"""
-                SELECT DISTINCT color
-                FROM {table_name}
-                WHERE color IS NOT NULL AND color != ''
-                ORDER BY color
-            """)
-            main_colors = []
-            for row in cursor.fetchall():
-                color_str = row['color']
-                if color_str:
-                    colors = [c.strip() for c in color_str.split(',')]
-                    main_colors.extend(colors)
-            
-            # Очищаем странные значения
-            cleaned_colors = []
-            exclude_patterns = [
-                'более', 'менее', 'чем у', 'вариа', 'светл', 'тускл',
-                'отлив', 'блеск', 'блестящ', 'матов', 'голова', 'переднеспинка',
-                'верх', 'низ', 'часто', 'выражен', 'сильн', 'слаб'
-            ]
-            
-            for color in main_colors:
-                if color and len(color) > 2:
-                    color_lower = color.lower()
-                    if not any(pattern in color_lower for pattern in exclude_patterns):
-                        if len(color) < 60:
-                            cleaned_colors.append(color)
-            
-            options['colors'] = sorted(list(set(cleaned_colors)))
-            
-            # Базовые типы поверхности/блеска для жуков
-            basic_surface_types = [
-                'глянцевый', 'матовый', 'блестящий', 'металлический',
-                'полуматовый', 'тусклый', 'яркий'
-            ]
-            options['basic_surface_types'] = basic_surface_types
-            
-            # Получаем все типы поверхности из описания
-            cursor.execute(f"""
-                SELECT description
-                FROM {table_name}
-                WHERE description IS NOT NULL AND (description ILIKE '%тип поверхности%' OR description ILIKE '%блеск%')
-            """)
-            surface_types_set = set()
-            for row in cursor.fetchall():
-                desc = row['description']
-                # Ищем паттерн "Тип поверхности / Блеск: ..." или "Тип поверхности: ..."
-                matches = re.findall(r'Тип поверхности[^:]*:\s*([^;]+)', desc, re.IGNORECASE)
-                if not matches:
-                    # Пробуем найти просто "блеск" или "блестящ"
-                    matches = re.findall(r'[Бб]леск[^:]*:\s*([^;]+)', desc, re.IGNORECASE)
-                for match in matches:
-                    surface = match.strip()
-                    if surface and len(surface) < 100:
-                        surface_types_set.add(surface)
-            
-            # Очищаем значения
-            cleaned_surface_types = []
-            for surface in surface_types_set:
-                if surface and len(surface) > 2:
-                    cleaned_surface_types.append(surface)
-            options['all_surface_types'] = sorted(list(set(cleaned_surface_types)))
-            
-            # Базовые типы надкрылий
-            basic_elytra = [
-                'гладкие', 'зернистые', 'морщинистые', 'точечные',
-                'бороздчатые', 'ребристые', 'ямчатые'
-            ]
-            options['basic_elytra'] = basic_elytra
-            
-            # Получаем все типы надкрылий из описания
-            cursor.execute(f"""
-                SELECT description
-                FROM {table_name}
-                WHERE description IS NOT NULL AND description ILIKE '%надкрыль%'
-            """)
-            elytra_set = set()
-            for row in cursor.fetchall():
-                desc = row['description']
-                # Ищем паттерн "Надкрылья: ..."
-                matches = re.findall(r'Надкрыль[^:]*:\s*([^;]+)', desc, re.IGNORECASE)
-                for match in matches:
-                    elytra = match.strip()
-                    if elytra and len(elytra) < 100:
-                        elytra_set.add(elytra)
-            
-            cleaned_elytra = []
-            for elytra in elytra_set:
-                if elytra and len(elytra) > 2:
-                    cleaned_elytra.append(elytra)
-            options['all_elytra'] = sorted(list(set(cleaned_elytra)))
-            
-            # Базовые места нахождения для жуков
-            basic_habitats = [
-                'лес', 'луг', 'сад', 'поле', 'болото', 'берег',
-                'опушка', 'поляна', 'парк', 'огород'
-            ]
-            options['basic_habitats'] = basic_habitats
-            
-            # Получаем все места нахождения
-            cursor.execute(f"""
-                SELECT DISTINCT habitat
-                FROM {table_name}
-                WHERE habitat IS NOT NULL AND habitat != ''
-                ORDER BY habitat
-            """)
-            all_habitats = [row['habitat'] for row in cursor.fetchall()]
-            options['habitats'] = all_habitats
-            options['all_habitats'] = all_habitats
-            
-            # Базовые периоды активности
-            basic_seasons = [
-                'весна', 'лето', 'осень', 'зима',
-                'май', 'июнь', 'июль', 'август'
-            ]
-            options['basic_seasons'] = basic_seasons
-            
-            # Получаем все периоды
-            cursor.execute(f"""
-                SELECT DISTINCT season
-                FROM {table_name}
-                WHERE season IS NOT NULL AND season != ''
-                ORDER BY season
-            """)
-            all_seasons = [row['season'] for row in cursor.fetchall()]
-            options['seasons'] = all_seasons
-            options['all_seasons'] = all_seasons
+                            # Если содержит "или", берем первую часть
+                            if ' или ' in color_lower or ' / ' in color_lower:
+                                first_part = color.split(' или ')[0].split(' / ')[0].strip()
+                                if first_part and len(first_part) < 30:
+                                    cleaned_colors.append(first_part)
+            
+                options['colors'] = sorted(list(set(cleaned_colors)))
+            
+                # Базовые особенности рисунка крыльев
+                basic_wing_patterns = [
+                    'пятна', 'полосы', 'точки', 'кружки', 'глазки',
+                    'кайма', 'перевязи', 'мраморный', 'сетчатый'
+                ]
+                options['basic_wing_patterns'] = basic_wing_patterns
+            
+                # Получаем все особенности рисунка крыльев из описания
+                cursor.execute(f"""
+                    SELECT description
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND description IS NOT NULL AND description ILIKE '%%рисунок%%'
+                """, (insect_type,))
+                wing_patterns_set = set()
+                for row in cursor.fetchall():
+                    desc = row['description']
+                    # Ищем паттерн "Рисунок: ..." (как хранится в БД)
+                    matches = re.findall(r'Рисунок[^:]*:\s*([^;]+)', desc, re.IGNORECASE)
+                    for match in matches:
+                        pattern = match.strip()
+                        if pattern and len(pattern) < 150:
+                            wing_patterns_set.add(pattern)
+            
+                # Очищаем значения
+                cleaned_wing_patterns = []
+                exclude_patterns = ['крыльев', 'верх', 'низ', 'передние', 'задние']
+                for pattern in wing_patterns_set:
+                    if pattern and len(pattern) > 2:
+                        pattern_lower = pattern.lower()
+                        if not any(exc in pattern_lower for exc in exclude_patterns):
+                            cleaned_wing_patterns.append(pattern)
+                options['all_wing_patterns'] = sorted(list(set(cleaned_wing_patterns)))
+            
+                # Базовые места нахождения для бабочек
+                basic_habitats = [
+                    'лес', 'луг', 'сад', 'поле', 'болото', 'берег',
+                    'опушка', 'поляна', 'парк', 'лужайка', 'лесополоса'
+                ]
+                options['basic_habitats'] = basic_habitats
+            
+                # Получаем все места нахождения
+                cursor.execute(f"""
+                    SELECT DISTINCT habitat
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND habitat IS NOT NULL AND habitat != ''
+                    ORDER BY habitat
+                """, (insect_type,))
+                all_habitats = [row['habitat'] for row in cursor.fetchall()]
+                options['habitats'] = all_habitats
+                options['all_habitats'] = all_habitats
+            
+                # Базовые периоды лёта
+                basic_seasons = [
+                    'весна', 'лето', 'осень',
+                    'май', 'июнь', 'июль', 'август', 'сентябрь'
+                ]
+                options['basic_seasons'] = basic_seasons
+            
+                # Получаем все периоды лёта
+                cursor.execute(f"""
+                    SELECT DISTINCT season
+                    FROM {CATALOG_TABLE}
+                    WHERE insect_type = %s AND season IS NOT NULL AND season != ''
+                    ORDER BY season
+                """, (insect_type,))
+                all_seasons = [row['season'] for row in cursor.fetchall()]
+                options['seasons'] = all_seasons
+                options['all_seasons'] = all_seasons
         
-        elif insect_type == 'butterfly':
-            # Базовые цвета для бабочек
-            basic_colors = [
-                'белый', 'жёлтый', 'коричневый', 'красный', 'синий',
-                'чёрный', 'оранжевый', 'розовый', 'фиолетовый', 'серый'
-            ]
-            options['basic_colors'] = basic_colors
-            
-            # Получаем уникальные основные цвета
-            cursor.execute(f"""
-                SELECT DISTINCT color
-                FROM {table_name}
-                WHERE color IS NOT NULL AND color != ''
-                ORDER BY color
-            """)
-            main_colors = []
-            for row in cursor.fetchall():
-                color_str = row['color']
-                if color_str:
-                    colors = [c.strip() for c in color_str.split(',')]
-                    main_colors.extend(colors)
-            
-            # Очищаем странные значения
-            cleaned_colors = []
-            exclude_patterns = [
-                'основной цвет', 'крыльев', 'передние', 'задние',
-                'мраморн', 'ажурн', 'волнист', 'линии', 'рисунок',
-                'оттенок', 'отлив', 'или', 'желтовато', 'красновато'
-            ]
-            
-            for color in main_colors:
-                if color and len(color) > 2:
-                    color_lower = color.lower()
-                    if not any(pattern in color_lower for pattern in exclude_patterns):
-                        if len(color) < 50:
-                            cleaned_colors.append(color)
-                    else:
-                        # Если содержит "или", берем первую часть
-                        if ' или ' in color_lower or ' / ' in color_lower:
-                            first_part = color.split(' или ')[0].split(' / ')[0].strip()
-                            if first_part and len(first_part) < 30:
-                                cleaned_colors.append(first_part)
-            
-            options['colors'] = sorted(list(set(cleaned_colors)))
-            
-            # Базовые особенности рисунка крыльев
-            basic_wing_patterns = [
-                'пятна', 'полосы', 'точки', 'кружки', 'глазки',
-                'кайма', 'перевязи', 'мраморный', 'сетчатый'
-            ]
-            options['basic_wing_patterns'] = basic_wing_patterns
-            
-            # Получаем все особенности рисунка крыльев из описания
-            cursor.execute(f"""
-                SELECT description
-                FROM {table_name}
-                WHERE description IS NOT NULL AND description ILIKE '%рисунок%'
-            """)
-            wing_patterns_set = set()
-            for row in cursor.fetchall():
-                desc = row['description']
-                # Ищем паттерн "Рисунок: ..." (как хранится в БД)
-                matches = re.findall(r'Рисунок[^:]*:\s*([^;]+)', desc, re.IGNORECASE)
-                for match in matches:
-                    pattern = match.strip()
-                    if pattern and len(pattern) < 150:
-                        wing_patterns_set.add(pattern)
-            
-            # Очищаем значения
-            cleaned_wing_patterns = []
-            exclude_patterns = ['крыльев', 'верх', 'низ', 'передние', 'задние']
-            for pattern in wing_patterns_set:
-                if pattern and len(pattern) > 2:
-                    pattern_lower = pattern.lower()
-                    if not any(exc in pattern_lower for exc in exclude_patterns):
-                        cleaned_wing_patterns.append(pattern)
-            options['all_wing_patterns'] = sorted(list(set(cleaned_wing_patterns)))
-            
-            # Базовые места нахождения для бабочек
-            basic_habitats = [
-                'лес', 'луг', 'сад', 'поле', 'болото', 'берег',
-                'опушка', 'поляна', 'парк', 'лужайка', 'лесополоса'
-            ]
-            options['basic_habitats'] = basic_habitats
-            
-            # Получаем все места нахождения
-            cursor.execute(f"""
-                SELECT DISTINCT habitat
-                FROM {table_name}
-                WHERE habitat IS NOT NULL AND habitat != ''
-                ORDER BY habitat
-            """)
-            all_habitats = [row['habitat'] for row in cursor.fetchall()]
-            options['habitats'] = all_habitats
-            options['all_habitats'] = all_habitats
-            
-            # Базовые периоды лёта
-            basic_seasons = [
-                'весна', 'лето', 'осень',
-                'май', 'июнь', 'июль', 'август', 'сентябрь'
-            ]
-            options['basic_seasons'] = basic_seasons
-            
-            # Получаем все периоды лёта
-            cursor.execute(f"""
-                SELECT DISTINCT season
-                FROM {table_name}
-                WHERE season IS NOT NULL AND season != ''
-                ORDER BY season
-            """)
-            all_seasons = [row['season'] for row in cursor.fetchall()]
-            options['seasons'] = all_seasons
-            options['all_seasons'] = all_seasons
-        
-        cursor.close()
-        conn.close()
         return options
 
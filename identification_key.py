@@ -0,0 +1,270 @@
+"""
+Интерактивный определительный ключ
+
+По каталогу одного типа заранее строится дихотомическое дерево вопросов
+вида «Цвет глаз: зеленые?» или «Размер тела больше 40 мм?» (у бабочек -
+размах крыльев). Вопрос в каждом узле выбирается по приросту информации -
+он лучше всего делит оставшиеся виды пополам. Виды, у которых признак не
+указан (или размер попадает на порог), остаются в обеих ветвях. На вопрос
+можно ответить «не знаю» - тогда задаётся следующий по качеству вопрос.
+
+Дерево хранится плоским списком узлов, поэтому шаг определения - это
+обращение к списку по номеру узла. При изменении каталога поддеревья, виды
+которых не изменились, берутся из предыдущего дерева без пересчёта.
+"""
+import math
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from attributes import terms
+
+# Что хранится в size_min/size_max каждого типа: у бабочек это размах крыльев
+SIZE_LABELS = {
+    'dragonfly': 'Размер тела',
+    'beetle': 'Размер тела',
+    'butterfly': 'Размах крыльев',
+}
+
+# Подписи признаков в вопросах (размер - см. SIZE_LABELS)
+FEATURE_LABELS = {
+    'color': 'Окраска',
+    'color_type': 'Тип окраски',
+    'eye_color': 'Цвет глаз',
+    'environment': 'Среда',
+    'gender': 'Пол',
+    'suborder': 'Подотряд',
+    'surface_type': 'Поверхность',
+    'elytra': 'Надкрылья',
+    'biotope': 'Биотоп',
+    'wing_pattern': 'Рисунок крыльев',
+    'time_of_day': 'Время активности',
+    'food_plant': 'Кормовое растение',
+}
+
+# Признаки ключа для каждого типа (кроме размера, он есть у всех)
+KEY_FEATURES = {
+    'dragonfly': ('color', 'color_type', 'eye_color', 'environment', 'gender', 'suborder'),
+    'beetle': ('color', 'surface_type', 'elytra', 'eye_color', 'biotope'),
+    'butterfly': ('color', 'wing_pattern', 'time_of_day', 'biotope', 'food_plant'),
+}
+
+# Слова, которые встречаются в значениях, но сами по себе признаком не являются
+FILLER_WORDS = frozenset({
+    'более', 'менее', 'очень', 'часто', 'иногда', 'обычно', 'реже', 'чем', 'без', 'из', 'под',
+    'по', 'как', 'не', 'же', 'у', 'самца', 'самки', 'самцов', 'самок',
+})
+
+# Сколько вопросов подряд можно пропустить ответом «не знаю»
+MAX_SKIPS = 3
+
+# Вопрос: (признак, термин) или ('size', порог в мм)
+Question = Tuple[str, object]
+
+
+class _Species(NamedTuple):
+    id: int
+    size: Tuple[Optional[float], Optional[float]]
+    present: FrozenSet[str]             # признаки, указанные у вида
+    terms: FrozenSet[Tuple[str, str]]   # пары (признак, термин)
+
+
+class _Node(NamedTuple):
+    question: Optional[Question]
+    candidates: Tuple[int, ...]
+    yes: Optional['_Node']
+    no: Optional['_Node']
+    skip: Optional['_Node']
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def species_from_row(row: Dict, insect_type: str) -> _Species:
+    """Признаки вида для ключа: термины значений и интервал размера"""
+    attributes = row.get('attributes') or {}
+    present = set()
+    feature_terms = set()
+    for feature in KEY_FEATURES.get(insect_type, ()):
+        values = terms(row.get(feature)) if feature == 'color' else attributes.get(feature, [])
+        if values:
+            present.add(feature)
+            # Полное значение обычно уникально для вида и для вопроса не годится
+            feature_terms.update(
+                (feature, value) for value in (values[1:] if len(values) > 1 else values)
+                if value not in FILLER_WORDS
+            )
+    size = (_to_float(row.get('size_min')), _to_float(row.get('size_max')))
+    return _Species(row['id'], size, frozenset(present), frozenset(feature_terms))
+
+
+def _answer(species: _Species, question: Question) -> Optional[bool]:
+    """Ответ вида на вопрос: True, False или None (неизвестно)"""
+    feature, value = question
+    if feature == 'size':
+        low, high = species.size
+        low = high if low is None else low
+        high = low if high is None else high
+        if low is None:
+            return None
+        if low > value:
+            return True
+        if high <= value:
+            return False
+        return None
+    if feature not in species.present:
+        return None
+    return question in species.terms
+
+
+class IdentificationKey:
+    """Дерево определительного ключа для одного типа насекомых"""
+
+    def __init__(self, insect_type: str, rows: List[Dict], previous: Optional['IdentificationKey'] = None):
+        """
+        Args:
+            insect_type: 'dragonfly', 'beetle' или 'butterfly'
+            rows: строки каталога (нужны id, size_min/size_max, color, attributes)
+            previous: ключ по прошлой версии каталога - его поддеревья переиспользуются
+        """
+        self.insect_type = insect_type
+        self.rows = {row['id']: row for row in rows}
+        self._species = {row['id']: species_from_row(row, insect_type) for row in rows}
+        self._memo: Dict[tuple, _Node] = {}
+        self._previous_memo = previous._memo if previous else {}
+        self.reused = 0
+
+        root = self._build(tuple(sorted(self._species)), frozenset())
+        self._previous_memo = {}
+        self.nodes: List[Dict] = []
+        self._flatten(root, {})
+
+    def _memo_key(self, candidates: Tuple[int, ...], banned: FrozenSet[Question]) -> tuple:
+        # Поддерево зависит только от признаков своих видов
+        return tuple(self._species[i] for i in candidates), banned
+
+    def _build(self, candidates: Tuple[int, ...], banned: FrozenSet[Question]) -> _Node:
+        key = self._memo_key(candidates, banned)
+        node = self._memo.get(key)
+        if node is not None:
+            return node
+        node = self._previous_memo.get(key)
+        if node is not None:
+            self.reused += 1
+            self._keep(node, key)
+            return node
+
+        question = self._best_question(candidates, banned) if len(candidates) > 1 else None
+        if question is None:
+            node = _Node(None, candidates, None, None, None)
+        else:
+            answers = [(i, _answer(self._species[i], question)) for i in candidates]
+            yes = tuple(i for i, answer in answers if answer is not False)
+            no = tuple(i for i, answer in answers if answer is not True)
+            skip = None
+            if len(banned) < MAX_SKIPS:
+                skip = self._build(candidates, banned | {question})
+                if skip.question is None:
+                    skip = None
+            node = _Node(question, candidates, self._build(yes, banned), self._build(no, banned), skip)
+        self._memo[key] = node
+        return node
+
+    def _keep(self, node: _Node, key: tuple):
+        """Перенести переиспользованное поддерево в memo нового дерева"""
+        self._memo[key] = node
+        banned = key[1]
+        if node.question is None:
+            return
+        for child, child_banned in ((node.yes, banned), (node.no, banned), (node.skip, banned | {node.question})):
+            if child is not None:
+                self._keep(child, self._memo_key(child.candidates, child_banned))
+
+    def _questions(self, candidates: Tuple[int, ...]) -> List[Question]:
+        """Все вопросы, которые могут что-то различить среди candidates"""
+        questions = set()
+        sizes = set()
+        for i in candidates:
+            species = self._species[i]
+            questions.update(species.terms)
+            for value in species.size:
+                if value is not None:
+                    sizes.add(value)
+        # Пороги размера - середины между соседними значениями
+        ordered = sorted(sizes)
+        for low, high in zip(ordered, ordered[1:]):
+            questions.add(('size', round((low + high) / 2, 1)))
+        return sorted(questions, key=lambda q: (q[0], str(q[1])))
+
+    def _best_question(self, candidates: Tuple[int, ...], banned: FrozenSet[Question]) -> Optional[Question]:
+        """Вопрос с наибольшим приростом информации (при равенстве - с меньшим числом неизвестных)"""
+        total = len(candidates)
+        best, best_rank = None, None
+        for question in self._questions(candidates):
+            if question in banned:
+                continue
+            yes = no = unknown = 0
+            for i in candidates:
+                answer = _answer(self._species[i], question)
+                if answer is None:
+                    unknown += 1
+                elif answer:
+                    yes += 1
+                else:
+                    no += 1
+            if not yes or not no:
+                continue
+            # Ожидаемая энтропия после ответа: неизвестные виды остаются в обеих ветвях
+            expected = ((yes + unknown / 2) * math.log2(yes + unknown)
+                        + (no + unknown / 2) * math.log2(no + unknown)) / total
+            gain = math.log2(total) - expected
+            rank = (round(gain, 9), -unknown)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = question, rank
+        return best
+
+    def _flatten(self, node: _Node, numbers: Dict[int, int]) -> int:
+        """Записать узел и потомков в self.nodes; одинаковые поддеревья записываются один раз"""
+        number = numbers.get(id(node))
+        if number is not None:
+            return number
+        number = len(self.nodes)
+        numbers[id(node)] = number
+        entry = {'question': node.question, 'candidates': node.candidates}
+        self.nodes.append(entry)
+        if node.question is not None:
+            entry['yes'] = self._flatten(node.yes, numbers)
+            entry['no'] = self._flatten(node.no, numbers)
+            entry['skip'] = self._flatten(node.skip, numbers) if node.skip is not None else None
+        return number
+
+    def step(self, node_number: int = 0) -> Dict:
+        """
+        Состояние определения в узле node_number
+
+        Returns:
+            {'node', 'question': {...} или None, 'answers': {'yes', 'no', 'skip'},
+             'candidates': [id, ...]}
+        """
+        if not 0 <= node_number < len(self.nodes):
+            raise ValueError(f"Неверный узел ключа: {node_number}")
+        entry = self.nodes[node_number]
+        question = None
+        answers = None
+        if entry['question'] is not None:
+            feature, value = entry['question']
+            if feature == 'size':
+                label = SIZE_LABELS.get(self.insect_type, 'Размер')
+            else:
+                label = FEATURE_LABELS.get(feature, feature)
+            text = f"{label} больше {value:g} мм?" if feature == 'size' else f"{label}: {value}?"
+            question = {'feature': feature, 'value': value, 'text': text}
+            answers = {'yes': entry['yes'], 'no': entry['no'], 'skip': entry['skip']}
+        return {
+            'node': node_number,
+            'question': question,
+            'answers': answers,
+            'candidates': list(entry['candidates']),
+        }
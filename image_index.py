@@ -0,0 +1,187 @@
+"""
+Индекс изображений насекомых из папки data
+
+Вместо перебора файлов папки на каждую строку результата индекс один раз
+строит обратный словарь «слово названия -> файлы» с заранее вычисленными
+признаками пола, поэтому поиск изображения сводится к нескольким обращениям
+к словарю. Индекс папки перестраивается при изменении её mtime.
+"""
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Папки с изображениями для каждого типа насекомых
+FOLDER_MAP = {
+    'dragonfly': 'Стрекозы',
+    'beetle': 'жужелицы',  # Если есть папка для жуков
+    'butterfly': 'бабочки'
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.JPG', '.webp')
+
+
+def _name_words(text: str) -> frozenset:
+    """Слова названия насекомого в том виде, в каком они сравниваются с файлами"""
+    return frozenset(text.lower().strip().replace('-', ' ').replace('_', ' ').split())
+
+
+def detect_gender(description: str) -> str:
+    """Определить пол ('самец', 'самка' или '') по описанию"""
+    if not description:
+        return ''
+    description_lower = description.lower()
+    if 'самец' in description_lower:
+        return 'самец'
+    if 'самка' in description_lower:
+        return 'самка'
+    return ''
+
+
+class _ImageFile(NamedTuple):
+    url: str
+    has_male: bool      # 'самец' встречается в имени файла
+    has_female: bool    # 'самка' встречается в имени файла
+    gender_marked: bool  # имя файла содержит '(самец)' или '(самка)'
+
+
+class _FolderIndex(NamedTuple):
+    mtime: Optional[float]
+    files: Tuple[_ImageFile, ...]
+    tokens: Dict[str, Tuple[int, ...]]
+    # Кэш уже выполненных поисков: (слова названия, пол) -> URL
+    lookups: Dict[Tuple[frozenset, str], str]
+
+
+class ImageIndex:
+    """Потокобезопасный индекс изображений по папкам data/<папка>"""
+
+    def __init__(self, base_dir: Path, check_interval: float = 2.0):
+        """
+        Args:
+            base_dir: папка data с подпапками изображений
+            check_interval: как часто (сек) сверять mtime папки
+        """
+        self.base_dir = Path(base_dir)
+        self.check_interval = check_interval
+        self._folders: Dict[str, _FolderIndex] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def build(self):
+        """Построить индекс для всех известных папок (вызывается при старте)"""
+        for folder_name in FOLDER_MAP.values():
+            self._folder(folder_name, force=True)
+
+    def find(self, insect_name: str, insect_type: str, description: str = '') -> str:
+        """
+        Находит изображение насекомого по его названию и типу
+
+        Returns:
+            URL изображения или пустая строка
+        """
+        if not insect_name:
+            return ''
+        folder_name = FOLDER_MAP.get(insect_type)
+        if not folder_name:
+            return ''
+        return self._lookup(self._folder(folder_name), insect_name, description)
+
+    def find_many(self, items: Iterable[Tuple[str, str]], insect_type: str) -> List[str]:
+        """
+        Найти изображения для пачки насекомых одного типа
+
+        Args:
+            items: пары (русское название, описание)
+            insect_type: 'dragonfly', 'beetle' или 'butterfly'
+
+        Returns:
+            Список URL (или пустых строк) в порядке items
+        """
+        items = list(items)
+        folder_name = FOLDER_MAP.get(insect_type)
+        if not folder_name:
+            return ['' for _ in items]
+        # Актуальность папки проверяем один раз на всю пачку
+        index = self._folder(folder_name)
+        return [
+            self._lookup(index, name, description) if name else ''
+            for name, description in items
+        ]
+
+    def _lookup(self, index: _FolderIndex, insect_name: str, description: str) -> str:
+        words = _name_words(insect_name)
+        gender = detect_gender(description or '')
+        key = (words, gender)
+        cached = index.lookups.get(key)
+        if cached is not None:
+            return cached
+
+        # Число общих слов названия и имени файла
+        common: Dict[int, int] = {}
+        for word in words:
+            for file_id in index.tokens.get(word, ()):
+                common[file_id] = common.get(file_id, 0) + 1
+
+        best_id = None
+        best_priority = None
+        for file_id in sorted(common):
+            # Приоритет: точное совпадение > частичное совпадение
+            priority = common[file_id]
+            if gender:
+                image = index.files[file_id]
+                if image.has_male if gender == 'самец' else image.has_female:
+                    priority += 10  # Большой бонус за совпадение пола
+                elif image.gender_marked:
+                    priority -= 5  # Штраф, если пол не совпадает
+            if best_priority is None or priority > best_priority:
+                best_id, best_priority = file_id, priority
+
+        url = index.files[best_id].url if best_id is not None else ''
+        index.lookups[key] = url
+        return url
+
+    def _folder(self, folder_name: str, force: bool = False) -> _FolderIndex:
+        now = time.monotonic()
+        index = self._folders.get(folder_name)
+        if index is not None and not force and now - self._checked_at.get(folder_name, 0) < self.check_interval:
+            return index
+
+        image_dir = self.base_dir / folder_name
+        try:
+            mtime = image_dir.stat().st_mtime
+        except OSError:
+            mtime = None
+
+        with self._lock:
+            index = self._folders.get(folder_name)
+            if force or index is None or index.mtime != mtime:
+                index = self._scan(image_dir, mtime)
+                self._folders[folder_name] = index
+            self._checked_at[folder_name] = now
+        return index
+
+    def _scan(self, image_dir: Path, mtime: Optional[float]) -> _FolderIndex:
+        if mtime is None:
+            return _FolderIndex(None, (), {}, {})
+
+        paths = []
+        for extension in IMAGE_EXTENSIONS:
+            paths.extend(sorted(p for p in image_dir.iterdir() if p.suffix == extension and p.is_file()))
+
+        files = []
+        tokens: Dict[str, List[int]] = {}
+        for file_id, path in enumerate(paths):
+            filename_lower = path.stem.lower()
+            files.append(_ImageFile(
+                url=f'/data/{path.relative_to(self.base_dir).as_posix()}',
+                has_male='самец' in filename_lower,
+                has_female='самка' in filename_lower,
+                gender_marked='(самец)' in filename_lower or '(самка)' in filename_lower
+            ))
+            # Пометка пола в скобках - отдельное слово, а не часть видового названия
+            filename_clean = filename_lower.replace('(', ' ').replace(')', ' ')
+            for word in _name_words(filename_clean):
+                tokens.setdefault(word, []).append(file_id)
+
+        return _FolderIndex(mtime, tuple(files), {k: tuple(v) for k, v in tokens.items()}, {})
@@ -0,0 +1,272 @@
+"""
+Уменьшенные копии и WebP/AVIF-варианты изображений из папки data
+
+Оригиналы в data/Стрекозы и data/бабочки - полноразмерные JPEG, а сетке
+результатов поиска хватает миниатюры. Маршрут /data/<файл> с параметрами
+?w=320&fmt=webp отдаёт вариант изображения: ширина округляется вверх до
+ближайшей из IMAGE_CONFIG['widths'], формат задаётся явно (webp, avif, jpeg)
+или выбирается по заголовку Accept (fmt=auto или только w).
+
+Варианты хранятся в кэше на диске с адресацией по содержимому: имя файла -
+хеш содержимого оригинала и параметров варианта. Изменённый оригинал
+получает новые варианты, а старые удаляет
+scripts/build_image_variants.py --prune. Этот же скрипт строит все варианты
+заранее; недостающие строятся при первом запросе (IMAGE_CONFIG['on_demand']).
+
+Обработка изображений - через Pillow. Если Pillow не установлен или не
+поддерживает формат, отдаётся оригинал.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, FrozenSet, NamedTuple, Optional, Set, Tuple
+
+from config import IMAGE_CONFIG
+
+# Версия обработки: входит в ключ кэша, поэтому после её изменения старые варианты не отдаются
+PIPELINE_VERSION = 1
+
+# Форматы вариантов: имя -> (формат Pillow, MIME-тип, расширение файла в кэше)
+FORMATS = {
+    'avif': ('AVIF', 'image/avif', '.avif'),
+    'webp': ('WEBP', 'image/webp', '.webp'),
+    'jpeg': ('JPEG', 'image/jpeg', '.jpg'),
+}
+
+# Форматы, которые выбираются по Accept, в порядке предпочтения (меньше байт - раньше)
+NEGOTIATED_FORMATS = ('avif', 'webp')
+
+# Файлы data, для которых строятся варианты
+SOURCE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.webp')
+
+_supported_formats: Optional[FrozenSet[str]] = None
+
+
+class SourceImageError(Exception):
+    """Оригинал не читается как изображение (повреждён или не того формата)"""
+
+
+class Variant(NamedTuple):
+    width: Optional[int]  # None - исходная ширина
+    fmt: str              # ключ FORMATS
+    negotiated: bool      # формат выбран по Accept: ответу нужен Vary: Accept
+
+
+def supported_formats() -> FrozenSet[str]:
+    """Форматы, которые умеет записывать установленный Pillow (пусто - Pillow нет)"""
+    global _supported_formats
+    if _supported_formats is None:
+        try:
+            from PIL import features
+        except ImportError:
+            _supported_formats = frozenset()
+            return _supported_formats
+        formats = {'jpeg'}
+        for name in ('webp', 'avif'):
+            try:
+                if features.check(name):
+                    formats.add(name)
+            except ValueError:
+                # Pillow старше 11.2 не знает про AVIF
+                pass
+        _supported_formats = frozenset(formats)
+    return _supported_formats
+
+
+def snap_width(width: int) -> int:
+    """Округлить ширину вверх до ближайшей допустимой (больше наибольшей - наибольшая)"""
+    widths = sorted(IMAGE_CONFIG['widths'])
+    for allowed in widths:
+        if allowed >= width:
+            return allowed
+    return widths[-1]
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    """Самый компактный формат из тех, что браузер явно перечислил в Accept"""
+    accepted = set()
+    for part in (accept or '').split(','):
+        media_type, _, params = part.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(media_type.strip().lower())
+    for fmt in NEGOTIATED_FORMATS:
+        if FORMATS[fmt][1] in accepted and fmt in supported_formats():
+            return fmt
+    return 'jpeg'
+
+
+def parse_variant(args, accept: Optional[str] = None) -> Optional[Variant]:
+    """
+    Вариант изображения из параметров запроса
+
+    Args:
+        args: query string (w - ширина, fmt - webp/avif/jpeg/auto)
+        accept: заголовок Accept, по нему выбирается формат при fmt=auto или без fmt
+
+    Returns:
+        Variant или None, если нужен оригинал
+    """
+    width_arg = args.get('w')
+    fmt_arg = args.get('fmt')
+    if not width_arg and not fmt_arg:
+        return None
+
+    width = None
+    if width_arg:
+        try:
+            width = int(width_arg)
+        except ValueError:
+            raise ValueError('w должен быть целым числом')
+        if width < 1:
+            raise ValueError('w должен быть положительным')
+        width = snap_width(width)
+
+    fmt = (fmt_arg or 'auto').lower()
+    if fmt == 'auto':
+        return Variant(width, negotiate_format(accept), True)
+    if fmt not in FORMATS:
+        raise ValueError(f"Неподдерживаемый формат: {fmt} (допустимы {', '.join(FORMATS)}, auto)")
+    return Variant(width, fmt, False)
+
+
+def mimetype(variant: Variant) -> str:
+    return FORMATS[variant.fmt][1]
+
+
+def quality(fmt: str) -> int:
+    """Качество сжатия формата (см. IMAGE_CONFIG)"""
+    return IMAGE_CONFIG['avif_quality'] if fmt == 'avif' else IMAGE_CONFIG['quality']
+
+
+class ImageVariants:
+    """Кэш вариантов изображений на диске с адресацией по содержимому"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = Path(cache_dir or IMAGE_CONFIG['cache_dir'])
+        # Хеши оригиналов: путь -> ((mtime_ns, размер), sha256 содержимого)
+        self._digests: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        # Один вариант строится одним потоком; блокировки распределены по ключам
+        self._locks = [threading.Lock() for _ in range(16)]
+        # Хеши оригиналов, которые Pillow не смог прочитать: не пытаемся снова при каждом запросе
+        self._broken: Set[str] = set()
+
+    def source_digest(self, source: Path) -> str:
+        """Хеш содержимого оригинала; пересчитывается только при изменении файла"""
+        stat = source.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._digests.get(str(source))
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        value = digest.hexdigest()
+        self._digests[str(source)] = (signature, value)
+        return value
+
+    def cache_path(self, source: Path, variant: Variant) -> Path:
+        """Файл варианта в кэше: хеш оригинала, ширины, формата, качества и версии обработки"""
+        key = hashlib.sha256(
+            f"{self.source_digest(source)}:{variant.width}:{variant.fmt}:"
+            f"{quality(variant.fmt)}:{PIPELINE_VERSION}".encode('utf-8')
+        ).hexdigest()
+        return self.cache_dir / key[:2] / (key[2:] + FORMATS[variant.fmt][2])
+
+    def get(self, source: Path, variant: Variant, build: bool = True) -> Optional[Path]:
+        """
+        Путь к варианту изображения
+
+        Args:
+            source: оригинал в папке data
+            variant: ширина и формат
+            build: построить вариант, если его нет в кэше
+
+        Returns:
+            Путь к файлу в кэше или None - отдать оригинал (варианта нет,
+            а строить нельзя, формат не поддерживается или оригинал не
+            читается как изображение)
+        """
+        if variant.fmt not in supported_formats():
+            return None
+        target = self.cache_path(source, variant)
+        if target.exists():
+            return target
+        digest = self.source_digest(source)
+        if not build or digest in self._broken:
+            return None
+
+        with self._locks[hash(target) % len(self._locks)]:
+            # Пока ждали блокировку, вариант мог построить другой поток
+            if not target.exists():
+                try:
+                    self.render(source, target, variant)
+                except SourceImageError as e:
+                    print(f"⚠️ Вариант {source.name} не построен, отдаётся оригинал: {e}")
+                    self._broken.add(digest)
+                    return None
+        return target
+
+    @staticmethod
+    def etag(path: Path) -> str:
+        """ETag варианта - ключ кэша из имени файла (меняется вместе с оригиналом и параметрами)"""
+        return path.parent.name + path.stem
+
+    @staticmethod
+    def render(source: Path, target: Path, variant: Variant):
+        """Уменьшить изображение (не увеличивая) и записать в нужном формате"""
+        from PIL import Image, ImageOps
+
+        decode_errors = (OSError, SyntaxError, ValueError, Image.DecompressionBombError)
+        try:
+            original = Image.open(source)
+        except decode_errors as e:
+            raise SourceImageError(str(e)) from e
+
+        with original:
+            try:
+                # Декодируем сразу: ошибки повреждённого файла возникают здесь, а не при resize
+                original.load()
+                image = ImageOps.exif_transpose(original)
+            except decode_errors as e:
+                raise SourceImageError(str(e)) from e
+            if variant.width and image.width > variant.width:
+                height = max(1, round(image.height * variant.width / image.width))
+                image = image.resize((variant.width, height), Image.LANCZOS)
+
+            pil_format = FORMATS[variant.fmt][0]
+            if pil_format == 'JPEG' and image.mode != 'RGB':
+                image = image.convert('RGB')
+            elif image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+            # Запись во временный файл и переименование: читатели не увидят недописанный файл
+            target.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=target.parent, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    options = {'quality': quality(variant.fmt)}
+                    if pil_format == 'JPEG':
+                        options.update(optimize=True, progressive=True)
+                    elif pil_format == 'WEBP':
+                        # Медленнее, но меньше: вариант строится один раз
+                        options['method'] = 6
+                    image.save(f, pil_format, **options)
+                os.replace(tmp_name, target)
+            except BaseException:
+                try:
+                    os.unlink(tmp_name)
+                except OSError:
+                    pass
+                raise
@@ -0,0 +1,227 @@
+"""
+Метрики и профилирование запросов
+
+Для каждого HTTP-запроса ведётся профиль: время этапов обработки
+(подключение к базе, выполнение SQL, чтение строк, поиск изображений,
+сериализация JSON) и список выполненных SQL-запросов с длительностью и
+числом строк. Профиль отдаётся клиенту в заголовке Server-Timing.
+
+Те же измерения накапливаются в гистограммах процесса, которые эндпоинт
+/metrics отдаёт в текстовом формате Prometheus:
+- http_request_duration_seconds{method, route, status}
+- http_stage_duration_seconds{route, stage}
+- db_query_duration_seconds{query_id, query}
+- db_query_rows{query_id, query}
+
+Текущий профиль хранится в contextvars, поэтому учёт работает и в потоках
+Flask, и в асинхронных обработчиках ASGI-режима.
+"""
+import hashlib
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from config import METRICS_CONFIG
+
+# Границы корзин гистограмм времени (сек) и числа строк
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+# Длина текста запроса в метке query
+QUERY_LABEL_LENGTH = 160
+
+
+class Histogram:
+    """Потокобезопасная гистограмма Prometheus с набором меток"""
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> (счётчики по корзинам, сумма, количество)
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count))
+                            for labels, (counts, total, count) in self._series.items())
+        for labels, (counts, total, count) in series:
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Время обработки HTTP-запроса',
+                             ('method', 'route', 'status'))
+STAGE_DURATION = Histogram('http_stage_duration_seconds', 'Время этапа обработки HTTP-запроса',
+                           ('route', 'stage'))
+QUERY_DURATION = Histogram('db_query_duration_seconds', 'Время выполнения SQL-запроса',
+                           ('query_id', 'query'))
+QUERY_ROWS = Histogram('db_query_rows', 'Число строк, возвращённых или изменённых SQL-запросом',
+                       ('query_id', 'query'), ROWS_BUCKETS)
+
+HISTOGRAMS = (REQUEST_DURATION, STAGE_DURATION, QUERY_DURATION, QUERY_ROWS)
+
+
+class QueryRecord(NamedTuple):
+    query: str
+    duration: float
+    rows: int
+
+
+class RequestProfile:
+    """Профиль одного HTTP-запроса"""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.queries: List[QueryRecord] = []
+
+    def add_stage(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+_current_profile: ContextVar[Optional[RequestProfile]] = ContextVar('request_profile', default=None)
+
+# Нормализованный текст запроса -> (query_id, метка query)
+_query_labels: Dict[str, Tuple[str, str]] = {}
+_query_labels_lock = threading.Lock()
+
+
+def begin_request(route: str) -> Optional[RequestProfile]:
+    """Начать профиль HTTP-запроса (route - шаблон маршрута, а не конкретный URL)"""
+    if not METRICS_CONFIG['enabled']:
+        return None
+    profile = RequestProfile(route)
+    _current_profile.set(profile)
+    return profile
+
+
+def end_request(profile: Optional[RequestProfile], method: str, status: int) -> Optional[float]:
+    """Завершить профиль и учесть его в гистограммах; возвращает длительность запроса"""
+    if profile is None:
+        return None
+    _current_profile.set(None)
+    elapsed = profile.elapsed()
+    REQUEST_DURATION.observe((method, profile.route, str(status)), elapsed)
+    for name, seconds in profile.stages.items():
+        STAGE_DURATION.observe((profile.route, name), seconds)
+    return elapsed
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+def add_stage(name: str, seconds: float):
+    """Добавить время к этапу текущего запроса"""
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.add_stage(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Засечь время блока как этап name текущего запроса"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_stage(name, time.perf_counter() - started)
+
+
+def query_labels(query) -> Tuple[str, str]:
+    """
+    Метки SQL-запроса: короткий хеш нормализованного текста и начало текста
+
+    Различных запросов учитывается не больше METRICS_CONFIG['max_query_series'],
+    остальные попадают в общую серию 'other'.
+    """
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    text = re.sub(r'\s+', ' ', str(query)).strip()
+    labels = _query_labels.get(text)
+    if labels is not None:
+        return labels
+    with _query_labels_lock:
+        labels = _query_labels.get(text)
+        if labels is None:
+            if len(_query_labels) >= METRICS_CONFIG['max_query_series']:
+                return 'other', 'other'
+            query_id = hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+            labels = _query_labels[text] = (query_id, text[:QUERY_LABEL_LENGTH])
+        return labels
+
+
+def record_query(query, seconds: float, rows: int):
+    """Учесть выполненный SQL-запрос (rows < 0 - число строк неизвестно)"""
+    if not METRICS_CONFIG['enabled']:
+        return
+    labels = query_labels(query)
+    QUERY_DURATION.observe(labels, seconds)
+    if rows >= 0:
+        QUERY_ROWS.observe(labels, rows)
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.add_stage('db', seconds)
+        profile.queries.append(QueryRecord(labels[1], seconds, rows))
+
+
+def server_timing(profile: Optional[RequestProfile]) -> Optional[str]:
+    """Значение заголовка Server-Timing: этапы запроса и общее время (мс)"""
+    if profile is None or not METRICS_CONFIG['server_timing']:
+        return None
+    parts = []
+    for name, seconds in profile.stages.items():
+        entry = f"{name};dur={seconds * 1000:.2f}"
+        if name == 'db':
+            entry += f';desc="{len(profile.queries)} queries"'
+        parts.append(entry)
+    parts.append(f"total;dur={profile.elapsed() * 1000:.2f}")
+    return ', '.join(parts)
+
+
+def render() -> str:
+    """Все метрики процесса в текстовом формате Prometheus"""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return '\n'.join(lines) + '\n'
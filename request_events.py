@@ -0,0 +1,217 @@
+"""
+Лента изменений запросов к эксперту
+
+Триггер из sql/add_expert_request_changes.sql после каждой вставки или
+изменения запроса отправляет NOTIFY expert_requests с id запроса, id
+пользователя, статусом и версией. Процесс держит одно отдельное подключение
+с LISTEN (поток-слушатель) и раздаёт уведомления подписчикам - открытым
+вкладкам администратора и «Моих запросов», подключённым к
+/api/expert-requests/events (Server-Sent Events). Вкладка по событию дочитывает
+только изменившиеся запросы через ?since=<версия>, вместо того чтобы каждые
+30 секунд перечитывать весь список.
+
+Слушатель запускается с первым подписчиком и останавливается, когда
+подписчиков не остаётся. После переподключения к базе подписчики получают
+событие resync: уведомления за время разрыва могли быть потеряны.
+"""
+import itertools
+import json
+import queue
+import select
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Set
+
+from psycopg2 import sql
+
+from config import EVENTS_CONFIG
+
+# Событие после переподключения слушателя: клиенту нужно дочитать изменения по версии
+RESYNC = {'type': 'resync'}
+
+# Комментарий SSE, который браузер игнорирует, а прокси видят как активность
+HEARTBEAT = ': ping\n\n'
+
+
+class TooManySubscribers(Exception):
+    """Достигнут предел одновременно открытых потоков событий"""
+
+
+def format_event(event: Dict) -> str:
+    """Событие в формате text/event-stream"""
+    return f"event: {event.get('type', 'change')}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def retry_hint() -> str:
+    """Через сколько миллисекунд браузеру переподключаться после обрыва потока"""
+    return f"retry: {int(EVENTS_CONFIG['reconnect_delay'] * 1000)}\n\n"
+
+
+class RequestEvents:
+    """Один слушатель LISTEN на процесс и рассылка уведомлений подписчикам"""
+
+    def __init__(self, connect: Callable, channel: Optional[str] = None):
+        """
+        Args:
+            connect: функция, возвращающая новое подключение psycopg2 (не из пула:
+                     слушатель держит его, пока есть подписчики)
+            channel: канал NOTIFY, по умолчанию EVENTS_CONFIG['channel']
+        """
+        self.connect = connect
+        self.channel = channel or EVENTS_CONFIG['channel']
+        # token -> (функция доставки, id пользователя или None для всех запросов)
+        self._subscribers: Dict[int, tuple] = {}
+        # Подписки синхронных потоков (stream): каждая занимает поток сервера Flask
+        self._blocking: Set[int] = set()
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, deliver: Callable[[Dict], None], user_id: Optional[int] = None,
+                  blocking: bool = False) -> int:
+        """
+        Подписаться на изменения запросов
+
+        Args:
+            deliver: вызывается из потока-слушателя для каждого события; не должна блокироваться
+            user_id: получать только запросы этого пользователя (None - все, для администратора)
+            blocking: подписка держит поток сервера (stream для Flask) - действует
+                      отдельный, меньший предел EVENTS_CONFIG['max_blocking_subscribers']
+
+        Returns:
+            token для unsubscribe()
+        """
+        with self._lock:
+            limit = EVENTS_CONFIG['max_subscribers']
+            if limit and len(self._subscribers) >= limit:
+                raise TooManySubscribers('Слишком много открытых потоков событий')
+            blocking_limit = EVENTS_CONFIG['max_blocking_subscribers']
+            if blocking and blocking_limit and len(self._blocking) >= blocking_limit:
+                raise TooManySubscribers('Слишком много открытых потоков событий')
+            token = next(self._tokens)
+            self._subscribers[token] = (deliver, user_id)
+            if blocking:
+                self._blocking.add(token)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._listen, name='request-events', daemon=True)
+                self._thread.start()
+        return token
+
+    def unsubscribe(self, token: int):
+        with self._lock:
+            self._subscribers.pop(token, None)
+            self._blocking.discard(token)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event: Dict):
+        """Разослать событие подписчикам, которым оно адресовано"""
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for deliver, user_id in subscribers:
+            if user_id is not None and event.get('type') == 'change' and event.get('user_id') != user_id:
+                continue
+            try:
+                deliver(event)
+            except Exception as e:
+                # Например, цикл событий ASGI уже закрыт - подписчик скоро отпишется сам
+                print(f"⚠️ Не удалось доставить событие подписчику: {e}")
+
+    def stream(self, user_id: Optional[int] = None) -> 'EventStream':
+        """
+        Поток text/event-stream для синхронного обработчика Flask
+
+        Подписка оформляется сразу (TooManySubscribers - до начала ответа), отписка -
+        когда WSGI-сервер закрывает ответ после отключения клиента. Поток занимает
+        поток сервера, пока открыт, поэтому таких потоков не больше
+        EVENTS_CONFIG['max_blocking_subscribers'].
+        """
+        events: queue.Queue = queue.Queue()
+        token = self.subscribe(events.put, user_id, blocking=True)
+        return EventStream(self, token, events)
+
+    def _parse(self, payload: str) -> Optional[Dict]:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return None
+        if not isinstance(event, dict):
+            return None
+        event['type'] = 'change'
+        return event
+
+    def _idle(self) -> bool:
+        """Подписчиков не осталось - поток-слушатель завершается"""
+        with self._lock:
+            if self._subscribers:
+                return False
+            self._thread = None
+            return True
+
+    def _listen(self):
+        reconnected = False
+        while True:
+            conn = None
+            try:
+                conn = self.connect()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+                if reconnected:
+                    self.publish(dict(RESYNC))
+                while not self._idle():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        event = self._parse(conn.notifies.pop(0).payload)
+                        if event is not None:
+                            self.publish(event)
+                return
+            except Exception as e:
+                print(f"⚠️ Слушатель уведомлений {self.channel} потерял соединение: {e}")
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            reconnected = True
+            if self._wait_reconnect():
+                return
+
+    def _wait_reconnect(self) -> bool:
+        """Пауза перед переподключением; True - подписчиков не осталось, переподключаться незачем"""
+        waited = 0.0
+        delay = EVENTS_CONFIG['reconnect_delay']
+        while waited < delay:
+            if self._idle():
+                return True
+            step = min(1.0, delay - waited)
+            time.sleep(step)
+            waited += step
+        return self._idle()
+
+
+class EventStream:
+    """Итератор строк text/event-stream одного подписчика; close() отписывает его"""
+
+    def __init__(self, events: RequestEvents, token: int, queue_: queue.Queue):
+        self.events = events
+        self.token = token
+        self.queue = queue_
+
+    def __iter__(self) -> Iterator[str]:
+        yield retry_hint()
+        while True:
+            try:
+                event = self.queue.get(timeout=EVENTS_CONFIG['heartbeat'])
+            except queue.Empty:
+                yield HEARTBEAT
+                continue
+            yield format_event(event)
+
+    def close(self):
+        self.events.unsubscribe(self.token)
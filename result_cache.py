@@ -0,0 +1,79 @@
+"""
+Кэш результатов поиска (и других часто читаемых данных)
+
+Ограниченный по размеру LRU-кэш с временем жизни записей. Каждая запись
+хранит версию данных, для которой она посчитана: при чтении запись с другой
+версией считается промахом, поэтому после импорта или add_insect старые
+результаты не возвращаются, даже если TTL ещё не истёк.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class ResultCache:
+    """Потокобезопасный LRU/TTL-кэш со счётчиками попаданий и промахов"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0):
+        """
+        Args:
+            maxsize: сколько записей хранить (0 - кэш выключен)
+            ttl: время жизни записи (сек)
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: Any) -> Optional[Any]:
+        """Значение для key, посчитанное при версии данных version, или None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version or now - entry[1] >= self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: Hashable, version: Any, value: Any):
+        """Сохранить значение, вытеснив самые давно использованные записи"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Удалить запись key, если она есть"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Удалить все записи (счётчики сохраняются)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики кэша для мониторинга"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / requests, 4) if requests else 0.0,
+            }
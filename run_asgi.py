@@ -0,0 +1,26 @@
+"""
+Запуск приложения в ASGI-режиме (asgi_app.py) через uvicorn
+
+    python run_asgi.py
+
+Адрес, порт и число процессов задаются в ASGI_CONFIG (config.py).
+"""
+import uvicorn
+
+from config import ASGI_CONFIG
+
+
+def main():
+    print(f"🚀 ASGI-сервер: http://{ASGI_CONFIG['host']}:{ASGI_CONFIG['port']} "
+          f"(процессов: {ASGI_CONFIG['workers']})")
+    uvicorn.run(
+        'asgi_app:application',
+        host=ASGI_CONFIG['host'],
+        port=ASGI_CONFIG['port'],
+        workers=ASGI_CONFIG['workers'],
+        proxy_headers=True,
+    )
+
+
+if __name__ == '__main__':
+    main()
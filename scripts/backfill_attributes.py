@@ -0,0 +1,60 @@
+"""
+Скрипт для заполнения колонок attributes и wingspan_min/wingspan_max
+у уже импортированных насекомых (после sql/add_structured_attributes.sql)
+
+Использование:
+    python scripts/backfill_attributes.py          # только записи без attributes
+    python scripts/backfill_attributes.py --all    # пересчитать все записи
+"""
+import sys
+import os
+from psycopg2.extras import Json, execute_batch
+
+# Добавляем корневую директорию в путь для импорта
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import Database
+from attributes import attributes_from_description, parse_wingspan
+
+TABLES = ['dragonflies', 'beetles', 'butterflies']
+
+def backfill_table(db: Database, table_name: str, refill_all: bool = False) -> int:
+    """Заполнить атрибуты в одной таблице, вернуть число обновлённых строк"""
+    with db.cursor() as cursor:
+        where = "" if refill_all else " WHERE attributes IS NULL"
+        cursor.execute(f"SELECT id, description FROM {table_name}{where}")
+        rows = cursor.fetchall()
+        
+        updates = []
+        for insect_id, description in rows:
+            wingspan_min, wingspan_max = parse_wingspan(description)
+            updates.append((
+                Json(attributes_from_description(description)),
+                wingspan_min,
+                wingspan_max,
+                insect_id
+            ))
+        
+        execute_batch(cursor, f"""
+            UPDATE {table_name}
+            SET attributes = %s,
+                wingspan_min = COALESCE(%s, wingspan_min),
+                wingspan_max = COALESCE(%s, wingspan_max)
+            WHERE id = %s
+        """, updates)
+    return len(updates)
+
+def main():
+    refill_all = '--all' in sys.argv[1:]
+    db = Database()
+    
+    print("🔄 Заполнение структурированных атрибутов...")
+    for table_name in TABLES:
+        try:
+            updated = backfill_table(db, table_name, refill_all)
+            print(f"  ✅ {table_name}: обновлено {updated} записей")
+        except Exception as e:
+            print(f"  ❌ {table_name}: {e}")
+    print("✅ Готово")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Скрипт для построения уменьшенных копий и WebP/AVIF-вариантов изображений
+из папки data заранее (см. image_variants.py)
+
+Использование:
+    python scripts/build_image_variants.py                    # все ширины и форматы
+    python scripts/build_image_variants.py --widths 320 --formats webp,avif
+    python scripts/build_image_variants.py --prune            # и удалить устаревшие варианты
+"""
+import sys
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+# Добавляем корневую директорию в путь для импорта
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+from config import IMAGE_CONFIG
+from image_index import FOLDER_MAP
+from image_variants import ImageVariants, SOURCE_SUFFIXES, SourceImageError, Variant, supported_formats
+
+IMAGE_BASE_DIR = PROJECT_ROOT / 'data'
+
+def source_images() -> List[Path]:
+    """Оригиналы изображений во всех папках FOLDER_MAP"""
+    paths = []
+    for folder_name in FOLDER_MAP.values():
+        image_dir = IMAGE_BASE_DIR / folder_name
+        if image_dir.is_dir():
+            paths.extend(sorted(p for p in image_dir.iterdir() if p.suffix.lower() in SOURCE_SUFFIXES and p.is_file()))
+    return paths
+
+def build_image(source: str, variants: List[Variant]) -> Tuple[int, List[str]]:
+    """
+    Построить недостающие варианты одного изображения (выполняется в отдельном процессе)
+
+    Returns:
+        (число построенных вариантов, пути всех вариантов в кэше)
+    """
+    cache = ImageVariants()
+    built = 0
+    paths = []
+    for variant in variants:
+        target = cache.cache_path(Path(source), variant)
+        if not target.exists():
+            if cache.get(Path(source), variant) is None:
+                raise SourceImageError('оригинал не читается как изображение')
+            built += 1
+        paths.append(str(target))
+    return built, paths
+
+def prune(cache_dir: Path, keep: set) -> int:
+    """Удалить из кэша варианты, которых нет среди keep (от изменённых или удалённых оригиналов)"""
+    removed = 0
+    if not cache_dir.is_dir():
+        return removed
+    for path in cache_dir.rglob('*'):
+        if path.is_file() and str(path) not in keep:
+            path.unlink()
+            removed += 1
+    return removed
+
+def main():
+    parser = argparse.ArgumentParser(description='Построение вариантов изображений из папки data')
+    parser.add_argument('--widths', help='ширины через запятую (по умолчанию IMAGE_WIDTHS)')
+    parser.add_argument('--formats', default='avif,webp,jpeg', help='форматы через запятую')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='число процессов')
+    parser.add_argument('--prune', action='store_true', help='удалить варианты, которые не построены этим запуском')
+    args = parser.parse_args()
+
+    if not supported_formats():
+        print("❌ Pillow не установлен: pip install -r requirements.txt")
+        sys.exit(1)
+
+    widths = [int(w) for w in args.widths.split(',')] if args.widths else IMAGE_CONFIG['widths']
+    formats = [fmt.strip() for fmt in args.formats.split(',') if fmt.strip()]
+    for fmt in formats:
+        if fmt not in supported_formats():
+            print(f"⚠️  Формат {fmt} не поддерживается установленным Pillow - пропускается")
+    variants = [Variant(width, fmt, False) for width in widths for fmt in formats if fmt in supported_formats()]
+
+    sources = source_images()
+    print(f"🖼️  {len(sources)} изображений × {len(variants)} вариантов -> {IMAGE_CONFIG['cache_dir']}")
+
+    total_built = 0
+    failed = 0
+    keep = set()
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        futures = {executor.submit(build_image, str(source), variants): source for source in sources}
+        for future, source in futures.items():
+            try:
+                built, paths = future.result()
+            except Exception as e:
+                print(f"  ❌ {source.relative_to(IMAGE_BASE_DIR)}: {e}")
+                failed += 1
+                continue
+            total_built += built
+            keep.update(paths)
+    print(f"✅ Построено вариантов: {total_built}, уже были в кэше: {len(keep) - total_built}")
+
+    if args.prune and failed:
+        # Варианты изображений с ошибкой не попали в keep - не удаляем их вслепую
+        print("⚠️  Были ошибки - очистка кэша пропущена")
+    elif args.prune:
+        removed = prune(Path(IMAGE_CONFIG['cache_dir']), keep)
+        print(f"🧹 Удалено устаревших вариантов: {removed}")
+
+if __name__ == '__main__':
+    main()
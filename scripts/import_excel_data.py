@@ -3,13 +3,19 @@
 """
 import sys
 import os
+import io
+import json
+import argparse
+import numpy as np
 import pandas as pd
 import re
-from typing import Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 
 # Добавляем корневую директорию в путь для импорта
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import Database
+from database import Database, CATALOG_TABLE
+from attributes import build_attributes
 
 def parse_size_range(size_str: str) -> tuple[Optional[float], Optional[float]]:
     """Парсит строку размера вида '60–72' или '20-28' в (min, max)"""
@@ -96,6 +102,19 @@ def import_dragonflies(filename: str = None):
             if desc_parts:
                 data['description'] = '; '.join(desc_parts)
             
+            # Структурированные атрибуты для поиска
+            data['wingspan_min'] = wingspan_min
+            data['wingspan_max'] = wingspan_max
+            data['attributes'] = build_attributes({
+                'extra_color': clean_text(row.get('Добавочный цвет')),
+                'color_type': clean_text(row.get('Тип цвета')),
+                'eye_color': clean_text(row.get('Цвет глаз')),
+                'environment': clean_text(row.get('Среда (тип водоёма)')),
+                'gender': clean_text(row.get('Пол')),
+                'family': clean_text(row.get('Семейство')),
+                'suborder': clean_text(row.get('Подотряд')),
+            }, data['description'])
+            
             # Проверяем обязательные поля
             if not data['name_ru']:
                 print(f"  ⚠️  Строка {idx + 2}: пропущена (нет русского названия)")
@@ -175,6 +194,18 @@ def import_beetles(filename: str = None):
             if desc_parts:
                 data['description'] = '; '.join(desc_parts)
             
+            # Структурированные атрибуты для поиска
+            data['attributes'] = build_attributes({
+                'features': clean_text(row.get('Добавочный цвет / Особенности')),
+                'surface_type': clean_text(row.get('Тип поверхности / Блеск')),
+                'elytra': clean_text(row.get('Надкрылья')),
+                'eye_color': clean_text(row.get('Цвет глаз')),
+                'biotope': clean_text(row.get('Среда обитания (биотоп)')),
+                'gender': clean_text(row.get('Пол')),
+                'family': clean_text(row.get('Семейство')),
+                'genus': genus,
+            }, data['description'])
+            
             # Проверяем обязательные поля
             if not data['name_ru']:
                 print(f"  ⚠️  Строка {idx + 2}: пропущена (нет русского названия)")
@@ -259,6 +290,18 @@ def import_butterflies(filename: str = None):
             if desc_parts:
                 data['description'] = '; '.join(desc_parts)
             
+            # Структурированные атрибуты для поиска
+            data['attributes'] = build_attributes({
+                'wing_pattern': clean_text(row.get('Особенности рисунка крыльев')),
+                'body': clean_text(row.get('Цвет тела / Опушение')),
+                'eye_color': clean_text(row.get('Цвет глаз')),
+                'caterpillar': clean_text(row.get('Гусеница (основной цвет)')),
+                'food_plant': clean_text(row.get('Кормовое растение гусениц')),
+                'gender': clean_text(row.get('Пол')),
+                'family': clean_text(row.get('Семейство', '')),
+                'genus': genus,
+            }, data['description'])
+            
             # Проверяем обязательные поля
             if not data['name_ru']:
                 print(f"  ⚠️  Строка {idx + 3}: пропущена (нет русского названия)")
@@ -281,12 +324,310 @@ def import_butterflies(filename: str = None):
         print(f"⚠️  Ошибок: {errors}")
     return imported, errors
 
+# ============================================
+# Пакетный импорт: разбор листа по колонкам и загрузка через COPY
+# ============================================
+
+# Колонки, которые заполняет пакетный импорт
+IMPORT_COLUMNS = [
+    'name_ru', 'name_lat', 'size_min', 'size_max', 'color', 'habitat', 'season',
+    'description', 'wingspan_min', 'wingspan_max', 'sex', 'attributes'
+]
+
+# Ключ, по которому повторный импорт обновляет запись вместо вставки дубликата
+# внутри типа (совпадает с уникальным индексом uq_species из sql/add_species_partitioning.sql)
+UPSERT_KEY = ['name_ru', 'name_lat', 'sex']
+
+def column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Колонка листа или пустая колонка, если её нет в файле"""
+    if name in df.columns:
+        return df[name]
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+def text_column(series: pd.Series) -> pd.Series:
+    """Колонка очищенного текста: clean_text для каждого значения (пустые -> None)"""
+    return pd.Series([clean_text(value) for value in series.tolist()], index=series.index, dtype=object)
+
+def size_columns(series: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """Колонки (min, max) из колонки строк размера: parse_size_range для каждого значения"""
+    # None -> NaN -> <NA> в колонке Float64
+    pairs = np.array([parse_size_range(value) for value in series.tolist()], dtype=float).reshape(-1, 2)
+    return (pd.Series(pairs[:, 0], index=series.index).astype('Float64'),
+            pd.Series(pairs[:, 1], index=series.index).astype('Float64'))
+
+def join_description(parts: List[Tuple[str, pd.Series]]) -> pd.Series:
+    """Склеить поля в описание "Подпись: значение; ..." (как при построчном импорте)"""
+    labeled = pd.concat(
+        [label + ': ' + values.astype('string') for label, values in parts],
+        axis=1, ignore_index=True
+    )
+    return pd.Series(
+        ['; '.join(v for v in row if not pd.isna(v)) or None for row in labeled.itertuples(index=False)],
+        index=labeled.index, dtype=object
+    )
+
+def attributes_column(fields: Dict[str, pd.Series], description: pd.Series) -> pd.Series:
+    """Колонка attributes (JSON) из исходных полей листа"""
+    keys = list(fields)
+    values = [
+        json.dumps(build_attributes(dict(zip(keys, row[:-1])), row[-1]), ensure_ascii=False)
+        for row in zip(*(fields[key] for key in keys), description)
+    ]
+    return pd.Series(values, index=description.index, dtype=object)
+
+def build_dragonfly_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Строки таблицы dragonflies из листа стрекоз"""
+    body_min, body_max = size_columns(column(df, 'Приблизительный размер (длина тела, мм)'))
+    wingspan_min, wingspan_max = size_columns(column(df, 'Приблизительный размер (размах крыльев, мм)'))
+    text = {name: text_column(column(df, name)) for name in [
+        'Русское название', 'Латинское название', 'Основной цвет', 'Место нахождения', 'Период',
+        'Добавочный цвет', 'Тип цвета', 'Цвет глаз', 'Среда (тип водоёма)', 'Пол', 'Семейство', 'Подотряд'
+    ]}
+    wingspan = (wingspan_min.astype('string') + '–' + wingspan_max.astype('string') + ' мм')
+    
+    description = join_description([
+        ('Добавочный цвет', text['Добавочный цвет']),
+        ('Тип цвета', text['Тип цвета']),
+        ('Цвет глаз', text['Цвет глаз']),
+        ('Среда', text['Среда (тип водоёма)']),
+        ('Пол', text['Пол']),
+        ('Семейство', text['Семейство']),
+        ('Подотряд', text['Подотряд']),
+        ('Размах крыльев', wingspan),
+    ])
+    
+    return pd.DataFrame({
+        'name_ru': text['Русское название'],
+        'name_lat': text['Латинское название'],
+        'size_min': body_min,
+        'size_max': body_max,
+        'color': text['Основной цвет'],
+        'habitat': text['Место нахождения'],
+        'season': text['Период'],
+        'description': description,
+        'wingspan_min': wingspan_min,
+        'wingspan_max': wingspan_max,
+        'sex': text['Пол'],
+        'attributes': attributes_column({
+            'extra_color': text['Добавочный цвет'],
+            'color_type': text['Тип цвета'],
+            'eye_color': text['Цвет глаз'],
+            'environment': text['Среда (тип водоёма)'],
+            'gender': text['Пол'],
+            'family': text['Семейство'],
+            'suborder': text['Подотряд'],
+        }, description),
+    })
+
+def latin_name_series(genus: pd.Series, species: pd.Series) -> pd.Series:
+    """Латинское название "Род вид", если известны и род, и вид"""
+    both = genus.notna() & species.notna()
+    return (genus.astype('string') + ' ' + species.astype('string')).astype(object).where(both, None)
+
+def build_beetle_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Строки таблицы beetles из листа жуков"""
+    size_min, size_max = size_columns(column(df, 'Размер (длина тела, мм)'))
+    text = {name: text_column(column(df, name)) for name in [
+        'Русское название', 'Основной цвет', 'Место нахождения', 'Активность / Период', 'Род', 'Вид',
+        'Добавочный цвет / Особенности', 'Тип поверхности / Блеск', 'Надкрылья', 'Цвет глаз',
+        'Среда обитания (биотоп)', 'Пол', 'Семейство'
+    ]}
+    
+    description = join_description([
+        ('Особенности', text['Добавочный цвет / Особенности']),
+        ('Тип поверхности', text['Тип поверхности / Блеск']),
+        ('Надкрылья', text['Надкрылья']),
+        ('Цвет глаз', text['Цвет глаз']),
+        ('Биотоп', text['Среда обитания (биотоп)']),
+        ('Пол', text['Пол']),
+        ('Семейство', text['Семейство']),
+        ('Род', text['Род']),
+    ])
+    
+    return pd.DataFrame({
+        'name_ru': text['Русское название'],
+        'name_lat': latin_name_series(text['Род'], text['Вид']),
+        'size_min': size_min,
+        'size_max': size_max,
+        'color': text['Основной цвет'],
+        'habitat': text['Место нахождения'],
+        'season': text['Активность / Период'],
+        'description': description,
+        'wingspan_min': None,
+        'wingspan_max': None,
+        'sex': text['Пол'],
+        'attributes': attributes_column({
+            'features': text['Добавочный цвет / Особенности'],
+            'surface_type': text['Тип поверхности / Блеск'],
+            'elytra': text['Надкрылья'],
+            'eye_color': text['Цвет глаз'],
+            'biotope': text['Среда обитания (биотоп)'],
+            'gender': text['Пол'],
+            'family': text['Семейство'],
+            'genus': text['Род'],
+        }, description),
+    })
+
+def build_butterfly_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Строки таблицы butterflies из листа бабочек"""
+    wingspan_min, wingspan_max = size_columns(column(df, 'Размах крыльев (мм)'))
+    text = {name: text_column(column(df, name)) for name in [
+        'Русское название', 'Основной цвет крыльев (верх)', 'Место нахождения', 'Лёт (период)', 'Род', 'Вид',
+        'Особенности рисунка крыльев', 'Цвет тела / Опушение', 'Цвет глаз', 'Гусеница (основной цвет)',
+        'Кормовое растение гусениц', 'Пол', 'Семейство'
+    ]}
+    
+    description = join_description([
+        ('Рисунок', text['Особенности рисунка крыльев']),
+        ('Тело', text['Цвет тела / Опушение']),
+        ('Цвет глаз', text['Цвет глаз']),
+        ('Гусеница', text['Гусеница (основной цвет)']),
+        ('Кормовое растение', text['Кормовое растение гусениц']),
+        ('Пол', text['Пол']),
+        ('Семейство', text['Семейство']),
+        ('Род', text['Род']),
+    ])
+    
+    return pd.DataFrame({
+        'name_ru': text['Русское название'],
+        'name_lat': latin_name_series(text['Род'], text['Вид']),
+        # У бабочек размер - это размах крыльев
+        'size_min': wingspan_min,
+        'size_max': wingspan_max,
+        'color': text['Основной цвет крыльев (верх)'],
+        'habitat': text['Место нахождения'],
+        'season': text['Лёт (период)'],
+        'description': description,
+        'wingspan_min': None,
+        'wingspan_max': None,
+        'sex': text['Пол'],
+        'attributes': attributes_column({
+            'wing_pattern': text['Особенности рисунка крыльев'],
+            'body': text['Цвет тела / Опушение'],
+            'eye_color': text['Цвет глаз'],
+            'caterpillar': text['Гусеница (основной цвет)'],
+            'food_plant': text['Кормовое растение гусениц'],
+            'gender': text['Пол'],
+            'family': text['Семейство'],
+            'genus': text['Род'],
+        }, description),
+    })
+
+# Файл, параметры чтения и разбор листа для каждого типа
+SHEETS = {
+    'dragonfly': ('стрекозы.xlsx', {}, build_dragonfly_frame),
+    'beetle': ('жужжелицы.xlsx', {}, build_beetle_frame),
+    'butterfly': ('Бабочки.xlsx', {'header': 1}, build_butterfly_frame),
+}
+
+def bulk_load(db: Database, insect_type: str, frame: pd.DataFrame) -> int:
+    """
+    Загрузить строки одного типа в species одной транзакцией
+    
+    Строки копируются через COPY во временную таблицу, затем переносятся
+    одним INSERT ... ON CONFLICT: существующие виды (по name_ru, name_lat, sex)
+    обновляются, новые добавляются. Все строки попадают в секцию типа, поэтому
+    параллельный импорт разных файлов не блокирует друг друга.
+    
+    Returns:
+        Число вставленных или обновлённых строк
+    """
+    # Один ключ не может дважды встретиться в одном INSERT ... ON CONFLICT
+    frame = frame.drop_duplicates(subset=UPSERT_KEY, keep='last')
+    
+    buffer = io.StringIO()
+    frame[IMPORT_COLUMNS].to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    
+    columns = ', '.join(IMPORT_COLUMNS)
+    updates = ', '.join(f"{name} = EXCLUDED.{name}" for name in IMPORT_COLUMNS if name not in UPSERT_KEY)
+    
+    with db.cursor() as cursor:
+        # Только импортируемые колонки: LIKE скопировал бы NOT NULL колонки insect_type,
+        # которую COPY не заполняет (тип подставляется при переносе в species)
+        cursor.execute(f"""
+            CREATE TEMP TABLE import_rows ON COMMIT DROP AS
+            SELECT {columns} FROM {CATALOG_TABLE} WITH NO DATA
+        """)
+        cursor.copy_expert(f"COPY import_rows ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(f"""
+            INSERT INTO {CATALOG_TABLE} (insect_type, {columns})
+            SELECT %s, {columns} FROM import_rows
+            ON CONFLICT (insect_type, name_ru, (coalesce(name_lat, '')), (coalesce(sex, '')))
+            DO UPDATE SET {updates}
+        """, (insect_type,))
+        return cursor.rowcount
+
+def bulk_import(insect_type: str, filename: str = None) -> Tuple[int, int]:
+    """
+    Пакетный импорт одного Excel файла
+    
+    Returns:
+        (число загруженных строк, число пропущенных строк)
+    """
+    default_name, read_options, build_frame = SHEETS[insect_type]
+    if filename is None:
+        filename = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', default_name)
+    print(f"📥 Пакетный импорт {insect_type} из {filename}...")
+    
+    df = pd.read_excel(filename, **read_options)
+    # Очищаем названия колонок от лишних пробелов
+    df.columns = df.columns.astype(str).str.strip()
+    
+    frame = build_frame(df)
+    # Проверяем обязательные поля
+    valid = frame['name_ru'].notna()
+    skipped = int((~valid).sum())
+    
+    imported = bulk_load(Database(), insect_type, frame[valid])
+    print(f"✅ {insect_type}: загружено {imported}, пропущено {skipped}")
+    return imported, skipped
+
+def bulk_import_all(workers: int = 3) -> Tuple[int, int]:
+    """Пакетный импорт всех файлов; файлы обрабатываются параллельно в отдельных процессах"""
+    total_imported = 0
+    total_errors = 0
+    
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {insect_type: executor.submit(bulk_import, insect_type) for insect_type in SHEETS}
+        for insect_type, future in futures.items():
+            try:
+                imported, errors = future.result()
+                total_imported += imported
+                total_errors += errors
+            except Exception as e:
+                print(f"❌ Критическая ошибка при импорте {insect_type}: {e}")
+    
+    return total_imported, total_errors
+
 def main():
     """Основная функция импорта"""
+    parser = argparse.ArgumentParser(description='Импорт данных из Excel в базу данных')
+    parser.add_argument('--row-by-row', action='store_true',
+                        help='старый построчный импорт через add_insect (без обновления существующих записей)')
+    parser.add_argument('--workers', type=int, default=3,
+                        help='число параллельно импортируемых файлов в пакетном режиме')
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("📥 ИМПОРТ ДАННЫХ ИЗ EXCEL В БАЗУ ДАННЫХ")
     print("=" * 60)
     
+    if args.row_by_row:
+        total_imported, total_errors = import_row_by_row()
+    else:
+        total_imported, total_errors = bulk_import_all(args.workers)
+    
+    print("\n" + "=" * 60)
+    print("📊 ИТОГОВАЯ СТАТИСТИКА")
+    print("=" * 60)
+    print(f"✅ Всего импортировано: {total_imported}")
+    if total_errors > 0:
+        print(f"⚠️  Всего ошибок: {total_errors}")
+    print("=" * 60)
+
+def import_row_by_row() -> Tuple[int, int]:
+    """Построчный импорт всех файлов"""
     total_imported = 0
     total_errors = 0
     
@@ -314,13 +655,7 @@ def main():
     except Exception as e:
         print(f"❌ Критическая ошибка при импорте бабочек: {e}")
     
-    print("\n" + "=" * 60)
-    print("📊 ИТОГОВАЯ СТАТИСТИКА")
-    print("=" * 60)
-    print(f"✅ Всего импортировано: {total_imported}")
-    if total_errors > 0:
-        print(f"⚠️  Всего ошибок: {total_errors}")
-    print("=" * 60)
+    return total_imported, total_errors
 
 if __name__ == '__main__':
     main()
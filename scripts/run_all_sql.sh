@@ -54,5 +54,70 @@ if [ -f "$SQL_DIR/СБ.sql" ]; then
     echo ""
 fi
 
+# 6. Версии данных каталога (сброс кэшей приложения после записи)
+if [ -f "$SQL_DIR/add_catalog_versions.sql" ]; then
+    echo "🔄 Создание версий данных каталога..."
+    psql -U $DB_USER -d $DB_NAME -f "$SQL_DIR/add_catalog_versions.sql"
+    echo "✅ Версии данных каталога созданы"
+    echo ""
+fi
+
+# 7. Структурированные атрибуты насекомых
+if [ -f "$SQL_DIR/add_structured_attributes.sql" ]; then
+    echo "🏷️  Добавление структурированных атрибутов..."
+    psql -U $DB_USER -d $DB_NAME -f "$SQL_DIR/add_structured_attributes.sql"
+    python3 "$SCRIPT_DIR/backfill_attributes.py"
+    echo "✅ Атрибуты добавлены"
+    echo ""
+fi
+
+# 8. Индексы для поиска по свободному тексту (pg_trgm и полнотекстовый поиск)
+if [ -f "$SQL_DIR/add_text_search_indexes.sql" ]; then
+    echo "🔎 Создание индексов для текстового поиска..."
+    psql -U $DB_USER -d $DB_NAME -f "$SQL_DIR/add_text_search_indexes.sql"
+    echo "✅ Индексы текстового поиска созданы"
+    echo ""
+fi
+
+# 9. Уникальность видов для повторного импорта
+if [ -f "$SQL_DIR/add_import_upsert.sql" ]; then
+    echo "🧬 Удаление дубликатов и создание уникальных индексов..."
+    psql -U $DB_USER -d $DB_NAME -f "$SQL_DIR/add_import_upsert.sql"
+    echo "✅ Уникальные индексы созданы"
+    echo ""
+fi
+
+# 10. Лента изменений запросов к эксперту (версии и уведомления NOTIFY)
+if [ -f "$SQL_DIR/add_expert_request_changes.sql" ]; then
+    echo "📨 Создание ленты изменений запросов к эксперту..."
+    psql -U $DB_USER -d $DB_NAME -f "$SQL_DIR/add_expert_request_changes.sql"
+    echo "✅ Лента изменений создана"
+    echo ""
+fi
+
+# 11. Единая секционированная таблица каталога species (после всех миграций старых таблиц)
+if [ -f "$SQL_DIR/add_species_partitioning.sql" ]; then
+    echo "🗂️  Перенос каталога в секционированную таблицу species..."
+    psql -U $DB_USER -d $DB_NAME -f "$SQL_DIR/add_species_partitioning.sql"
+    echo "✅ Каталог перенесён в species"
+    echo ""
+fi
+
+# 12. Соответствие видов каталога и ВидНасекомого (ответы эксперта)
+if [ -f "$SQL_DIR/add_species_crosswalk.sql" ]; then
+    echo "🔗 Создание соответствия видов каталога и ВидНасекомого..."
+    psql -U $DB_USER -d $DB_NAME -f "$SQL_DIR/add_species_crosswalk.sql"
+    echo "✅ Соответствие видов создано"
+    echo ""
+fi
+
+# 13. Версия данных пользователей (сброс кэша пользователей после смены роли)
+if [ -f "$SQL_DIR/add_user_versions.sql" ]; then
+    echo "👤 Создание версии данных пользователей..."
+    psql -U $DB_USER -d $DB_NAME -f "$SQL_DIR/add_user_versions.sql"
+    echo "✅ Версия данных пользователей создана"
+    echo ""
+fi
+
 echo "✅ Все SQL скрипты выполнены!"
 
@@ -0,0 +1,193 @@
+"""
+Ранжированный поиск похожих видов
+
+Обычный поиск (Database.search_insects) требует совпадения всех критериев,
+поэтому одно неточное значение даёт пустой результат. Здесь каждый вид
+получает взвешенную оценку совпадения от 0 до 1 по всем заданным критериям,
+и возвращаются K лучших.
+
+Каталог одного типа - несколько сотен строк, поэтому он целиком хранится
+в памяти в виде матрицы признаков (numpy): интервалы размеров и для каждого
+текстового признака булева матрица «вид x основа слова». Оценка всех видов
+считается несколькими векторными операциями.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from attributes import normalize, STOP_WORDS
+
+# Вес критерия в итоговой оценке
+DEFAULT_WEIGHTS = {
+    'size': 2.0,
+    'wingspan': 1.5,
+    'color': 2.0,
+    'habitat': 1.0,
+    'season': 1.0,
+    'eye_color': 1.5,
+    'environment': 1.0,
+    'gender': 0.5,
+    'surface_type': 1.0,
+    'elytra': 1.5,
+    'wing_pattern': 1.5,
+    'time_of_day': 1.0,
+}
+
+# Текстовые колонки таблицы, которые участвуют в оценке
+TEXT_COLUMNS = ('color', 'habitat', 'season')
+
+# Атрибуты (колонка attributes), которые участвуют в оценке для каждого типа
+TYPE_ATTRIBUTES = {
+    'dragonfly': ('eye_color', 'environment', 'gender'),
+    'beetle': ('surface_type', 'elytra'),
+    'butterfly': ('wing_pattern', 'time_of_day'),
+}
+
+# Длина основы слова: "зелёные", "зеленый", "зеленоватый" -> "зелен"
+STEM_LENGTH = 5
+
+
+def stems(value) -> List[str]:
+    """Основы слов значения (для списка - всех его элементов)"""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        value = ' '.join(str(item) for item in value)
+    result = []
+    for word in re.findall(r'\w+', normalize(value)):
+        if len(word) > 1 and word not in STOP_WORDS:
+            stem = word[:STEM_LENGTH]
+            if stem not in result:
+                result.append(stem)
+    return result
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value) if value not in (None, '') else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class _TermMatrix:
+    """Булева матрица «вид x основа слова» для одного текстового признака"""
+
+    def __init__(self, row_stems: List[List[str]]):
+        self.vocabulary: Dict[str, int] = {}
+        for words in row_stems:
+            for stem in words:
+                self.vocabulary.setdefault(stem, len(self.vocabulary))
+        self.matrix = np.zeros((len(row_stems), max(len(self.vocabulary), 1)), dtype=bool)
+        for row, words in enumerate(row_stems):
+            for stem in words:
+                self.matrix[row, self.vocabulary[stem]] = True
+
+    def score(self, query_stems: List[str]) -> np.ndarray:
+        """Доля основ запроса, которые есть у вида (основы вне словаря не совпадают ни с кем)"""
+        columns = [self.vocabulary[stem] for stem in query_stems if stem in self.vocabulary]
+        if not columns:
+            return np.zeros(self.matrix.shape[0])
+        return self.matrix[:, columns].sum(axis=1) / len(query_stems)
+
+
+class SpeciesMatrix:
+    """Матрица признаков каталога одного типа насекомых"""
+
+    def __init__(self, insect_type: str, rows: List[Dict]):
+        self.insect_type = insect_type
+        self.rows = rows
+        self.ids = np.array([row['id'] for row in rows], dtype=np.int64)
+        self.size = np.array([[_to_float(row.get('size_min')), _to_float(row.get('size_max'))]
+                              for row in rows], dtype=float).reshape(-1, 2)
+        self.wingspan = np.array([[_to_float(row.get('wingspan_min')), _to_float(row.get('wingspan_max'))]
+                                  for row in rows], dtype=float).reshape(-1, 2)
+
+        self.terms: Dict[str, _TermMatrix] = {}
+        for column in TEXT_COLUMNS:
+            self.terms[column] = _TermMatrix([stems(row.get(column)) for row in rows])
+        for key in TYPE_ATTRIBUTES.get(insect_type, ()):
+            self.terms[key] = _TermMatrix([stems((row.get('attributes') or {}).get(key)) for row in rows])
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @staticmethod
+    def _range_score(ranges: np.ndarray, low: Optional[float], high: Optional[float]) -> np.ndarray:
+        """
+        Совпадение интервалов: 1 при пересечении, дальше убывает с зазором
+        (на расстоянии в четверть размера запроса оценка 0.5); нет данных - 0
+        """
+        low = high if low is None else low
+        high = low if high is None else high
+        if low > high:
+            low, high = high, low
+        row_low = np.where(np.isnan(ranges[:, 0]), ranges[:, 1], ranges[:, 0])
+        row_high = np.where(np.isnan(ranges[:, 1]), ranges[:, 0], ranges[:, 1])
+        gap = np.maximum(np.maximum(row_low - high, low - row_high), 0.0)
+        scale = max((low + high) / 8.0, 1.0)
+        score = 1.0 / (1.0 + gap / scale)
+        return np.where(np.isnan(gap), 0.0, score)
+
+    def criteria(self, params: Dict) -> Dict[str, np.ndarray]:
+        """Оценки видов по каждому заданному критерию"""
+        result = {}
+
+        size_min = _to_float(params.get('size_min') or params.get('body_length_min'))
+        size_max = _to_float(params.get('size_max') or params.get('body_length_max'))
+        if not (np.isnan(size_min) and np.isnan(size_max)):
+            result['size'] = self._range_score(
+                self.size, None if np.isnan(size_min) else size_min, None if np.isnan(size_max) else size_max
+            )
+
+        if self.insect_type == 'dragonfly':
+            wingspan_min = _to_float(params.get('wingspan_min'))
+            wingspan_max = _to_float(params.get('wingspan_max'))
+            if not (np.isnan(wingspan_min) and np.isnan(wingspan_max)):
+                result['wingspan'] = self._range_score(
+                    self.wingspan,
+                    None if np.isnan(wingspan_min) else wingspan_min,
+                    None if np.isnan(wingspan_max) else wingspan_max
+                )
+
+        for key, term_matrix in self.terms.items():
+            query_stems = stems(params.get(key))
+            if query_stems:
+                result[key] = term_matrix.score(query_stems)
+        return result
+
+    def rank(self, params: Dict, top_k: int = 20,
+             weights: Optional[Dict[str, float]] = None) -> List[Tuple[Dict, float, Dict[str, float]]]:
+        """
+        K видов с наибольшей взвешенной оценкой совпадения
+
+        Returns:
+            Список (строка каталога, оценка 0..1, оценки по критериям),
+            по убыванию оценки; при равенстве - по id
+        """
+        weights = weights or DEFAULT_WEIGHTS
+        criteria = self.criteria(params)
+        if not criteria or not len(self):
+            return []
+
+        total_weight = sum(weights.get(key, 1.0) for key in criteria)
+        score = sum(weights.get(key, 1.0) * values for key, values in criteria.items()) / total_weight
+
+        top_k = min(top_k, len(self))
+        # lexsort сортирует по последнему ключу: оценка по убыванию, затем id
+        order = np.lexsort((self.ids, -score))[:top_k]
+        return [
+            (self.rows[i], float(score[i]), {key: float(values[i]) for key, values in criteria.items()})
+            for i in order
+        ]
+
+
+def rank_species(matrix: SpeciesMatrix, params: Dict, top_k: int = 20) -> List[Dict]:
+    """Лучшие совпадения в виде строк каталога с полями match_score и match_details"""
+    results = []
+    for row, score, details in matrix.rank(params, top_k):
+        result = dict(row)
+        result['match_score'] = round(score, 4)
+        result['match_details'] = {key: round(value, 4) for key, value in details.items()}
+        results.append(result)
+    return results
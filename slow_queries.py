@@ -0,0 +1,189 @@
+"""
+Журнал медленных SQL-запросов
+
+Поиск строит SQL из десятка необязательных параметров, и качество плана
+сильно зависит от их сочетания. Запросы дольше SLOW_QUERY_CONFIG['threshold_ms']
+записываются в файл (JSON по строке на запрос, с ротацией): текст запроса,
+параметры, время, «форма» параметров и, если включено, план
+EXPLAIN (ANALYZE, BUFFERS).
+
+Форма - это тип поиска и набор заданных фильтров без их значений, например
+«search dragonfly: color+habitat+size_min». Код поиска задаёт её через
+query_shape(); для остальных запросов формой служит нормализованный текст SQL.
+По формам ведётся сводка (число, суммарное и максимальное время, пример
+самого медленного запроса) - по ней видно, каким сочетаниям фильтров нужны индексы.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime
+from decimal import Decimal
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional
+
+from config import SLOW_QUERY_CONFIG
+
+# Форма без фильтров
+NO_FILTERS = '-'
+
+_current_shape: ContextVar[Optional[str]] = ContextVar('query_shape', default=None)
+
+_logger: Optional[logging.Logger] = None
+_logger_lock = threading.Lock()
+
+# Форма -> сводка по её медленным запросам
+_shapes: Dict[str, Dict] = {}
+# Форма -> время последнего EXPLAIN (time.monotonic)
+_explained_at: Dict[str, float] = {}
+_shapes_lock = threading.Lock()
+
+_EXPLAINABLE_RE = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+
+def search_shape(insect_type: str, params: Optional[Dict]) -> str:
+    """Форма параметров поиска: тип и имена заданных фильтров"""
+    names = sorted(name for name, value in (params or {}).items() if value not in (None, '', [], {}))
+    return f"search {insect_type}: {'+'.join(names) if names else NO_FILTERS}"
+
+
+@contextmanager
+def query_shape(shape: str):
+    """Отнести SQL-запросы блока к форме shape"""
+    token = _current_shape.set(shape)
+    try:
+        yield
+    finally:
+        _current_shape.reset(token)
+
+
+def is_slow(seconds: float) -> bool:
+    threshold = SLOW_QUERY_CONFIG['threshold_ms']
+    return threshold > 0 and seconds * 1000 >= threshold
+
+
+def _normalize(query) -> str:
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return re.sub(r'\s+', ' ', str(query)).strip()
+
+
+def current_shape(query) -> str:
+    """Форма запроса: заданная query_shape() или текст SQL"""
+    return _current_shape.get() or f"sql: {_normalize(query)[:200]}"
+
+
+def should_explain(query, shape: str) -> bool:
+    """Снимать ли план: включено, это SELECT и план этой формы давно не снимался"""
+    if not SLOW_QUERY_CONFIG['explain'] or not _EXPLAINABLE_RE.match(_normalize(query)):
+        return False
+    now = time.monotonic()
+    with _shapes_lock:
+        last = _explained_at.get(shape)
+        if last is not None and now - last < SLOW_QUERY_CONFIG['explain_interval']:
+            return False
+        _explained_at[shape] = now
+        return True
+
+
+def explain_query(query) -> str:
+    """Текст запроса EXPLAIN для query (выполняется с теми же параметрами)"""
+    return f"EXPLAIN (ANALYZE, BUFFERS) {query}"
+
+
+def _json_value(value):
+    if hasattr(value, 'adapted'):  # psycopg2 Json
+        return _json_value(value.adapted)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (list, tuple)):
+        return [_json_value(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _json_value(item) for key, item in value.items()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _get_logger() -> logging.Logger:
+    global _logger
+    if _logger is not None:
+        return _logger
+    with _logger_lock:
+        if _logger is None:
+            logger = logging.getLogger('insects.slow_queries')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            log_file = SLOW_QUERY_CONFIG['log_file']
+            os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+            handler = RotatingFileHandler(log_file, maxBytes=SLOW_QUERY_CONFIG['log_max_bytes'],
+                                          backupCount=SLOW_QUERY_CONFIG['log_backup_count'], encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            _logger = logger
+    return _logger
+
+
+def record(query, values, seconds: float, shape: str, plan: Optional[str] = None):
+    """Записать медленный запрос в журнал и учесть его в сводке по формам"""
+    text = _normalize(query)
+    params = _json_value(values) if values is not None else None
+    duration_ms = round(seconds * 1000, 3)
+    now = datetime.now().isoformat(timespec='seconds')
+
+    entry = {'time': now, 'duration_ms': duration_ms, 'shape': shape, 'query': text, 'params': params}
+    if plan is not None:
+        entry['plan'] = plan
+    try:
+        _get_logger().info(json.dumps(entry, ensure_ascii=False))
+    except OSError:
+        # Журнал не должен ломать обработку запроса (например, нет прав на запись)
+        pass
+
+    with _shapes_lock:
+        stats = _shapes.get(shape)
+        if stats is None:
+            if len(_shapes) >= SLOW_QUERY_CONFIG['max_shapes']:
+                return
+            stats = _shapes[shape] = {'shape': shape, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                      'last_seen': None, 'slowest': None, 'plan': None}
+        stats['count'] += 1
+        stats['total_ms'] += duration_ms
+        stats['last_seen'] = now
+        if duration_ms >= stats['max_ms']:
+            stats['max_ms'] = duration_ms
+            stats['slowest'] = {'query': text, 'params': params, 'duration_ms': duration_ms}
+        if plan is not None:
+            stats['plan'] = plan
+
+
+def summary(sort: str = 'total', limit: int = 20) -> List[Dict]:
+    """
+    Худшие формы запросов
+
+    Args:
+        sort: 'total' (суммарное время), 'max', 'mean' или 'count'
+        limit: сколько форм вернуть
+    """
+    if sort not in ('total', 'max', 'mean', 'count'):
+        raise ValueError(f"Неверная сортировка: {sort}")
+    with _shapes_lock:
+        items = [dict(stats, mean_ms=round(stats['total_ms'] / stats['count'], 3),
+                      total_ms=round(stats['total_ms'], 3))
+                 for stats in _shapes.values()]
+    key = {'total': 'total_ms', 'max': 'max_ms', 'mean': 'mean_ms', 'count': 'count'}[sort]
+    items.sort(key=lambda stats: stats[key], reverse=True)
+    return items[:limit]
+
+
+def reset():
+    """Очистить сводку (журнал в файле сохраняется)"""
+    with _shapes_lock:
+        _shapes.clear()
+        _explained_at.clear()
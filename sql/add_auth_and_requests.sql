@@ -57,10 +57,28 @@ CREATE TABLE IF NOT EXISTS "ЗапросЭксперту" (
     FOREIGN KEY (id_эксперта) REFERENCES "Пользователь"(id_пользователя) ON DELETE SET NULL
 );
 
--- Индексы для быстрого поиска
-CREATE INDEX IF NOT EXISTS idx_запрос_пользователь ON "ЗапросЭксперту"(id_пользователя);
-CREATE INDEX IF NOT EXISTS idx_запрос_статус ON "ЗапросЭксперту"(статус);
-CREATE INDEX IF NOT EXISTS idx_запрос_дата ON "ЗапросЭксперту"(дата_создания);
+-- Очередь запросов листается по ключу (дата_создания DESC, id_запроса DESC),
+-- поэтому дата создания обязательна
+UPDATE "ЗапросЭксперту" SET дата_создания = CURRENT_TIMESTAMP WHERE дата_создания IS NULL;
+ALTER TABLE "ЗапросЭксперту" ALTER COLUMN дата_создания SET NOT NULL;
+
+-- Индексы очереди: каждый фильтр (пользователь, статус, эксперт) ведёт
+-- к уже упорядоченному по ключу страницы диапазону индекса
+DROP INDEX IF EXISTS idx_запрос_пользователь;
+DROP INDEX IF EXISTS idx_запрос_статус;
+DROP INDEX IF EXISTS idx_запрос_дата;
+CREATE INDEX IF NOT EXISTS idx_запрос_очередь
+    ON "ЗапросЭксперту"(дата_создания DESC, id_запроса DESC);
+CREATE INDEX IF NOT EXISTS idx_запрос_пользователь_очередь
+    ON "ЗапросЭксперту"(id_пользователя, дата_создания DESC, id_запроса DESC);
+CREATE INDEX IF NOT EXISTS idx_запрос_статус_очередь
+    ON "ЗапросЭксперту"(статус, дата_создания DESC, id_запроса DESC);
+-- Ожидающих ответа запросов немного, а это самый частый экран администратора
+CREATE INDEX IF NOT EXISTS idx_запрос_ожидает
+    ON "ЗапросЭксперту"(дата_создания DESC, id_запроса DESC) WHERE статус = 'ожидает';
+-- Ответы эксперта; запросы без эксперта в индекс не попадают
+CREATE INDEX IF NOT EXISTS idx_запрос_эксперт_очередь
+    ON "ЗапросЭксперту"(id_эксперта, дата_создания DESC, id_запроса DESC) WHERE id_эксперта IS NOT NULL;
 CREATE INDEX IF NOT EXISTS idx_пользователь_username ON "Пользователь"(username);
 CREATE INDEX IF NOT EXISTS idx_пользователь_email ON "Пользователь"(email);
 
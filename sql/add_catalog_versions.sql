@@ -0,0 +1,49 @@
+-- Версии данных каталога насекомых
+-- Каждая запись в dragonflies/beetles/butterflies увеличивает версию своей
+-- таблицы. Приложение сверяет версию, чтобы сбрасывать кэши (фасеты фильтров,
+-- результаты поиска) после add_insect или импорта из Excel.
+
+CREATE TABLE IF NOT EXISTS catalog_versions (
+    table_name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE catalog_versions
+    SET version = version + 1,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Таблицы каталога до перехода на species (add_species_partitioning.sql); после него
+-- dragonflies/beetles/butterflies - представления, и этот блок пропускается
+DO $$
+BEGIN
+    IF to_regclass('public.species') IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO catalog_versions (table_name) VALUES
+        ('dragonflies'), ('beetles'), ('butterflies')
+    ON CONFLICT (table_name) DO NOTHING;
+
+    -- Триггеры уровня оператора: пакетная вставка или COPY увеличивает версию один раз
+    DROP TRIGGER IF EXISTS trig_dragonflies_version ON dragonflies;
+    CREATE TRIGGER trig_dragonflies_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON dragonflies
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_catalog_version();
+
+    DROP TRIGGER IF EXISTS trig_beetles_version ON beetles;
+    CREATE TRIGGER trig_beetles_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON beetles
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_catalog_version();
+
+    DROP TRIGGER IF EXISTS trig_butterflies_version ON butterflies;
+    CREATE TRIGGER trig_butterflies_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON butterflies
+    FOR EACH STATEMENT EXECUTE PROCEDURE bump_catalog_version();
+END $$;
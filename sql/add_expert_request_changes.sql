@@ -0,0 +1,57 @@
+-- Лента изменений запросов к эксперту
+-- Каждая вставка или изменение запроса получает новую версию (возрастающее
+-- число) и время изменения, а после фиксации транзакции PostgreSQL рассылает
+-- уведомление NOTIFY expert_requests. Страницы администратора и «Мои запросы»
+-- подписываются на уведомления через /api/expert-requests/events и дочитывают
+-- только изменившиеся запросы: GET /api/expert-requests?since=<версия>.
+
+CREATE SEQUENCE IF NOT EXISTS "ЗапросЭксперту_версия_seq";
+
+-- Существующие строки получают версии из последовательности при добавлении колонки
+ALTER TABLE "ЗапросЭксперту"
+    ADD COLUMN IF NOT EXISTS версия BIGINT NOT NULL DEFAULT nextval('"ЗапросЭксперту_версия_seq"');
+ALTER TABLE "ЗапросЭксперту"
+    ADD COLUMN IF NOT EXISTS дата_изменения TIMESTAMP;
+
+DROP TRIGGER IF EXISTS trig_запрос_эксперту_версия ON "ЗапросЭксперту";
+DROP TRIGGER IF EXISTS trig_запрос_эксперту_notify ON "ЗапросЭксперту";
+
+UPDATE "ЗапросЭксперту"
+SET дата_изменения = COALESCE(дата_ответа, дата_создания, CURRENT_TIMESTAMP)
+WHERE дата_изменения IS NULL;
+
+ALTER TABLE "ЗапросЭксперту" ALTER COLUMN дата_изменения SET DEFAULT CURRENT_TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_запрос_версия ON "ЗапросЭксперту"(версия);
+
+CREATE OR REPLACE FUNCTION set_expert_request_version() RETURNS TRIGGER AS $$
+BEGIN
+    -- Блокировка до конца транзакции: версии выдаются в порядке фиксации,
+    -- и клиент, дочитавший до версии N, не пропустит запись с меньшей версией,
+    -- которая зафиксируется позже. Запросы к эксперту пишутся редко.
+    PERFORM pg_advisory_xact_lock(hashtext('ЗапросЭксперту.версия'));
+    NEW.версия := nextval('"ЗапросЭксперту_версия_seq"');
+    NEW.дата_изменения := CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_expert_request_change() RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('expert_requests', json_build_object(
+        'id', NEW.id_запроса,
+        'user_id', NEW.id_пользователя,
+        'status', NEW.статус,
+        'version', NEW.версия
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trig_запрос_эксперту_версия
+BEFORE INSERT OR UPDATE ON "ЗапросЭксперту"
+FOR EACH ROW EXECUTE PROCEDURE set_expert_request_version();
+
+CREATE TRIGGER trig_запрос_эксперту_notify
+AFTER INSERT OR UPDATE ON "ЗапросЭксперту"
+FOR EACH ROW EXECUTE PROCEDURE notify_expert_request_change();
@@ -0,0 +1,40 @@
+-- Уникальность видов в таблицах каталога для повторного импорта из Excel
+-- Пакетный импорт (scripts/import_excel_data.py) обновляет существующую запись
+-- с тем же (name_ru, name_lat, sex) вместо вставки дубликата.
+
+-- Таблицы каталога до перехода на species (add_species_partitioning.sql); после него
+-- dragonflies/beetles/butterflies - представления, и этот блок пропускается
+DO $$
+BEGIN
+    IF to_regclass('public.species') IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE dragonflies ADD COLUMN IF NOT EXISTS sex VARCHAR(50);
+    ALTER TABLE beetles ADD COLUMN IF NOT EXISTS sex VARCHAR(50);
+    ALTER TABLE butterflies ADD COLUMN IF NOT EXISTS sex VARCHAR(50);
+
+    -- Пол уже импортированных записей берём из описания ("...; Пол: самец; ...")
+    UPDATE dragonflies SET sex = NULLIF(trim(substring(description from 'Пол:\s*([^;]+)')), '') WHERE sex IS NULL;
+    UPDATE beetles SET sex = NULLIF(trim(substring(description from 'Пол:\s*([^;]+)')), '') WHERE sex IS NULL;
+    UPDATE butterflies SET sex = NULLIF(trim(substring(description from 'Пол:\s*([^;]+)')), '') WHERE sex IS NULL;
+
+    -- Удаляем дубликаты прошлых импортов, оставляя самую раннюю запись
+    DELETE FROM dragonflies a USING dragonflies b
+    WHERE a.id > b.id AND a.name_ru = b.name_ru
+      AND coalesce(a.name_lat, '') = coalesce(b.name_lat, '')
+      AND coalesce(a.sex, '') = coalesce(b.sex, '');
+    DELETE FROM beetles a USING beetles b
+    WHERE a.id > b.id AND a.name_ru = b.name_ru
+      AND coalesce(a.name_lat, '') = coalesce(b.name_lat, '')
+      AND coalesce(a.sex, '') = coalesce(b.sex, '');
+    DELETE FROM butterflies a USING butterflies b
+    WHERE a.id > b.id AND a.name_ru = b.name_ru
+      AND coalesce(a.name_lat, '') = coalesce(b.name_lat, '')
+      AND coalesce(a.sex, '') = coalesce(b.sex, '');
+
+    -- Выражения должны совпадать с ON CONFLICT в bulk_load
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_dragonflies_species ON dragonflies (name_ru, (coalesce(name_lat, '')), (coalesce(sex, '')));
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_beetles_species ON beetles (name_ru, (coalesce(name_lat, '')), (coalesce(sex, '')));
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_butterflies_species ON butterflies (name_ru, (coalesce(name_lat, '')), (coalesce(sex, '')));
+END $$;
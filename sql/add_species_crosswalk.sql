@@ -0,0 +1,107 @@
+-- Соответствие видов каталога (species) и "ВидНасекомого"
+-- Эксперт выбирает вид из каталога, а запрос к эксперту ссылается на "ВидНасекомого".
+-- Соответствие (тип, id в каталоге) -> id_вида ищется по русскому названию и типу
+-- один раз - триггерами при импорте или изменении видов, - поэтому ответ на
+-- запрос сохраняется одним UPDATE без предварительных запросов.
+-- Выполняется после add_species_partitioning.sql.
+
+CREATE TABLE IF NOT EXISTS species_crosswalk (
+    insect_type VARCHAR(20) NOT NULL CHECK (insect_type IN ('dragonfly', 'beetle', 'butterfly')),
+    legacy_id INTEGER NOT NULL,
+    id_вида INTEGER NOT NULL REFERENCES "ВидНасекомого"(id_вида) ON DELETE CASCADE,
+    PRIMARY KEY (insect_type, legacy_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_species_crosswalk_вид ON species_crosswalk(id_вида);
+
+-- Поиск вида по названию внутри типа (раньше выполнялся полным просмотром)
+CREATE INDEX IF NOT EXISTS idx_вид_тип_название ON "ВидНасекомого"(тип_насекомого, название_русское);
+
+-- Тип каталога -> тип в "ВидНасекомого"
+CREATE OR REPLACE FUNCTION species_type_ru(insect_type TEXT) RETURNS TEXT AS $$
+    SELECT CASE insect_type
+        WHEN 'dragonfly' THEN 'стрекоза'
+        WHEN 'beetle' THEN 'жук'
+        WHEN 'butterfly' THEN 'бабочка'
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Заполнение для уже существующих видов; при нескольких совпадениях берётся меньший id_вида
+INSERT INTO species_crosswalk (insect_type, legacy_id, id_вида)
+SELECT DISTINCT ON (s.insect_type, s.id) s.insect_type, s.id, v.id_вида
+FROM species s
+JOIN "ВидНасекомого" v ON v.тип_насекомого = species_type_ru(s.insect_type) AND v.название_русское = s.name_ru
+ORDER BY s.insect_type, s.id, v.id_вида
+ON CONFLICT (insect_type, legacy_id) DO NOTHING;
+
+-- Вставка, переименование или удаление вида каталога
+CREATE OR REPLACE FUNCTION sync_species_crosswalk_legacy() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM species_crosswalk WHERE insect_type = OLD.insect_type AND legacy_id = OLD.id;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO species_crosswalk (insect_type, legacy_id, id_вида)
+        SELECT NEW.insect_type, NEW.id, v.id_вида
+        FROM "ВидНасекомого" v
+        WHERE v.тип_насекомого = species_type_ru(NEW.insect_type) AND v.название_русское = NEW.name_ru
+        ORDER BY v.id_вида
+        LIMIT 1
+        ON CONFLICT (insect_type, legacy_id) DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Новый или переименованный "ВидНасекомого" сопоставляется видам каталога,
+-- у которых соответствия ещё нет. Виды каталога, сопоставленные переименованной
+-- или удалённой записи, получают другую запись с тем же названием и типом
+-- (меньший id_вида, как в sync_species_crosswalk_legacy)
+CREATE OR REPLACE FUNCTION sync_species_crosswalk_vid() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        -- При удалении строки соответствия уже удалены ON DELETE CASCADE (триггеры
+        -- внешнего ключа RI_ConstraintTrigger_* срабатывают раньше по порядку имён)
+        IF TG_OP = 'UPDATE' THEN
+            DELETE FROM species_crosswalk WHERE id_вида = OLD.id_вида;
+        END IF;
+        INSERT INTO species_crosswalk (insect_type, legacy_id, id_вида)
+        SELECT DISTINCT ON (s.id) s.insect_type, s.id, v.id_вида
+        FROM species s
+        JOIN "ВидНасекомого" v ON v.тип_насекомого = OLD.тип_насекомого AND v.название_русское = s.name_ru
+        WHERE s.insect_type = CASE OLD.тип_насекомого
+                  WHEN 'стрекоза' THEN 'dragonfly'
+                  WHEN 'жук' THEN 'beetle'
+                  WHEN 'бабочка' THEN 'butterfly'
+              END
+          AND s.name_ru = OLD.название_русское
+        ORDER BY s.id, v.id_вида
+        ON CONFLICT (insect_type, legacy_id) DO NOTHING;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        -- Условие по insect_type читает только одну секцию species
+        INSERT INTO species_crosswalk (insect_type, legacy_id, id_вида)
+        SELECT s.insect_type, s.id, NEW.id_вида
+        FROM species s
+        WHERE s.insect_type = CASE NEW.тип_насекомого
+                  WHEN 'стрекоза' THEN 'dragonfly'
+                  WHEN 'жук' THEN 'beetle'
+                  WHEN 'бабочка' THEN 'butterfly'
+              END
+          AND s.name_ru = NEW.название_русское
+        ON CONFLICT (insect_type, legacy_id) DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Триггер уровня строки: поиск по индексам названия дешёвый и при пакетном импорте
+DROP TRIGGER IF EXISTS trig_species_crosswalk ON species;
+CREATE TRIGGER trig_species_crosswalk
+AFTER INSERT OR UPDATE OF name_ru OR DELETE ON species
+FOR EACH ROW EXECUTE PROCEDURE sync_species_crosswalk_legacy();
+
+DROP TRIGGER IF EXISTS trig_вид_crosswalk ON "ВидНасекомого";
+CREATE TRIGGER trig_вид_crosswalk
+AFTER INSERT OR UPDATE OF название_русское, тип_насекомого OR DELETE ON "ВидНасекомого"
+FOR EACH ROW EXECUTE PROCEDURE sync_species_crosswalk_vid();
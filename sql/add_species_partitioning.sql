@@ -0,0 +1,178 @@
+-- Единая таблица каталога species, секционированная по типу насекомого
+-- Три одинаковые таблицы dragonflies/beetles/butterflies переносятся в секции
+-- species_dragonfly/species_beetle/species_butterfly таблицы species
+-- (PARTITION BY LIST (insect_type)). Запросы приложения идут в species
+-- с условием insect_type = ..., поэтому PostgreSQL читает только нужную
+-- секцию, а запросы по нескольким типам выполняются одним запросом.
+--
+-- Вместо старых таблиц остаются представления с теми же именами (и колонкой
+-- insect_type): чтение, INSERT/UPDATE/DELETE через них работают, как раньше.
+-- id сохраняются, поэтому курсоры страниц и ссылки на виды остаются верными;
+-- id уникален внутри типа, первичный ключ - (insect_type, id).
+-- Скрипт выполняется после остальных миграций таблиц каталога.
+
+DO $$
+BEGIN
+    IF to_regclass('public.species') IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    CREATE SEQUENCE IF NOT EXISTS species_id_seq;
+
+    CREATE TABLE species (
+        id INTEGER NOT NULL DEFAULT nextval('species_id_seq'),
+        insect_type VARCHAR(20) NOT NULL,
+        name_ru VARCHAR(255) NOT NULL,
+        name_lat VARCHAR(255),
+        size_min NUMERIC(10, 2),
+        size_max NUMERIC(10, 2),
+        color TEXT,
+        habitat TEXT,
+        season TEXT,
+        description TEXT,
+        image_url TEXT,
+        wingspan_min NUMERIC(10, 2),
+        wingspan_max NUMERIC(10, 2),
+        sex VARCHAR(50),
+        attributes JSONB,
+        PRIMARY KEY (insect_type, id)
+    ) PARTITION BY LIST (insect_type);
+
+    ALTER SEQUENCE species_id_seq OWNED BY species.id;
+
+    CREATE TABLE species_dragonfly PARTITION OF species FOR VALUES IN ('dragonfly');
+    CREATE TABLE species_beetle PARTITION OF species FOR VALUES IN ('beetle');
+    CREATE TABLE species_butterfly PARTITION OF species FOR VALUES IN ('butterfly');
+
+    IF to_regclass('public.dragonflies') IS NOT NULL THEN
+        INSERT INTO species (insect_type, id, name_ru, name_lat, size_min, size_max, color, habitat, season,
+                             description, image_url, wingspan_min, wingspan_max, sex, attributes)
+        SELECT 'dragonfly', id, name_ru, name_lat, size_min, size_max, color, habitat, season,
+               description, image_url, wingspan_min, wingspan_max, sex, attributes
+        FROM dragonflies;
+        DROP TABLE dragonflies CASCADE;
+    END IF;
+
+    IF to_regclass('public.beetles') IS NOT NULL THEN
+        INSERT INTO species (insect_type, id, name_ru, name_lat, size_min, size_max, color, habitat, season,
+                             description, image_url, wingspan_min, wingspan_max, sex, attributes)
+        SELECT 'beetle', id, name_ru, name_lat, size_min, size_max, color, habitat, season,
+               description, image_url, wingspan_min, wingspan_max, sex, attributes
+        FROM beetles;
+        DROP TABLE beetles CASCADE;
+    END IF;
+
+    IF to_regclass('public.butterflies') IS NOT NULL THEN
+        INSERT INTO species (insect_type, id, name_ru, name_lat, size_min, size_max, color, habitat, season,
+                             description, image_url, wingspan_min, wingspan_max, sex, attributes)
+        SELECT 'butterfly', id, name_ru, name_lat, size_min, size_max, color, habitat, season,
+               description, image_url, wingspan_min, wingspan_max, sex, attributes
+        FROM butterflies;
+        DROP TABLE butterflies CASCADE;
+    END IF;
+
+    -- Новые виды получают id больше всех перенесённых
+    PERFORM setval('species_id_seq', (SELECT COALESCE(MAX(id), 0) + 1 FROM species), false);
+END $$;
+
+-- Индексы создаются на species и наследуются секциями
+CREATE INDEX IF NOT EXISTS idx_species_color ON species(insect_type, color);
+CREATE INDEX IF NOT EXISTS idx_species_habitat ON species(insect_type, habitat);
+CREATE INDEX IF NOT EXISTS idx_species_season ON species(insect_type, season);
+CREATE INDEX IF NOT EXISTS idx_species_attributes ON species USING GIN (attributes jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS idx_species_wingspan ON species(insect_type, wingspan_min, wingspan_max);
+
+-- Уникальность вида для повторного импорта (ON CONFLICT в import_excel_data.bulk_load)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_species ON species (insect_type, name_ru, (coalesce(name_lat, '')), (coalesce(sex, '')));
+
+-- Полнотекстовый поиск (выражения совпадают с Database._search_conditions)
+CREATE INDEX IF NOT EXISTS idx_species_color_fts ON species USING GIN (to_tsvector('russian', coalesce(color, '')));
+CREATE INDEX IF NOT EXISTS idx_species_habitat_fts ON species USING GIN (to_tsvector('russian', coalesce(habitat, '')));
+CREATE INDEX IF NOT EXISTS idx_species_season_fts ON species USING GIN (to_tsvector('russian', coalesce(season, '')));
+
+-- Триграммные индексы - если установлено расширение pg_trgm (см. add_text_search_indexes.sql)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS idx_species_color_trgm ON species USING GIN (color gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_species_habitat_trgm ON species USING GIN (habitat gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_species_season_trgm ON species USING GIN (season gin_trgm_ops);
+    END IF;
+END $$;
+
+-- Представления с именами старых таблиц. Значение insect_type по умолчанию
+-- позволяет вставлять строки через представление, не указывая тип
+CREATE OR REPLACE VIEW dragonflies AS
+SELECT id, name_ru, name_lat, size_min, size_max, color, habitat, season, description, image_url,
+       wingspan_min, wingspan_max, sex, attributes, insect_type
+FROM species WHERE insect_type = 'dragonfly'
+WITH CHECK OPTION;
+ALTER VIEW dragonflies ALTER COLUMN insect_type SET DEFAULT 'dragonfly';
+
+CREATE OR REPLACE VIEW beetles AS
+SELECT id, name_ru, name_lat, size_min, size_max, color, habitat, season, description, image_url,
+       wingspan_min, wingspan_max, sex, attributes, insect_type
+FROM species WHERE insect_type = 'beetle'
+WITH CHECK OPTION;
+ALTER VIEW beetles ALTER COLUMN insect_type SET DEFAULT 'beetle';
+
+CREATE OR REPLACE VIEW butterflies AS
+SELECT id, name_ru, name_lat, size_min, size_max, color, habitat, season, description, image_url,
+       wingspan_min, wingspan_max, sex, attributes, insect_type
+FROM species WHERE insect_type = 'butterfly'
+WITH CHECK OPTION;
+ALTER VIEW butterflies ALTER COLUMN insect_type SET DEFAULT 'butterfly';
+
+-- Версии данных каталога (add_catalog_versions.sql) теперь ведутся по типу насекомого
+UPDATE catalog_versions SET table_name = CASE table_name
+        WHEN 'dragonflies' THEN 'dragonfly'
+        WHEN 'beetles' THEN 'beetle'
+        WHEN 'butterflies' THEN 'butterfly'
+    END,
+    version = version + 1
+WHERE table_name IN ('dragonflies', 'beetles', 'butterflies');
+
+INSERT INTO catalog_versions (table_name) VALUES
+    ('dragonfly'), ('beetle'), ('butterfly')
+ON CONFLICT (table_name) DO NOTHING;
+
+-- Триггеры уровня оператора с таблицами переходов: пакетная вставка или COPY
+-- увеличивает версию каждого затронутого типа один раз
+CREATE OR REPLACE FUNCTION bump_species_version() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        UPDATE catalog_versions
+        SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE table_name IN ('dragonfly', 'beetle', 'butterfly');
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE catalog_versions
+        SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE table_name IN (SELECT DISTINCT insect_type FROM old_rows);
+    ELSE
+        UPDATE catalog_versions
+        SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE table_name IN (SELECT DISTINCT insect_type FROM new_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trig_species_version_insert ON species;
+CREATE TRIGGER trig_species_version_insert
+AFTER INSERT ON species REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_species_version();
+
+DROP TRIGGER IF EXISTS trig_species_version_update ON species;
+CREATE TRIGGER trig_species_version_update
+AFTER UPDATE ON species REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_species_version();
+
+DROP TRIGGER IF EXISTS trig_species_version_delete ON species;
+CREATE TRIGGER trig_species_version_delete
+AFTER DELETE ON species REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_species_version();
+
+DROP TRIGGER IF EXISTS trig_species_version_truncate ON species;
+CREATE TRIGGER trig_species_version_truncate
+AFTER TRUNCATE ON species
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_species_version();
@@ -0,0 +1,33 @@
+-- Структурированные атрибуты насекомых вместо поиска ILIKE по description
+-- attributes - нормализованные термины дополнительных полей (см. attributes.py),
+-- wingspan_min/wingspan_max - размах крыльев в мм.
+-- После применения заполните колонки для уже импортированных записей:
+--   python scripts/backfill_attributes.py
+
+-- Таблицы каталога до перехода на species (add_species_partitioning.sql); после него
+-- dragonflies/beetles/butterflies - представления, и этот блок пропускается
+DO $$
+BEGIN
+    IF to_regclass('public.species') IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE dragonflies ADD COLUMN IF NOT EXISTS attributes JSONB;
+    ALTER TABLE dragonflies ADD COLUMN IF NOT EXISTS wingspan_min NUMERIC(10, 2);
+    ALTER TABLE dragonflies ADD COLUMN IF NOT EXISTS wingspan_max NUMERIC(10, 2);
+
+    ALTER TABLE beetles ADD COLUMN IF NOT EXISTS attributes JSONB;
+    ALTER TABLE beetles ADD COLUMN IF NOT EXISTS wingspan_min NUMERIC(10, 2);
+    ALTER TABLE beetles ADD COLUMN IF NOT EXISTS wingspan_max NUMERIC(10, 2);
+
+    ALTER TABLE butterflies ADD COLUMN IF NOT EXISTS attributes JSONB;
+    ALTER TABLE butterflies ADD COLUMN IF NOT EXISTS wingspan_min NUMERIC(10, 2);
+    ALTER TABLE butterflies ADD COLUMN IF NOT EXISTS wingspan_max NUMERIC(10, 2);
+
+    -- GIN-индексы для условий вида attributes @> '{"eye_color": ["зеленые"]}'
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_attributes ON dragonflies USING GIN (attributes jsonb_path_ops);
+    CREATE INDEX IF NOT EXISTS idx_beetles_attributes ON beetles USING GIN (attributes jsonb_path_ops);
+    CREATE INDEX IF NOT EXISTS idx_butterflies_attributes ON butterflies USING GIN (attributes jsonb_path_ops);
+
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_wingspan ON dragonflies(wingspan_min, wingspan_max);
+END $$;
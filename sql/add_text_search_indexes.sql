@@ -0,0 +1,45 @@
+-- Индексы для поиска по свободному тексту в color, habitat и season
+-- Обычные B-tree индексы idx_*_color/habitat/season не помогают условиям
+-- ILIKE '%...%', поэтому здесь добавляются:
+--   * триграммные GIN-индексы (pg_trgm) - ускоряют ILIKE '%...%' и нечёткое
+--     сравнение word_similarity (режим SEARCH_TEXT_MODE=trigram);
+--   * GIN-индексы по to_tsvector('russian', ...) - полнотекстовый поиск
+--     с учётом словоформ (режим SEARCH_TEXT_MODE=fulltext).
+-- Выражения индексов должны совпадать с выражениями в Database.search_insects.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Таблицы каталога до перехода на species (add_species_partitioning.sql); после него
+-- dragonflies/beetles/butterflies - представления, и этот блок пропускается
+DO $$
+BEGIN
+    IF to_regclass('public.species') IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    -- Триграммные индексы
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_color_trgm ON dragonflies USING GIN (color gin_trgm_ops);
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_habitat_trgm ON dragonflies USING GIN (habitat gin_trgm_ops);
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_season_trgm ON dragonflies USING GIN (season gin_trgm_ops);
+
+    CREATE INDEX IF NOT EXISTS idx_beetles_color_trgm ON beetles USING GIN (color gin_trgm_ops);
+    CREATE INDEX IF NOT EXISTS idx_beetles_habitat_trgm ON beetles USING GIN (habitat gin_trgm_ops);
+    CREATE INDEX IF NOT EXISTS idx_beetles_season_trgm ON beetles USING GIN (season gin_trgm_ops);
+
+    CREATE INDEX IF NOT EXISTS idx_butterflies_color_trgm ON butterflies USING GIN (color gin_trgm_ops);
+    CREATE INDEX IF NOT EXISTS idx_butterflies_habitat_trgm ON butterflies USING GIN (habitat gin_trgm_ops);
+    CREATE INDEX IF NOT EXISTS idx_butterflies_season_trgm ON butterflies USING GIN (season gin_trgm_ops);
+
+    -- Полнотекстовые индексы (русская морфология)
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_color_fts ON dragonflies USING GIN (to_tsvector('russian', coalesce(color, '')));
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_habitat_fts ON dragonflies USING GIN (to_tsvector('russian', coalesce(habitat, '')));
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_season_fts ON dragonflies USING GIN (to_tsvector('russian', coalesce(season, '')));
+
+    CREATE INDEX IF NOT EXISTS idx_beetles_color_fts ON beetles USING GIN (to_tsvector('russian', coalesce(color, '')));
+    CREATE INDEX IF NOT EXISTS idx_beetles_habitat_fts ON beetles USING GIN (to_tsvector('russian', coalesce(habitat, '')));
+    CREATE INDEX IF NOT EXISTS idx_beetles_season_fts ON beetles USING GIN (to_tsvector('russian', coalesce(season, '')));
+
+    CREATE INDEX IF NOT EXISTS idx_butterflies_color_fts ON butterflies USING GIN (to_tsvector('russian', coalesce(color, '')));
+    CREATE INDEX IF NOT EXISTS idx_butterflies_habitat_fts ON butterflies USING GIN (to_tsvector('russian', coalesce(habitat, '')));
+    CREATE INDEX IF NOT EXISTS idx_butterflies_season_fts ON butterflies USING GIN (to_tsvector('russian', coalesce(season, '')));
+END $$;
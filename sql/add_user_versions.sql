@@ -0,0 +1,16 @@
+-- Версия данных пользователей для кэша пользователей приложения (auth.py)
+-- Любое изменение роли или данных пользователя - из приложения, psql или
+-- другого процесса - увеличивает версию записи 'Пользователь' в catalog_versions.
+-- Процессы приложения перечитывают версию не реже, чем раз в USER_VERSION_TTL
+-- секунд, и не отдают из кэша пользователей, прочитанных до изменения.
+-- Выполняется после add_catalog_versions.sql (таблица и функция bump_catalog_version).
+
+INSERT INTO catalog_versions (table_name) VALUES ('Пользователь')
+ON CONFLICT (table_name) DO NOTHING;
+
+-- Триггер уровня оператора: UPDATE многих пользователей увеличивает версию один раз.
+-- Смена пароля (перехеширование при входе) кэш не затрагивает
+DROP TRIGGER IF EXISTS trig_users_version ON "Пользователь";
+CREATE TRIGGER trig_users_version
+AFTER UPDATE OF username, email, имя, роль OR DELETE OR TRUNCATE ON "Пользователь"
+FOR EACH STATEMENT EXECUTE PROCEDURE bump_catalog_version();
@@ -11,7 +11,11 @@ CREATE TABLE IF NOT EXISTS dragonflies (
     habitat TEXT,
     season TEXT,
     description TEXT,
-    image_url TEXT
+    image_url TEXT,
+    wingspan_min NUMERIC(10, 2),
+    wingspan_max NUMERIC(10, 2),
+    sex VARCHAR(50),
+    attributes JSONB
 );
 
 -- Таблица для жуков
@@ -25,7 +29,11 @@ CREATE TABLE IF NOT EXISTS beetles (
     habitat TEXT,
     season TEXT,
     description TEXT,
-    image_url TEXT
+    image_url TEXT,
+    wingspan_min NUMERIC(10, 2),
+    wingspan_max NUMERIC(10, 2),
+    sex VARCHAR(50),
+    attributes JSONB
 );
 
 -- Таблица для бабочек
@@ -39,21 +47,45 @@ CREATE TABLE IF NOT EXISTS butterflies (
     habitat TEXT,
     season TEXT,
     description TEXT,
-    image_url TEXT
+    image_url TEXT,
+    wingspan_min NUMERIC(10, 2),
+    wingspan_max NUMERIC(10, 2),
+    sex VARCHAR(50),
+    attributes JSONB
 );
 
--- Создание индексов для ускорения поиска
-CREATE INDEX IF NOT EXISTS idx_dragonflies_color ON dragonflies(color);
-CREATE INDEX IF NOT EXISTS idx_dragonflies_habitat ON dragonflies(habitat);
-CREATE INDEX IF NOT EXISTS idx_dragonflies_season ON dragonflies(season);
-
-CREATE INDEX IF NOT EXISTS idx_beetles_color ON beetles(color);
-CREATE INDEX IF NOT EXISTS idx_beetles_habitat ON beetles(habitat);
-CREATE INDEX IF NOT EXISTS idx_beetles_season ON beetles(season);
-
-CREATE INDEX IF NOT EXISTS idx_butterflies_color ON butterflies(color);
-CREATE INDEX IF NOT EXISTS idx_butterflies_habitat ON butterflies(habitat);
-CREATE INDEX IF NOT EXISTS idx_butterflies_season ON butterflies(season);
+-- Таблицы каталога до перехода на species (add_species_partitioning.sql); после него
+-- dragonflies/beetles/butterflies - представления, и этот блок пропускается
+DO $$
+BEGIN
+    IF to_regclass('public.species') IS NOT NULL THEN
+        RETURN;
+    END IF;
+
+    -- Создание индексов для ускорения поиска
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_color ON dragonflies(color);
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_habitat ON dragonflies(habitat);
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_season ON dragonflies(season);
+
+    CREATE INDEX IF NOT EXISTS idx_beetles_color ON beetles(color);
+    CREATE INDEX IF NOT EXISTS idx_beetles_habitat ON beetles(habitat);
+    CREATE INDEX IF NOT EXISTS idx_beetles_season ON beetles(season);
+
+    CREATE INDEX IF NOT EXISTS idx_butterflies_color ON butterflies(color);
+    CREATE INDEX IF NOT EXISTS idx_butterflies_habitat ON butterflies(habitat);
+    CREATE INDEX IF NOT EXISTS idx_butterflies_season ON butterflies(season);
+
+    -- Индексы по структурированным атрибутам (см. add_structured_attributes.sql)
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_attributes ON dragonflies USING GIN (attributes jsonb_path_ops);
+    CREATE INDEX IF NOT EXISTS idx_beetles_attributes ON beetles USING GIN (attributes jsonb_path_ops);
+    CREATE INDEX IF NOT EXISTS idx_butterflies_attributes ON butterflies USING GIN (attributes jsonb_path_ops);
+    CREATE INDEX IF NOT EXISTS idx_dragonflies_wingspan ON dragonflies(wingspan_min, wingspan_max);
+
+    -- Уникальность вида для повторного импорта (см. add_import_upsert.sql)
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_dragonflies_species ON dragonflies (name_ru, (coalesce(name_lat, '')), (coalesce(sex, '')));
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_beetles_species ON beetles (name_ru, (coalesce(name_lat, '')), (coalesce(sex, '')));
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_butterflies_species ON butterflies (name_ru, (coalesce(name_lat, '')), (coalesce(sex, '')));
+END $$;
 
 -- ============================================
 -- Дополнительные таблицы для системы наблюдений
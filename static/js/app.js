@@ -158,23 +158,10 @@ createApp({
             this.results = [];
             
             try {
-                // Получаем все насекомые всех типов
-                const types = ['dragonfly', 'beetle', 'butterfly'];
-                const allResults = [];
-                
-                for (const type of types) {
-                    const response = await fetch(`/api/all/${type}`);
-                    const data = await response.json();
-                    
-                    if (data.success && data.results) {
-                        // Добавляем тип к каждому результату
-                        const typedResults = data.results.map(insect => ({
-                            ...insect,
-                            insect_type: type
-                        }));
-                        allResults.push(...typedResults);
-                    }
-                }
+                // Получаем все насекомые всех типов одним запросом
+                const response = await fetch('/api/catalog');
+                const data = await response.json();
+                const allResults = (data.success && data.results) ? data.results : [];
                 
                 this.results = allResults;
                 this.allInsectsCount = allResults.length;
@@ -0,0 +1,29 @@
+"""
+Общие данные тестов: небольшой неизменный каталог стрекоз
+"""
+import pytest
+
+from attributes import build_attributes
+
+
+def species(id, size, color, wingspan=(None, None), **fields):
+    return {
+        'id': id,
+        'name_ru': f'Вид {id}',
+        'size_min': size[0],
+        'size_max': size[1],
+        'color': color,
+        'wingspan_min': wingspan[0],
+        'wingspan_max': wingspan[1],
+        'attributes': build_attributes(fields),
+    }
+
+
+@pytest.fixture
+def dragonfly_rows():
+    return [
+        species(1, (30, 35), 'Зелёный', (50, 55), eye_color='зелёные', environment='пруды', gender='самец'),
+        species(2, (40, 45), 'Синий', (60, 65), eye_color='синие', environment='реки', gender='самка'),
+        species(3, (60, 70), 'Бурый, жёлтый', (90, 100), eye_color='бурые', environment='пруды'),
+        species(4, (32, 36), 'Зеленоватый'),
+    ]
@@ -0,0 +1,60 @@
+"""
+Разбор параметров запросов app.py
+"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import parse_request_cursor, parse_request_filters, parse_since
+
+
+@pytest.mark.parametrize('value', [None, ''])
+def test_since_not_given(value):
+    assert parse_since(value) is None
+
+
+def test_since_version():
+    assert parse_since('0') == ('version', 0)
+    assert parse_since('42') == ('version', 42)
+
+
+def test_since_time():
+    assert parse_since('2024-05-01T10:00:00') == ('time', datetime(2024, 5, 1, 10, 0))
+    assert parse_since('2024-05-01T10:00:00+03:00') == (
+        'time', datetime(2024, 5, 1, 10, 0, tzinfo=timezone(timedelta(hours=3)))
+    )
+
+
+@pytest.mark.parametrize('value', ['-1', '1.5', 'вчера', '2024-13-01'])
+def test_since_invalid(value):
+    with pytest.raises(ValueError, match='Неверный параметр since'):
+        parse_since(value)
+
+
+def test_request_filters_defaults():
+    assert parse_request_filters({}) == {'statuses': [], 'expert': None, 'view': 'detail'}
+    assert parse_request_filters({'status': '', 'expert': '', 'view': ''}) == {
+        'statuses': [], 'expert': None, 'view': 'detail'
+    }
+
+
+def test_request_filters():
+    source = {'status': 'ожидает, в_работе,', 'expert': '7', 'view': 'list'}
+    assert parse_request_filters(source) == {'statuses': ['ожидает', 'в_работе'], 'expert': 7, 'view': 'list'}
+
+
+@pytest.mark.parametrize('source, message', [
+    ({'status': 'ожидает,удалено'}, 'Неизвестный статус: удалено'),
+    ({'expert': 'admin'}, 'Неверный параметр expert'),
+    ({'view': 'full'}, 'Неверная проекция'),
+])
+def test_request_filters_invalid(source, message):
+    with pytest.raises(ValueError, match=message):
+        parse_request_filters(source)
+
+
+def test_request_cursor():
+    assert parse_request_cursor(None) is None
+    assert parse_request_cursor('2024-05-01T10:00:00.123456:15') == (datetime(2024, 5, 1, 10, 0, 0, 123456), 15)
+    with pytest.raises(ValueError, match='Неверный курсор'):
+        parse_request_cursor('15')
@@ -0,0 +1,65 @@
+"""
+Атрибуты из описания и условия поиска по колонке attributes
+"""
+import pytest
+
+from attributes import attributes_from_description, parse_wingspan, terms
+from database import Database
+
+
+def test_terms_full_value_parts_and_words():
+    assert terms('Зелёные с синим') == ['зеленые с синим', 'зеленые', 'синим']
+
+
+def test_terms_split_on_separators_and_skip_stop_words():
+    assert terms('жёлтые, бурые / или красные') == ['желтые, бурые / или красные', 'желтые', 'бурые', 'красные']
+    assert terms('на воде') == ['на воде', 'воде']
+
+
+@pytest.mark.parametrize('value', [None, '', '   '])
+def test_terms_empty(value):
+    assert terms(value) == []
+
+
+def test_attributes_from_description():
+    description = 'Цвет глаз: Зелёные; Пол: самец; Ночная бабочка'
+    assert attributes_from_description(description) == {
+        'eye_color': ['зеленые'],
+        'gender': ['самец'],
+        'time_of_day': ['ночь'],
+    }
+
+
+@pytest.mark.parametrize('description, expected', [
+    ('Цвет: бурый; Размах крыльев: 30.0–40.0 мм', (30.0, 40.0)),
+    ('Размах крыльев: 30-40 мм', (30.0, 40.0)),
+    ('Размах крыльев: 35 мм', (35.0, 35.0)),
+    ('Размах крыльев: – 40 мм', (40.0, 40.0)),
+    ('Без размаха', (None, None)),
+    (None, (None, None)),
+])
+def test_parse_wingspan(description, expected):
+    assert parse_wingspan(description) == expected
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = Database()
+    monkeypatch.setattr(db, 'get_data_version', lambda insect_type: (1, 0))
+    monkeypatch.setitem(Database._attribute_terms_cache, 'dragonfly', ((1, 0), Database.group_attribute_terms([
+        ('eye_color', 'зеленые'), ('eye_color', 'синие'), ('gender', 'самец'),
+    ])))
+    return db
+
+
+def test_known_term_uses_containment(db):
+    conditions, values, _, _ = db._search_conditions('dragonfly', {'eye_color': 'Зелёные', 'gender': 'самец'})
+    assert conditions == ['insect_type = %s', 'attributes @> %s::jsonb']
+    assert values[1].adapted == {'eye_color': ['зеленые'], 'gender': ['самец']}
+
+
+def test_unknown_term_falls_back_to_substring(db):
+    conditions, values, _, _ = db._search_conditions('dragonfly', {'eye_color': 'зелен', 'gender': 'самец'})
+    assert conditions == ['insect_type = %s', "attributes->>'eye_color' ILIKE %s", 'attributes @> %s::jsonb']
+    assert values[1] == '%зелен%'
+    assert values[2].adapted == {'gender': ['самец']}
@@ -0,0 +1,63 @@
+"""
+Пакетный импорт: временная таблица и перенос строк в species
+"""
+import re
+from contextlib import contextmanager
+
+import pandas as pd
+
+from scripts.import_excel_data import IMPORT_COLUMNS, bulk_load
+
+
+class RecordingCursor:
+    """Курсор без сервера: запоминает команды и данные COPY"""
+
+    def __init__(self):
+        self.statements = []
+        self.copied = None
+        self.rowcount = 0
+
+    def execute(self, query, values=None):
+        self.statements.append((' '.join(query.split()), values))
+
+    def copy_expert(self, query, buffer):
+        self.statements.append((' '.join(query.split()), None))
+        self.copied = buffer.read()
+        self.rowcount = len(self.copied.splitlines())
+
+
+class RecordingDatabase:
+    def __init__(self):
+        self.cursor_ = RecordingCursor()
+
+    @contextmanager
+    def cursor(self):
+        yield self.cursor_
+
+
+def frame(*names):
+    rows = [{column: None for column in IMPORT_COLUMNS} for _ in names]
+    for row, name in zip(rows, names):
+        row['name_ru'] = name
+    return pd.DataFrame(rows, columns=IMPORT_COLUMNS)
+
+
+def test_staging_table_has_only_imported_columns():
+    db = RecordingDatabase()
+    bulk_load(db, 'dragonfly', frame('Вид 1', 'Вид 2'))
+    create, copy, insert = db.cursor_.statements
+
+    # Колонки insect_type (NOT NULL в species) во временной таблице нет: COPY её не заполняет
+    assert 'LIKE' not in create[0]
+    assert 'insect_type' not in create[0]
+    staged = re.search(r'SELECT (.*) FROM species WITH NO DATA', create[0]).group(1)
+    assert staged.split(', ') == IMPORT_COLUMNS
+    assert re.search(r'COPY import_rows \((.*)\) FROM STDIN', copy[0]).group(1) == staged
+
+    assert insert[0].startswith(f"INSERT INTO species (insect_type, {staged}) SELECT %s, {staged} FROM import_rows")
+    assert insert[1] == ('dragonfly',)
+
+
+def test_duplicate_keys_copied_once():
+    db = RecordingDatabase()
+    assert bulk_load(db, 'beetle', frame('Вид 1', 'Вид 1', 'Вид 2')) == 2
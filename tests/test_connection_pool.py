@@ -0,0 +1,152 @@
+"""
+Пул подключений: возвращённые подключения не закрываются, и подготовленные
+на них запросы переиспользуются следующими запросами
+"""
+import threading
+import time
+
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+import database
+from config import DB_POOL_CONFIG
+from database import ConnectionPool, Database
+
+CONFIG = {'host': 'localhost', 'port': '5432', 'database': 'test', 'user': 'test', 'password': ''}
+
+
+class FakeInfo:
+    transaction_status = TRANSACTION_STATUS_IDLE
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.connection = conn
+
+    def execute(self, query, values=None):
+        self.connection.log.append(query)
+        if query.startswith('EXECUTE'):
+            # Запрос занимает подключение, и потоки действительно работают одновременно
+            time.sleep(0.001)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FakeConnection:
+    """Подключение без сервера: запоминает выполненные команды"""
+
+    def __init__(self):
+        self.closed = 0
+        self.info = FakeInfo()
+        self.log = []
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    opened = []
+
+    def connect(**kwargs):
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    monkeypatch.setattr(database.psycopg2, 'connect', connect)
+    return opened
+
+
+@pytest.fixture
+def pool(connections, monkeypatch):
+    pool = ConnectionPool(CONFIG, **DB_POOL_CONFIG)
+    monkeypatch.setattr(Database, '_pool', pool)
+    return pool
+
+
+def run_concurrently(threads: int, requests: int, target):
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        for _ in range(requests):
+            target()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+
+def test_returned_connections_stay_open(connections):
+    pool = ConnectionPool(CONFIG, minconn=1, maxconn=4)
+    taken = [pool.getconn() for _ in range(4)]
+    for conn in taken:
+        pool.putconn(conn)
+    assert pool.idle_count() == 4
+    assert not any(conn.closed for conn in connections)
+    # Следующие запросы получают те же подключения
+    again = [pool.getconn() for _ in range(4)]
+    assert {id(conn) for conn in again} == {id(conn) for conn in taken}
+    assert len(connections) == 4
+
+
+def test_idle_connections_expire_down_to_minconn(connections):
+    pool = ConnectionPool(CONFIG, minconn=1, maxconn=3, idle_timeout=60)
+    taken = [pool.getconn() for _ in range(3)]
+    for conn in taken:
+        pool.putconn(conn)
+    pool.idle_timeout = 0
+    pool.putconn(pool.getconn())
+    # Все простоявшие закрыты, открытым остаётся одно (minconn)
+    assert pool.idle_count() == 1
+    assert sum(not conn.closed for conn in connections) == 1
+
+
+def test_closed_connection_is_not_returned(connections):
+    pool = ConnectionPool(CONFIG, minconn=0, maxconn=2)
+    conn = pool.getconn()
+    conn.close()
+    pool.putconn(conn)
+    assert pool.idle_count() == 0
+    assert pool.getconn() is not conn
+
+
+def test_prepared_statements_survive_requests(pool, connections):
+    """При DB_POOL_MAX одновременных запросов каждая форма готовится один раз на подключение"""
+    db = Database()
+    queries = [f"SELECT * FROM species WHERE insect_type = %s AND id > {n}" for n in range(3)]
+    threads = pool.maxconn
+    requests = 50
+
+    def request():
+        for query in queries:
+            with db.cursor() as cursor:
+                db._execute_prepared(cursor, query, ['dragonfly'])
+            # Остальная обработка запроса HTTP - без подключения
+            time.sleep(0.001)
+
+    run_concurrently(threads, requests, request)
+
+    assert 1 < len(connections) <= pool.maxconn
+    assert not any(conn.closed for conn in connections)
+    log = [query for conn in connections for query in conn.log]
+    assert sum(query.startswith('PREPARE') for query in log) == len(connections) * len(queries)
+    assert sum(query.startswith('EXECUTE') for query in log) == threads * requests * len(queries)
@@ -0,0 +1,72 @@
+"""
+Определительный ключ на небольшом неизменном каталоге
+"""
+import pytest
+
+from identification_key import IdentificationKey, _answer
+
+
+@pytest.fixture
+def key(dragonfly_rows):
+    return IdentificationKey('dragonfly', dragonfly_rows)
+
+
+def identify(key, species_id):
+    """Пройти ключ, отвечая за вид species_id; «неизвестно» - ветвь «да» (вид есть в обеих)"""
+    species = key._species[species_id]
+    node = 0
+    while key.nodes[node]['question'] is not None:
+        entry = key.nodes[node]
+        node = entry['no'] if _answer(species, entry['question']) is False else entry['yes']
+    return key.nodes[node]['candidates']
+
+
+def test_every_species_is_identified(key, dragonfly_rows):
+    for row in dragonfly_rows:
+        assert identify(key, row['id']) == (row['id'],)
+
+
+def test_first_question_splits_by_size(key):
+    step = key.step(0)
+    assert step['question'] == {'feature': 'size', 'value': 38.0, 'text': 'Размер тела больше 38 мм?'}
+    assert step['candidates'] == [1, 2, 3, 4]
+    assert key.step(step['answers']['yes'])['candidates'] == [2, 3]
+    assert key.step(step['answers']['no'])['candidates'] == [1, 4]
+
+
+def test_skip_asks_another_question(key):
+    step = key.step(0)
+    skipped = key.step(step['answers']['skip'])
+    assert skipped['candidates'] == [1, 2, 3, 4]
+    assert skipped['question']['feature'] != 'size'
+
+
+def test_leaf_has_no_question(key):
+    leaf = next(number for number, entry in enumerate(key.nodes) if entry['question'] is None)
+    step = key.step(leaf)
+    assert step['question'] is None
+    assert step['answers'] is None
+
+
+@pytest.mark.parametrize('node', [-1, 10 ** 6])
+def test_invalid_node(key, node):
+    with pytest.raises(ValueError, match='Неверный узел'):
+        key.step(node)
+
+
+def test_butterfly_size_is_wingspan(dragonfly_rows):
+    key = IdentificationKey('butterfly', dragonfly_rows)
+    assert key.step(0)['question']['text'] == 'Размах крыльев больше 38 мм?'
+
+
+def test_rebuild_reuses_unchanged_tree(key, dragonfly_rows):
+    rebuilt = IdentificationKey('dragonfly', dragonfly_rows, previous=key)
+    assert rebuilt.reused > 0
+    assert rebuilt.nodes == key.nodes
+
+
+def test_rebuild_after_change(key, dragonfly_rows):
+    dragonfly_rows[3]['color'] = 'Красный'
+    rebuilt = IdentificationKey('dragonfly', dragonfly_rows, previous=key)
+    for row in dragonfly_rows:
+        assert identify(rebuilt, row['id']) == (row['id'],)
@@ -0,0 +1,89 @@
+"""
+Параметры вариантов изображений и выбор формата по Accept
+"""
+import pytest
+
+import image_variants
+from config import IMAGE_CONFIG
+from image_variants import ImageVariants, Variant, negotiate_format, parse_variant, snap_width
+
+
+@pytest.fixture(autouse=True)
+def formats(monkeypatch):
+    monkeypatch.setitem(IMAGE_CONFIG, 'widths', [160, 320, 640, 1280])
+    monkeypatch.setattr(image_variants, '_supported_formats', frozenset({'jpeg', 'webp', 'avif'}))
+
+
+@pytest.mark.parametrize('width, expected', [(1, 160), (160, 160), (161, 320), (700, 1280), (5000, 1280)])
+def test_snap_width(width, expected):
+    assert snap_width(width) == expected
+
+
+@pytest.mark.parametrize('accept, expected', [
+    ('image/avif,image/webp,image/apng,*/*;q=0.8', 'avif'),
+    ('image/webp,*/*', 'webp'),
+    ('IMAGE/WEBP', 'webp'),
+    ('image/avif;q=0,image/webp', 'webp'),
+    ('image/avif;q=abc', 'jpeg'),
+    ('*/*', 'jpeg'),
+    ('', 'jpeg'),
+    (None, 'jpeg'),
+])
+def test_negotiate_format(accept, expected):
+    assert negotiate_format(accept) == expected
+
+
+def test_negotiate_only_supported_formats(monkeypatch):
+    monkeypatch.setattr(image_variants, '_supported_formats', frozenset({'jpeg', 'webp'}))
+    assert negotiate_format('image/avif,image/webp') == 'webp'
+
+
+def test_original_without_parameters():
+    assert parse_variant({}) is None
+    assert parse_variant({'w': '', 'fmt': ''}, 'image/webp') is None
+
+
+@pytest.mark.parametrize('args, accept, expected', [
+    ({'w': '300'}, 'image/webp', Variant(320, 'webp', True)),
+    ({'w': '300', 'fmt': 'auto'}, None, Variant(320, 'jpeg', True)),
+    ({'fmt': 'AVIF'}, 'image/webp', Variant(None, 'avif', False)),
+    ({'w': '2000', 'fmt': 'jpeg'}, None, Variant(1280, 'jpeg', False)),
+])
+def test_parse_variant(args, accept, expected):
+    assert parse_variant(args, accept) == expected
+
+
+@pytest.mark.parametrize('args, message', [
+    ({'w': 'abc'}, 'целым числом'),
+    ({'w': '0'}, 'положительным'),
+    ({'fmt': 'gif'}, 'Неподдерживаемый формат'),
+])
+def test_parse_variant_invalid(args, message):
+    with pytest.raises(ValueError, match=message):
+        parse_variant(args)
+
+
+def test_cache_key_follows_source_content(tmp_path):
+    source = tmp_path / 'insect.jpg'
+    source.write_bytes(b'first')
+    cache = ImageVariants(str(tmp_path / 'cache'))
+    variant = Variant(320, 'webp', False)
+    first = cache.cache_path(source, variant)
+    assert first.suffix == '.webp'
+    assert cache.cache_path(source, Variant(640, 'webp', False)) != first
+
+    source.write_bytes(b'second content')
+    second = cache.cache_path(source, variant)
+    assert second != first
+    assert ImageVariants.etag(second) != ImageVariants.etag(first)
+
+
+def test_broken_source_falls_back_to_original(tmp_path, capsys):
+    pytest.importorskip('PIL')
+    source = tmp_path / 'broken.jpg'
+    source.write_bytes(b'\xff\xd8\xff\xe0 not really a jpeg')
+    cache = ImageVariants(str(tmp_path / 'cache'))
+    variant = Variant(160, 'jpeg', False)
+    assert cache.get(source, variant) is None
+    assert not cache.cache_path(source, variant).exists()
+    assert 'отдаётся оригинал' in capsys.readouterr().out
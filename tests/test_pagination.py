@@ -0,0 +1,56 @@
+"""
+Курсоры постраничной выдачи /api/all и /api/search
+"""
+import pytest
+
+from database import Database
+
+
+def rows(*ids, ranks=None):
+    if ranks is None:
+        return [{'id': i, 'name_ru': f'Вид {i}'} for i in ids]
+    return [{'id': i, 'name_ru': f'Вид {i}', 'search_rank': rank} for i, rank in zip(ids, ranks)]
+
+
+@pytest.mark.parametrize('cursor', [None, ''])
+def test_parse_empty_cursor(cursor):
+    assert Database._parse_cursor(cursor, ranked=False) is None
+    assert Database._parse_cursor(cursor, ranked=True) is None
+
+
+def test_parse_cursor():
+    assert Database._parse_cursor('42', ranked=False) == 42
+    assert Database._parse_cursor('0.75:42', ranked=True) == (0.75, 42)
+
+
+@pytest.mark.parametrize('cursor, ranked', [
+    ('abc', False),
+    ('0.5:42', False),
+    ('42', True),
+    ('0.5:abc', True),
+])
+def test_parse_invalid_cursor(cursor, ranked):
+    with pytest.raises(ValueError, match='Неверный курсор'):
+        Database._parse_cursor(cursor, ranked=ranked)
+
+
+def test_page_results_trims_extra_row():
+    page, next_cursor = Database._page_results(rows(1, 2, 3), limit=2, ranked=False)
+    assert [row['id'] for row in page] == [1, 2]
+    assert next_cursor == '2'
+
+
+@pytest.mark.parametrize('limit', [None, 3, 5])
+def test_page_results_last_page(limit):
+    page, next_cursor = Database._page_results(rows(1, 2, 3), limit=limit, ranked=False)
+    assert [row['id'] for row in page] == [1, 2, 3]
+    assert next_cursor is None
+
+
+def test_ranked_page_cursor_round_trip():
+    rank = 1 / 3
+    page, next_cursor = Database._page_results(rows(7, 3, 9, ranks=[0.9, rank, 0.1]), limit=2, ranked=True)
+    assert [row['id'] for row in page] == [7, 3]
+    assert all('search_rank' not in row for row in page)
+    # Ранг в курсоре записывается без потери точности
+    assert Database._parse_cursor(next_cursor, ranked=True) == (rank, 3)
@@ -0,0 +1,83 @@
+"""
+Кэш результатов поиска: LRU, время жизни и версия данных
+"""
+import pytest
+
+import result_cache
+from result_cache import ResultCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_hit_and_miss(clock):
+    cache = ResultCache(maxsize=4, ttl=60)
+    assert cache.get('a', 1) is None
+    cache.put('a', 1, 'value')
+    assert cache.get('a', 1) == 'value'
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_ratio']) == (1, 1, 0.5)
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = ResultCache(maxsize=4, ttl=60)
+    cache.put('a', 1, 'value')
+    clock[0] += 59.9
+    assert cache.get('a', 1) == 'value'
+    clock[0] += 0.1
+    assert cache.get('a', 1) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_other_version_is_miss_and_drops_entry(clock):
+    cache = ResultCache(maxsize=4, ttl=60)
+    cache.put('a', (1, 0), 'old')
+    assert cache.get('a', (2, 0)) is None
+    # Запись старой версии удалена и не вернётся, даже если спросить прежнюю версию
+    assert cache.get('a', (1, 0)) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_least_recently_used_evicted(clock):
+    cache = ResultCache(maxsize=2, ttl=60)
+    cache.put('a', 1, 'A')
+    cache.put('b', 1, 'B')
+    assert cache.get('a', 1) == 'A'
+    cache.put('c', 1, 'C')
+    assert cache.get('b', 1) is None
+    assert cache.get('a', 1) == 'A'
+    assert cache.get('c', 1) == 'C'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_put_existing_key_refreshes_entry(clock):
+    cache = ResultCache(maxsize=2, ttl=60)
+    cache.put('a', 1, 'A')
+    clock[0] += 50
+    cache.put('a', 1, 'A2')
+    clock[0] += 50
+    assert cache.get('a', 1) == 'A2'
+    assert cache.stats()['size'] == 1
+
+
+def test_disabled_cache_stores_nothing(clock):
+    cache = ResultCache(maxsize=0, ttl=60)
+    cache.put('a', 1, 'A')
+    assert cache.get('a', 1) is None
+    assert cache.stats()['size'] == 0
+
+
+def test_invalidate_and_clear(clock):
+    cache = ResultCache(maxsize=4, ttl=60)
+    cache.put('a', 1, 'A')
+    cache.put('b', 1, 'B')
+    cache.invalidate('a')
+    cache.invalidate('missing')
+    assert cache.get('a', 1) is None
+    cache.clear()
+    assert cache.get('b', 1) is None
+    assert cache.stats()['misses'] == 2
@@ -0,0 +1,67 @@
+"""
+Ранжированный поиск похожих видов по матрице признаков
+"""
+import pytest
+
+from similarity import SpeciesMatrix, rank_species, stems
+
+
+@pytest.fixture
+def matrix(dragonfly_rows):
+    return SpeciesMatrix('dragonfly', dragonfly_rows)
+
+
+def ranked_ids(matrix, params, top_k=20):
+    return [row['id'] for row, _, _ in matrix.rank(params, top_k)]
+
+
+def test_stems():
+    assert stems('Зелёные, или зеленоватые') == ['зелен']
+    assert stems(['пруды', 'реки']) == ['пруды', 'реки']
+    assert stems(None) == []
+
+
+def test_color_matches_word_forms(matrix):
+    results = matrix.rank({'color': 'зелёные'}, top_k=2)
+    assert [(row['id'], score) for row, score, _ in results] == [(1, 1.0), (4, 1.0)]
+
+
+def test_size_overlap_scores_highest(matrix):
+    results = matrix.rank({'size_min': 40, 'size_max': 40})
+    scores = {row['id']: score for row, score, _ in results}
+    assert scores[2] == 1.0
+    # Зазор 20 мм при масштабе 10 мм (четверть размера запроса)
+    assert scores[3] == pytest.approx(1 / 3)
+    assert ranked_ids(matrix, {'size_min': 40, 'size_max': 40}) == [2, 4, 1, 3]
+
+
+def test_weighted_criteria(matrix):
+    results = matrix.rank({'eye_color': 'зелёные', 'environment': 'пруды'}, top_k=2)
+    assert [row['id'] for row, _, _ in results] == [1, 3]
+    row, score, details = results[1]
+    assert details == {'eye_color': 0.0, 'environment': 1.0}
+    # eye_color весит 1.5, environment - 1.0
+    assert score == pytest.approx(1.0 / 2.5)
+
+
+def test_no_criteria(matrix):
+    assert matrix.rank({}) == []
+    assert matrix.rank({'color': ''}) == []
+
+
+def test_unknown_term_scores_zero(matrix):
+    assert all(score == 0.0 for _, score, _ in matrix.rank({'color': 'фиолетовый'}))
+
+
+def test_rank_species_rows(matrix, dragonfly_rows):
+    results = rank_species(matrix, {'color': 'синий'}, top_k=1)
+    assert len(results) == 1
+    assert results[0]['id'] == 2
+    assert results[0]['match_score'] == 1.0
+    assert results[0]['match_details'] == {'color': 1.0}
+    # Строки каталога не изменяются
+    assert 'match_score' not in dragonfly_rows[1]
+
+
+def test_empty_catalogue():
+    assert SpeciesMatrix('dragonfly', []).rank({'color': 'синий'}) == []